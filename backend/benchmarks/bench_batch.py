@@ -0,0 +1,103 @@
+"""Burst benchmark: N tickets through /search one by one vs. one /search/batch call.
+
+Both run against the same backend setup as bench_search (single uvicorn
+worker, in-memory Qdrant, fake Azure OpenAI). Part of the burst repeats
+earlier tickets word for word, as triage bursts do; --unique sets the
+share of distinct texts. Reports wall time and upstream calls per mode.
+
+    python benchmarks/bench_batch.py --tickets 200 --concurrency 16 --unique 0.6
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+
+import httpx
+
+from fakes import ISSUES, FakeServer, create_fake_openai_app
+from bench_search import create_search_app
+
+
+def burst(count: int, unique_share: float, seed: int = 3):
+    rng = random.Random(seed)
+    distinct = [f"{rng.choice(ISSUES)} on workstation {i}" for i in range(max(1, int(count * unique_share)))]
+    return distinct + [rng.choice(distinct) for _ in range(count - len(distinct))]
+
+
+async def run_single(base_url: str, queries, concurrency: int):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(client, query):
+        async with semaphore:
+            response = await client.post("/search", json={"query": query, "conversation_history": []})
+            response.raise_for_status()
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=None,
+                                 limits=httpx.Limits(max_connections=concurrency)) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(one(client, query) for query in queries))
+        return time.perf_counter() - started, None
+
+
+async def run_batch(base_url: str, queries):
+    first_result = None
+    async with httpx.AsyncClient(base_url=base_url, timeout=None) as client:
+        started = time.perf_counter()
+        payload = {"queries": [{"id": str(i), "query": query} for i, query in enumerate(queries)]}
+        async with client.stream("POST", "/search/batch", json=payload) as response:
+            async for line in response.aiter_lines():
+                event = json.loads(line) if line else {}
+                if event.get("type") == "result" and first_result is None:
+                    first_result = time.perf_counter() - started
+                if event.get("type") == "error":
+                    raise RuntimeError(event["message"])
+        return time.perf_counter() - started, first_result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tickets", type=int, default=200)
+    parser.add_argument("--unique", type=float, default=0.6, help="Share of distinct ticket texts")
+    parser.add_argument("--concurrency", type=int, default=16, help="Client concurrency for the one-by-one run")
+    parser.add_argument("--corpus", type=int, default=500, help="Indexed tickets")
+    parser.add_argument("--embed-latency", type=float, default=0.05)
+    parser.add_argument("--chat-latency", type=float, default=0.5)
+    parser.add_argument("--json", action="store_true", help="Print machine-readable results only")
+    args = parser.parse_args()
+
+    # Every ticket should cost what it costs on a cold deployment
+    os.environ["EMBEDDING_CACHE_ENABLED"] = "false"
+    os.environ["BATCH_COMPLETION_CONCURRENCY"] = str(args.concurrency)
+    queries = burst(args.tickets, args.unique)
+    results = {}
+    for mode in ("single", "batch"):
+        with FakeServer(create_fake_openai_app, embed_latency=args.embed_latency,
+                        chat_latency=args.chat_latency) as llm:
+            with FakeServer(create_search_app, openai_url=llm.url, ticket_count=args.corpus,
+                            ready_path="/") as backend:
+                if mode == "single":
+                    elapsed, first = asyncio.run(run_single(backend.url, queries, args.concurrency))
+                else:
+                    elapsed, first = asyncio.run(run_batch(backend.url, queries))
+            calls = llm.stats()
+        results[mode] = {
+            "elapsed_s": round(elapsed, 2),
+            "tickets_per_s": round(len(queries) / elapsed, 1),
+            "first_result_s": round(first, 2) if first is not None else None,
+            "embedding_calls": calls["embeddings"],
+            "chat_calls": calls["chat"],
+        }
+
+    if args.json:
+        print(json.dumps(results))
+        return
+    print(f"{args.tickets} tickets, {len(set(queries))} distinct, completion concurrency {args.concurrency}")
+    for mode, row in results.items():
+        print(f"{mode:>7}: {row}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,88 @@
+"""Incident-spike benchmark for /search request coalescing.
+
+--users requests arrive spread over --window seconds, all asking one of
+--questions distinct questions (as during an outage, when everyone types
+the same thing). The backend runs as in bench_search, once with
+SEARCH_COALESCING_ENABLED=false and once with it on. Reports latency
+percentiles, upstream LLM calls and the executed/coalesced counts.
+
+    python benchmarks/bench_coalesce.py --users 200 --questions 5 --window 2
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+
+import httpx
+
+from fakes import ISSUES, FakeServer, create_fake_openai_app, percentile
+from bench_search import create_search_app
+
+
+async def spike(base_url: str, users: int, questions: int, window: float, seed: int = 9):
+    rng = random.Random(seed)
+    asked = ISSUES[:questions]
+    latencies, errors = [], 0
+
+    async def one(client, delay):
+        nonlocal errors
+        await asyncio.sleep(delay)
+        query = rng.choice(asked)
+        started = time.perf_counter()
+        response = await client.post("/search", json={"query": query, "conversation_history": []})
+        latencies.append(time.perf_counter() - started)
+        if response.status_code != 200:
+            errors += 1
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=None,
+                                 limits=httpx.Limits(max_connections=users)) as client:
+        await asyncio.gather(*(one(client, rng.uniform(0, window)) for _ in range(users)))
+        coalescing = (await client.get("/admin/search/coalescing")).json()
+    return {
+        "errors": errors,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+        "executed": coalescing["executed"] if coalescing["enabled"] else users,
+        "coalesced": coalescing["coalesced"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--questions", type=int, default=5, help="Distinct questions in the spike")
+    parser.add_argument("--window", type=float, default=2.0, help="Seconds over which requests arrive")
+    parser.add_argument("--corpus", type=int, default=500, help="Indexed tickets")
+    parser.add_argument("--embed-latency", type=float, default=0.05)
+    parser.add_argument("--chat-latency", type=float, default=0.5)
+    parser.add_argument("--json", action="store_true", help="Print machine-readable results only")
+    args = parser.parse_args()
+
+    # Cold start, as at the beginning of an incident
+    os.environ["EMBEDDING_CACHE_ENABLED"] = "false"
+    results = {}
+    for coalescing in (False, True):
+        with FakeServer(create_fake_openai_app, embed_latency=args.embed_latency,
+                        chat_latency=args.chat_latency) as llm:
+            with FakeServer(create_search_app, openai_url=llm.url, ticket_count=args.corpus,
+                            coalescing=coalescing, ready_path="/") as backend:
+                row = asyncio.run(spike(backend.url, args.users, args.questions, args.window))
+            calls = llm.stats()
+        row["embedding_calls"] = calls["embeddings"]
+        row["chat_calls"] = calls["chat"]
+        results["coalesced" if coalescing else "independent"] = row
+
+    if args.json:
+        print(json.dumps(results))
+        return
+    print(f"{args.users} requests over {args.window}s, {args.questions} distinct questions")
+    for mode, row in results.items():
+        print(f"{mode:>12}: {row}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
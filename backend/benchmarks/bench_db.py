@@ -0,0 +1,333 @@
+"""Write contention benchmark for TicketDatabase.
+
+Many threads escalate tickets and add a comment to each, like concurrent
+/escalate and /tickets/comment requests. "legacy" replays the original
+access pattern (a fresh connection per call, the id counter in its own
+EXCLUSIVE transaction, then a separate insert); "counter" bumps the
+counters row inside each insert transaction on a pooled WAL connection;
+"pooled" uses TicketDatabase.create_ticket / create_comment, which take
+ids from a block reserved per process (IdAllocator) so the insert
+transaction only writes the ticket. "postgres" runs the same escalations
+through PostgresTicketStore (sequence ids) on a scratch database at
+--database-url, with one asyncio task per writer.
+
+    python benchmarks/bench_db.py --writers 1 8 32 --escalations 200
+    python benchmarks/bench_db.py --writers 32 --modes counter pooled postgres --database-url postgresql://...
+
+--list-tickets instead times the /admin/tickets query (get_tickets) at each
+table size, against the original one-comments-query-per-ticket loader, and
+the keyset-paginated /admin/tickets/page query (list_tickets) at the first
+page and halfway through the table, and /admin/stats (get_analytics) on the
+rollup tables against the original six full-table aggregates. It also
+times the startup counter scan that block allocation made unnecessary.
+
+    python benchmarks/bench_db.py --list-tickets 1000 10000 100000
+"""
+import argparse
+import asyncio
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from fakes import percentile
+
+TICKET = {
+    "user_query": "VPN client is not connecting",
+    "ai_answer": "1. Restart the VPN service.",
+    "user_feedback": "Did not help",
+    "status": "pending",
+    "conversation_history": [{"role": "user", "content": "VPN client is not connecting"}],
+}
+COMMENT = {"author": "admin", "author_name": "Support Admin", "content": "Reinstalled the client"}
+
+
+def legacy_escalate(db_path: str, index: int):
+    def next_id(name: str, prefix: str) -> str:
+        with sqlite3.connect(db_path, timeout=30) as conn:
+            conn.isolation_level = 'EXCLUSIVE'
+            conn.execute("UPDATE counters SET value = value + 1 WHERE name = ?", (name,))
+            value = conn.execute("SELECT value FROM counters WHERE name = ?", (name,)).fetchone()[0]
+            conn.commit()
+            return f"{prefix}-{value:06d}"
+
+    ticket_id = next_id("ticket", "ESC")
+    with sqlite3.connect(db_path, timeout=30) as conn:
+        conn.execute(
+            "INSERT INTO tickets (id, user_query, ai_answer, user_feedback, status, submitted_at, conversation_history) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (ticket_id, TICKET["user_query"], TICKET["ai_answer"], TICKET["user_feedback"], "pending",
+             f"2026-01-01T00:00:{index % 60:02d}", json.dumps(TICKET["conversation_history"])),
+        )
+        conn.commit()
+    comment_id = next_id("comment", "COMMENT")
+    with sqlite3.connect(db_path, timeout=30) as conn:
+        conn.execute(
+            "INSERT INTO comments (id, ticket_id, author, author_name, content, timestamp, type) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (comment_id, ticket_id, COMMENT["author"], COMMENT["author_name"], COMMENT["content"],
+             f"2026-01-01T00:01:{index % 60:02d}", "comment"),
+        )
+        conn.commit()
+
+
+def counter_escalate(db, index: int):
+    def next_id(conn, name: str, prefix: str) -> str:
+        conn.execute("UPDATE counters SET value = value + 1 WHERE name = ?", (name,))
+        value = conn.execute("SELECT value FROM counters WHERE name = ?", (name,)).fetchone()[0]
+        return f"{prefix}-{value:06d}"
+
+    with db.pool.transaction() as conn:
+        ticket_id = next_id(conn, "ticket", "ESC")
+        db._insert_ticket(conn, {**TICKET, "id": ticket_id, "submitted_at": f"2026-01-01T00:00:{index % 60:02d}"})
+    with db.pool.transaction() as conn:
+        db._insert_comment(conn, ticket_id, {**COMMENT, "id": next_id(conn, "comment", "COMMENT"),
+                                             "timestamp": f"2026-01-01T00:01:{index % 60:02d}"})
+
+
+def pooled_escalate(db, index: int):
+    ticket_id = db.create_ticket({**TICKET, "submitted_at": f"2026-01-01T00:00:{index % 60:02d}"})
+    db.create_comment(ticket_id, {**COMMENT, "timestamp": f"2026-01-01T00:01:{index % 60:02d}"})
+
+
+def legacy_sync_counters(db_path: str):
+    """The startup scan that repaired the counters row from every ticket and comment id."""
+    with sqlite3.connect(db_path) as conn:
+        highest = {}
+        for name, table, prefix in (("ticket", "tickets", "ESC"), ("comment", "comments", "COMMENT")):
+            highest[name] = 1000
+            for (row_id,) in conn.execute(f"SELECT id FROM {table} WHERE id LIKE '{prefix}-%'").fetchall():
+                try:
+                    highest[name] = max(highest[name], int(row_id.split('-')[1]))
+                except ValueError:
+                    pass
+        return highest
+
+
+def legacy_get_tickets(db_path: str):
+    with sqlite3.connect(db_path) as conn:
+        conn.row_factory = sqlite3.Row
+        cursor = conn.cursor()
+        cursor.execute("SELECT * FROM tickets ORDER BY submitted_at DESC")
+        tickets = []
+        for row in cursor.fetchall():
+            ticket = dict(row)
+            ticket['conversation_history'] = json.loads(ticket['conversation_history'] or "[]")
+            cursor.execute("SELECT * FROM comments WHERE ticket_id = ? ORDER BY timestamp ASC", (ticket['id'],))
+            ticket['comments'] = [dict(c) for c in cursor.fetchall()]
+            ticket['comment_count'] = len(ticket['comments'])
+            tickets.append(ticket)
+        return tickets
+
+
+def legacy_get_analytics(db_path: str):
+    with sqlite3.connect(db_path) as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT COUNT(*) FROM tickets")
+        cursor.execute("SELECT COUNT(*) FROM tickets WHERE status = 'pending'")
+        cursor.execute("SELECT COUNT(*) FROM tickets WHERE status = 'resolved'")
+        cursor.execute("""
+            SELECT AVG(
+                CASE WHEN resolved_at IS NOT NULL AND submitted_at IS NOT NULL
+                THEN (julianday(resolved_at) - julianday(submitted_at)) * 24
+                ELSE NULL END
+            ) FROM tickets WHERE status = 'resolved'
+        """)
+        cursor.execute("SELECT COUNT(*) FROM tickets WHERE date(submitted_at) >= date('now', '-7 days')")
+        cursor.execute("""
+            SELECT date(submitted_at) as date, COUNT(*) as count
+            FROM tickets WHERE date(submitted_at) >= date('now', '-30 days')
+            GROUP BY date(submitted_at) ORDER BY date(submitted_at)
+        """)
+        return cursor.fetchall()
+
+
+def seed_tickets(db_path: str, count: int, comments_per_ticket: int = 2):
+    history = json.dumps(TICKET["conversation_history"] * 4)
+    with sqlite3.connect(db_path) as conn:
+        conn.executemany(
+            "INSERT INTO tickets (id, user_query, ai_answer, user_feedback, status, submitted_at, conversation_history) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            ((f"ESC-{i:06d}", TICKET["user_query"], TICKET["ai_answer"], TICKET["user_feedback"],
+              "resolved" if i % 3 else "pending", f"2026-01-01T{i // 3600 % 24:02d}:{i // 60 % 60:02d}:{i % 60:02d}.{i:06d}",
+              history) for i in range(count)),
+        )
+        conn.executemany(
+            "INSERT INTO comments (id, ticket_id, author, author_name, content, timestamp, type) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            ((f"COMMENT-{i:06d}-{j}", f"ESC-{i:06d}", COMMENT["author"], COMMENT["author_name"],
+              COMMENT["content"], f"2026-01-02T00:00:{j:02d}", "comment")
+             for i in range(count) for j in range(comments_per_ticket)),
+        )
+
+
+def run_list(count: int, repeats: int = 3):
+    from database import TicketDatabase, encode_cursor
+
+    db_path = os.path.join(tempfile.mkdtemp(prefix="itrs-bench-"), "tickets.db")
+    db = TicketDatabase(db_path)
+    seed_tickets(db_path, count)
+    start = time.perf_counter()
+    db.rebuild_rollups()
+    backfill_ms = round((time.perf_counter() - start) * 1000, 1)
+
+    def best_of(fn):
+        timings = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            fn()
+            timings.append(time.perf_counter() - start)
+        return round(min(timings) * 1000, 2)
+
+    result = {
+        "tickets": count,
+        "legacy_ms": best_of(lambda: legacy_get_tickets(db_path)),
+        "batched_ms": best_of(lambda: db.get_tickets()),
+        "batched_no_comments_history_ms": best_of(
+            lambda: db.get_tickets(include_comments=False, include_history=False)
+        ),
+        "batched_pending_ms": best_of(lambda: db.get_tickets(status_filter="pending")),
+    }
+
+    with sqlite3.connect(db_path) as conn:
+        middle = conn.execute(
+            "SELECT submitted_at, id FROM tickets ORDER BY submitted_at DESC, id DESC LIMIT 1 OFFSET ?", (count // 2,)
+        ).fetchone()
+    deep_cursor = encode_cursor(*middle)
+    first_page, _ = db.list_tickets(limit=50)
+    result.update({
+        "page_first_ms": best_of(lambda: db.list_tickets(limit=50)),
+        "page_deep_ms": best_of(lambda: db.list_tickets(limit=50, cursor=deep_cursor)),
+        "page_pending_deep_ms": best_of(lambda: db.list_tickets(limit=50, cursor=deep_cursor, status="pending")),
+        "page_bytes": len(json.dumps(first_page)),
+        "stats_legacy_ms": best_of(lambda: legacy_get_analytics(db_path)),
+        "stats_rollup_ms": best_of(db.get_analytics),
+        "rollup_backfill_ms": backfill_ms,
+        "startup_counter_scan_legacy_ms": best_of(lambda: legacy_sync_counters(db_path)),
+    })
+    db.close()
+    start = time.perf_counter()
+    TicketDatabase(db_path).close()
+    result["startup_open_ms"] = round((time.perf_counter() - start) * 1000, 2)
+    return result
+
+
+def run_once(mode: str, writers: int, escalations: int, synchronous: str):
+    from database import TicketDatabase
+
+    db_path = os.path.join(tempfile.mkdtemp(prefix="itrs-bench-"), "tickets.db")
+    db = TicketDatabase(db_path, pool_size=writers, synchronous=synchronous)
+    escalate = counter_escalate if mode == "counter" else pooled_escalate
+    if mode == "legacy":
+        # The original schema ran in the default rollback journal mode
+        db.close()
+        with sqlite3.connect(db_path) as conn:
+            conn.execute("PRAGMA journal_mode=DELETE")
+
+    latencies = []
+
+    def one(index: int):
+        start = time.perf_counter()
+        if mode == "legacy":
+            legacy_escalate(db_path, index)
+        else:
+            escalate(db, index)
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=writers) as executor:
+        list(executor.map(one, range(escalations)))
+    elapsed = time.perf_counter() - start
+
+    with sqlite3.connect(db_path) as conn:
+        tickets = conn.execute("SELECT COUNT(*), COUNT(DISTINCT id) FROM tickets").fetchone()
+    db.close()
+
+    return summarize(mode, writers, escalations, tickets[0] - tickets[1], elapsed, latencies)
+
+
+async def run_postgres(database_url: str, writers: int, escalations: int):
+    from database_postgres import PostgresTicketStore
+    from store_contract import drop_postgres, scratch_postgres
+
+    scratch, dsn = await scratch_postgres(database_url)
+    db = PostgresTicketStore(dsn, pool_size=writers)
+    try:
+        await db.init()
+        semaphore = asyncio.Semaphore(writers)
+        latencies = []
+
+        async def one(index: int):
+            async with semaphore:
+                start = time.perf_counter()
+                ticket_id = await db.create_ticket({**TICKET, "submitted_at": f"2026-01-01T00:00:{index % 60:02d}"})
+                await db.create_comment(ticket_id, {**COMMENT, "timestamp": f"2026-01-01T00:01:{index % 60:02d}"})
+                latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(index) for index in range(escalations)))
+        elapsed = time.perf_counter() - start
+        async with db.pool.acquire() as conn:
+            total, distinct = await conn.fetchrow("SELECT COUNT(*), COUNT(DISTINCT id) FROM tickets")
+    finally:
+        await db.close()
+        await drop_postgres(database_url, scratch)
+    return summarize("postgres", writers, escalations, total - distinct, elapsed, latencies)
+
+
+def summarize(mode: str, writers: int, escalations: int, duplicates: int, elapsed: float, latencies):
+    return {
+        "mode": mode,
+        "writers": writers,
+        "escalations": escalations,
+        "duplicate_ids": duplicates,
+        "elapsed_s": round(elapsed, 3),
+        "escalations_per_s": round(escalations / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--writers", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--escalations", type=int, default=400)
+    parser.add_argument("--modes", nargs="+", choices=["legacy", "counter", "pooled", "postgres"],
+                        default=["legacy", "counter", "pooled"])
+    parser.add_argument("--database-url", help="PostgreSQL server for --modes postgres")
+    parser.add_argument("--synchronous", choices=["OFF", "NORMAL", "FULL", "EXTRA"], default="NORMAL")
+    parser.add_argument("--list-tickets", type=int, nargs="+", help="Benchmark get_tickets at these table sizes")
+    parser.add_argument("--json", action="store_true", help="Print machine-readable results only")
+    args = parser.parse_args()
+
+    if args.list_tickets:
+        results = []
+        for count in args.list_tickets:
+            results.append(run_list(count))
+            if not args.json:
+                print(json.dumps(results[-1]))
+        if args.json:
+            print(json.dumps({"list_runs": results}))
+        return
+
+    results = []
+    for writers in args.writers:
+        for mode in args.modes:
+            if mode == "postgres":
+                if not args.database_url:
+                    parser.error("--modes postgres needs --database-url")
+                results.append(asyncio.run(run_postgres(args.database_url, writers, args.escalations)))
+            else:
+                results.append(run_once(mode, writers, args.escalations, args.synchronous))
+            if not args.json:
+                print(json.dumps(results[-1]))
+
+    if args.json:
+        print(json.dumps({"runs": results}))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,91 @@
+"""Microbenchmark for the dedupe stage of retrieve_context.
+
+Builds retrieved candidate sets where several tickets are rewordings of
+the same fix (near-identical vectors, different text) and runs
+rag_qdrant.get_unique_and_filtered_solutions with DEDUP_MODE=exact and
+DEDUP_MODE=mmr. Reports time per call and how many distinct fixes make it
+into the top MAX_SOLUTIONS_FOR_SYNTHESIS.
+
+    python benchmarks/bench_dedupe.py --candidates 15 --fixes 6 --dim 1536
+"""
+import argparse
+import json
+import random
+import time
+
+import numpy as np
+
+from fakes import configure_env
+
+PHRASES = ["Restarted the {0} service", "{0} service restarted, issue fixed", "Fixed by restarting {0}",
+           "Rebooted {0} and the problem is gone", "Issue resolved after a restart of {0}"]
+FIXES = ["print spooler", "VPN agent", "Outlook profile", "docking firmware", "Teams client", "SAP GUI",
+         "credential manager", "mobile sync", "network drive", "license server"]
+
+
+def candidate_sets(count: int, candidates: int, fixes: int, dim: int, noise: float, seed: int = 5):
+    from qdrant_client.models import ScoredPoint
+
+    rng = np.random.default_rng(seed)
+    picker = random.Random(seed)
+    sets = []
+    for _ in range(count):
+        bases = rng.normal(size=(fixes, dim)).astype(np.float32)
+        points = []
+        for i in range(candidates):
+            fix = picker.randrange(fixes)
+            vector = bases[fix] + rng.normal(scale=noise, size=dim).astype(np.float32)
+            text = picker.choice(PHRASES).format(FIXES[fix % len(FIXES)]) + f" on ticket {i}."
+            points.append(ScoredPoint(
+                id=i, version=0, score=round(0.95 - i * 0.01, 3), vector=(vector / np.linalg.norm(vector)).tolist(),
+                payload={"ticket_id": f"TKT-{i}", "resolution_text": text, "fix": fix},
+            ))
+        sets.append(points)
+    return sets
+
+
+def run(args):
+    import rag_qdrant
+
+    sets = candidate_sets(args.sets, args.candidates, args.fixes, args.dim, args.noise)
+    fixes_by_ticket = [{p.payload["ticket_id"]: p.payload["fix"] for p in points} for points in sets]
+    results = {}
+    for mode in ("exact", "mmr"):
+        rag_qdrant.DEDUP_MODE = mode
+        distinct = []
+        started = time.perf_counter()
+        for r in range(args.rounds):
+            solutions = rag_qdrant.get_unique_and_filtered_solutions(sets[r % len(sets)])
+            top = solutions[:rag_qdrant.MAX_SOLUTIONS_FOR_SYNTHESIS]
+            distinct.append(len({fixes_by_ticket[r % len(sets)][s["source_id"]] for s in top}))
+        elapsed = time.perf_counter() - started
+        results[mode] = {
+            "us_per_call": round(elapsed / args.rounds * 1e6, 1),
+            "distinct_fixes_in_top": round(sum(distinct) / len(distinct), 2),
+        }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, default=2000)
+    parser.add_argument("--sets", type=int, default=100)
+    parser.add_argument("--candidates", type=int, default=15, help="Retrieved points per query")
+    parser.add_argument("--fixes", type=int, default=6, help="Distinct fixes among the candidates")
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--noise", type=float, default=0.1, help="Spread of rewordings around their fix")
+    parser.add_argument("--json", action="store_true", help="Print machine-readable results only")
+    args = parser.parse_args()
+
+    configure_env("http://127.0.0.1:9")
+    results = run(args)
+    if args.json:
+        print(json.dumps(results))
+        return
+    for mode, row in results.items():
+        print(f"{mode:>6}: {row['us_per_call']:>8} us/call   distinct fixes in top "
+              f"{row['distinct_fixes_in_top']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""Ingest throughput benchmark against a fake Azure OpenAI embedding server.
+
+Runs ingest_qdrant.upsert_records for each embedding-worker count into an
+in-memory Qdrant wrapped with a fixed upsert latency, and reports records/s.
+Pass --quota to cap the fake deployment's embedded texts per second and
+watch throughput flatten at the quota instead of failing.
+
+    python benchmarks/bench_ingest.py --records 4000 --workers 1 2 4 8
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from contextlib import redirect_stdout
+from io import StringIO
+
+from fakes import (
+    API_VERSION, EMBED_DIM, FakeServer, configure_env, create_fake_openai_app, synthetic_tickets,
+)
+
+
+class SlowQdrant:
+    """In-memory Qdrant with a simulated network round trip on upsert."""
+
+    def __init__(self, client, upsert_latency: float):
+        self._client = client
+        self._upsert_latency = upsert_latency
+        self._lock = threading.Lock()
+
+    def upsert(self, *args, **kwargs):
+        time.sleep(self._upsert_latency)
+        with self._lock:
+            return self._client.upsert(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+
+def build_records(count: int):
+    import ingest_qdrant
+
+    records = []
+    for i, ticket in enumerate(synthetic_tickets(count)):
+        payload = dict(ticket)
+        payload["content_hash"] = ingest_qdrant.content_hash(payload)
+        records.append({"id": i, "embedding_text": ticket["problem_text"], "payload": payload})
+    return records
+
+
+def run_once(openai_url: str, records, embed_workers: int, upsert_workers: int, upsert_latency: float):
+    import ingest_qdrant
+    from embedding_cache import EmbeddingCache
+    from llm_client import Endpoint, LLMRouter
+    from qdrant_client import QdrantClient, models as rest
+
+    openai_client = LLMRouter([Endpoint("fake", openai_url, "bench-key", API_VERSION)])
+    qdrant = SlowQdrant(QdrantClient(location=":memory:"), upsert_latency)
+    qdrant.create_collection(
+        collection_name="bench",
+        vectors_config=rest.VectorParams(size=EMBED_DIM, distance=rest.Distance.COSINE),
+    )
+    cache_path = os.path.join(tempfile.mkdtemp(prefix="itrs-bench-"), "embedding_cache.db")
+    embedding_cache = EmbeddingCache(db_path=cache_path, model="bench")
+    stats = ingest_qdrant.IngestStats()
+
+    start = time.perf_counter()
+    with redirect_stdout(StringIO()):
+        ingest_qdrant.upsert_records(
+            openai_client, qdrant, embedding_cache, "bench", records, stats,
+            embed_workers=embed_workers, upsert_workers=upsert_workers,
+        )
+    elapsed = time.perf_counter() - start
+    embedding_cache.close()
+
+    return {
+        "embed_workers": embed_workers,
+        "upsert_workers": upsert_workers,
+        "records": len(records),
+        "upserted": stats.upserted,
+        "failed_batches": stats.failed_batches,
+        "elapsed_s": round(elapsed, 3),
+        "records_per_s": round(stats.upserted / elapsed, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--records", type=int, default=2000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--upsert-workers", type=int, default=2)
+    parser.add_argument("--embed-latency", type=float, default=0.2, help="Fixed seconds per embedding request")
+    parser.add_argument("--embed-latency-per-item", type=float, default=0.002)
+    parser.add_argument("--upsert-latency", type=float, default=0.05)
+    parser.add_argument("--quota", type=int, default=None, help="Embedded texts per second before 429s")
+    parser.add_argument("--json", action="store_true", help="Print machine-readable results only")
+    args = parser.parse_args()
+
+    results = []
+    with FakeServer(create_fake_openai_app, embed_latency=args.embed_latency,
+                    embed_latency_per_item=args.embed_latency_per_item,
+                    embed_quota_per_second=args.quota) as llm:
+        configure_env(llm.url)
+        os.chdir(tempfile.mkdtemp(prefix="itrs-bench-"))
+        records = build_records(args.records)
+        for workers in args.workers:
+            results.append(run_once(llm.url, records, workers, args.upsert_workers, args.upsert_latency))
+            if not args.json:
+                print(json.dumps(results[-1]))
+        throttled = llm.stats()["throttled"]
+
+    if args.json:
+        print(json.dumps({"runs": results, "throttled_requests": throttled}))
+    else:
+        print(f"throttled requests: {throttled}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
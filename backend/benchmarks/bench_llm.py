@@ -0,0 +1,118 @@
+"""Failover and hedging benchmark for llm_client.AsyncLLMRouter.
+
+Runs chat completions against two fake Azure OpenAI endpoints:
+
+    throttled  endpoint A answers 429 (quota exhausted), B is healthy
+    outage     endpoint A answers 503, B is healthy
+    tail       both healthy, --slow-share of completions take --slow-factor x longer
+
+"single" is the old setup: one AsyncAzureOpenAI client on endpoint A with
+the SDK's default retries. "router" routes over A and B (equal weights);
+"hedged" also re-sends a completion to the other endpoint when it has not
+finished after --hedge-ms. Reports success rate and latency percentiles.
+
+    python benchmarks/bench_llm.py --requests 200 --concurrency 20 --chat-latency 0.1
+"""
+import argparse
+import asyncio
+import json
+import time
+from contextlib import ExitStack
+
+from fakes import API_VERSION, CHAT_DEPLOYMENT, FakeServer, create_fake_openai_app, percentile
+
+SCENARIOS = {
+    "throttled": ({"error_status": 429}, {}),
+    "outage": ({"error_status": 503}, {}),
+    "tail": ({"seed": 1}, {"seed": 2}),
+}
+
+
+async def run_requests(client, count: int, concurrency: int):
+    semaphore = asyncio.Semaphore(concurrency)
+    timings, failures = [], 0
+
+    async def one(i):
+        nonlocal failures
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                await client.chat.completions.create(
+                    model=CHAT_DEPLOYMENT, messages=[{"role": "user", "content": f"VPN drops, request {i}"}],
+                    max_tokens=50,
+                )
+                timings.append((time.perf_counter() - started) * 1000)
+            except Exception:
+                failures += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(count)))
+    elapsed = time.perf_counter() - started
+    return {
+        "success_rate": round(len(timings) / count, 3),
+        "elapsed_s": round(elapsed, 2),
+        "p50_ms": round(percentile(timings, 50), 1),
+        "p95_ms": round(percentile(timings, 95), 1),
+        "p99_ms": round(percentile(timings, 99), 1),
+    }
+
+
+async def run_client(mode: str, urls, args):
+    from llm_client import AsyncLLMRouter, Endpoint
+    from openai import AsyncAzureOpenAI
+
+    if mode == "single":
+        client = AsyncAzureOpenAI(api_key="bench-key", api_version=API_VERSION, azure_endpoint=urls[0])
+    else:
+        client = AsyncLLMRouter(
+            [Endpoint(name, url, "bench-key", API_VERSION) for name, url in zip("AB", urls)],
+            hedge_after_ms=args.hedge_ms if mode == "hedged" else 0,
+        )
+    try:
+        result = await run_requests(client, args.requests, args.concurrency)
+        if mode != "single":
+            result["endpoints"] = {e["name"]: {key: e[key] for key in ("requests", "failures", "breaker", "hedges")}
+                                   for e in client.stats()["endpoints"]}
+        return result
+    finally:
+        await client.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--chat-latency", type=float, default=0.1)
+    parser.add_argument("--slow-share", type=float, default=0.05)
+    parser.add_argument("--slow-factor", type=float, default=10.0)
+    parser.add_argument("--hedge-ms", type=float, default=250)
+    parser.add_argument("--scenarios", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument("--json", action="store_true", help="Print machine-readable results only")
+    args = parser.parse_args()
+
+    results = {}
+    for scenario in args.scenarios:
+        configs = SCENARIOS[scenario]
+        modes = ["router", "hedged"] if scenario == "tail" else ["single", "router"]
+        for mode in modes:
+            with ExitStack() as stack:
+                servers = [
+                    stack.enter_context(FakeServer(
+                        create_fake_openai_app, chat_latency=args.chat_latency,
+                        slow_share=args.slow_share if scenario == "tail" else 0.0,
+                        slow_factor=args.slow_factor, **config,
+                    ))
+                    for config in configs
+                ]
+                results[f"{scenario}/{mode}"] = asyncio.run(run_client(mode, [s.url for s in servers], args))
+
+    if args.json:
+        print(json.dumps(results))
+        return
+    print(f"{args.requests} completions, concurrency {args.concurrency}, chat latency {args.chat_latency}s")
+    for name, row in results.items():
+        print(f"{name:>17}: {row}")
+
+
+if __name__ == "__main__":
+    main()
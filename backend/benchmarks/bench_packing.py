@@ -0,0 +1,100 @@
+"""Microbenchmark for the prompt packing stage of retrieve_context.
+
+Compares the original loop (re-counts the query on every iteration, stops
+at the first solution that does not fit, builds the prompt with +=) with
+context_packing.pack_context, both with token counts computed on the fly
+and with the counts ingest stores in the payload. Reports time per call
+and how much of the token budget ends up filled.
+
+    python benchmarks/bench_packing.py --rounds 2000 --max-context-tokens 4000
+"""
+import argparse
+import json
+import random
+import time
+
+import fakes  # noqa: F401  (puts the backend on sys.path)
+from context_packing import PROMPT_RESERVE_TOKENS, TOKENIZER_NAME, count_tokens, pack_context
+
+WORDS = ("restart the service clear the credential cache re-apply the profile check the event log "
+         "update the driver reboot the docking station reset the password sync the mailbox").split()
+
+
+def legacy_pack(solutions, query, max_context_tokens, max_solutions):
+    combined_context = ""
+    source_info_list = []
+    current_token_count = 0
+    for i, sol_data in enumerate(solutions[:max_solutions]):
+        solution_text = sol_data["text"]
+        estimated_tokens = count_tokens(solution_text)
+        if current_token_count + estimated_tokens + count_tokens(query) + 500 > max_context_tokens:
+            break
+        combined_context += f"<solution_{i+1}>\n{solution_text}\n</solution_{i+1}>\n\n"
+        source_info_list.append({"number": i+1, "ticket_id": sol_data["source_id"], "score": sol_data["score"]})
+        current_token_count += estimated_tokens
+    return combined_context, source_info_list, current_token_count
+
+
+def solution_sets(count: int, per_set: int, max_words: int, seed: int = 11):
+    rng = random.Random(seed)
+    sets = []
+    for _ in range(count):
+        solutions = []
+        for i in range(per_set):
+            text = " ".join(rng.choice(WORDS) for _ in range(rng.randint(30, max_words)))
+            solutions.append({"text": text, "source_id": f"TKT-{i}", "score": round(0.95 - i * 0.02, 3)})
+        sets.append(solutions)
+    return sets
+
+
+def run(args):
+    query = "Outlook keeps asking for credentials after the update"
+    budget = args.max_context_tokens - count_tokens(query) - PROMPT_RESERVE_TOKENS
+    sets = solution_sets(args.sets, args.candidates, args.max_words)
+    cached_sets = [[dict(s, tokens=count_tokens(s["text"])) for s in solutions] for solutions in sets]
+
+    variants = {
+        "legacy": lambda i: legacy_pack(sets[i], query, args.max_context_tokens, args.max_solutions),
+        "packer": lambda i: pack_context(sets[i], budget, args.max_solutions),
+        "packer_cached": lambda i: pack_context(cached_sets[i], budget, args.max_solutions),
+    }
+    results = {}
+    for name, variant in variants.items():
+        used, packed = [], []
+        started = time.perf_counter()
+        for r in range(args.rounds):
+            _, sources, tokens = variant(r % len(sets))
+            used.append(tokens)
+            packed.append(len(sources))
+        elapsed = time.perf_counter() - started
+        results[name] = {
+            "us_per_call": round(elapsed / args.rounds * 1e6, 1),
+            "budget_filled": round(sum(used) / len(used) / budget, 3),
+            "solutions_packed": round(sum(packed) / len(packed), 2),
+        }
+    return {"tokenizer": TOKENIZER_NAME, "budget_tokens": budget, "results": results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, default=2000)
+    parser.add_argument("--sets", type=int, default=200, help="Distinct retrieved solution sets")
+    parser.add_argument("--candidates", type=int, default=15, help="Deduplicated solutions per query")
+    parser.add_argument("--max-words", type=int, default=1200, help="Upper bound on solution length")
+    parser.add_argument("--max-solutions", type=int, default=5)
+    parser.add_argument("--max-context-tokens", type=int, default=4000)
+    parser.add_argument("--json", action="store_true", help="Print machine-readable results only")
+    args = parser.parse_args()
+
+    result = run(args)
+    if args.json:
+        print(json.dumps(result))
+        return
+    print(f"tokenizer: {result['tokenizer']}, budget: {result['budget_tokens']} tokens")
+    for name, row in result["results"].items():
+        print(f"{name:>14}: {row['us_per_call']:>8} us/call   budget filled {row['budget_filled']:>6}   "
+              f"solutions {row['solutions_packed']}")
+
+
+if __name__ == "__main__":
+    main()
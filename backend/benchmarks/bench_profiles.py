@@ -0,0 +1,146 @@
+"""Memory and latency of the collection profiles in collection_profiles.py.
+
+Quantization, on-disk storage and HNSW settings are ignored by the
+in-memory Qdrant the other benchmarks use, so this one needs a real
+server (e.g. `docker run -p 6333:6333 qdrant/qdrant`) at QDRANT_URL or
+--url. For every profile it builds a scratch collection of clustered
+random vectors, waits for indexing, and measures query p50/p95 with the
+profile's search params plus recall@10 against an exact search. RAM is
+reported as an estimate from the profile (vectors, quantized copy, HNSW
+links) and, when the server exposes it, the server's resident memory
+after the build. Without a reachable server only the estimates print.
+
+    python benchmarks/bench_profiles.py --points 100000 --dim 1536 --queries 200
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import httpx
+import numpy as np
+
+import fakes  # noqa: F401  (puts the backend on sys.path)
+from collection_profiles import PROFILES, collection_config, estimate_ram_bytes, get_profile, search_params
+from fakes import percentile
+
+UPSERT_BATCH = 1000
+
+
+def clustered_vectors(count: int, dim: int, seed: int = 1):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(max(1, count // 200), dim)).astype(np.float32)
+    vectors = centers[rng.integers(0, len(centers), count)] + rng.normal(scale=0.3, size=(count, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def server_resident_bytes(url: str):
+    try:
+        for line in httpx.get(f"{url}/metrics", timeout=5).text.splitlines():
+            if line.startswith("memory_resident_bytes"):
+                return int(float(line.split()[-1]))
+    except httpx.HTTPError:
+        pass
+    return None
+
+
+def wait_for_index(client, name: str, points: int, timeout: float = 1800):
+    from qdrant_client import models
+
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        info = client.get_collection(collection_name=name)
+        if info.status == models.CollectionStatus.GREEN and (info.indexed_vectors_count or 0) >= points * 0.9:
+            return True
+        time.sleep(1)
+    return False
+
+
+def bench_profile(client, url: str, name: str, vectors, queries, truth, k: int):
+    from qdrant_client import models
+
+    profile = get_profile(name)
+    collection = f"bench_profile_{name}"
+    if client.collection_exists(collection):
+        client.delete_collection(collection)
+    client.create_collection(collection_name=collection, **collection_config(profile, vectors.shape[1]))
+    started = time.perf_counter()
+    for start in range(0, len(vectors), UPSERT_BATCH):
+        batch = vectors[start:start + UPSERT_BATCH]
+        client.upsert(collection_name=collection, points=models.Batch(
+            ids=list(range(start, start + len(batch))), vectors=batch.tolist(),
+        ), wait=False)
+    indexed = wait_for_index(client, collection, len(vectors))
+    build_s = time.perf_counter() - started
+
+    params = search_params(profile)
+    timings, recalls = [], []
+    for query, expected in zip(queries, truth):
+        started = time.perf_counter()
+        points = client.query_points(collection_name=collection, query=query.tolist(), limit=k,
+                                     search_params=params).points
+        timings.append((time.perf_counter() - started) * 1000)
+        recalls.append(len(expected & {p.id for p in points}) / k)
+    result = {
+        "indexed": indexed,
+        "build_s": round(build_s, 1),
+        "p50_ms": round(percentile(timings, 50), 2),
+        "p95_ms": round(percentile(timings, 95), 2),
+        f"recall@{k}": round(sum(recalls) / len(recalls), 3),
+        "server_rss_mb": None,
+    }
+    rss = server_resident_bytes(url)
+    if rss is not None:
+        result["server_rss_mb"] = round(rss / 2**20, 1)
+    client.delete_collection(collection)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default=os.getenv("QDRANT_URL", "http://localhost:6333"))
+    parser.add_argument("--api-key", default=os.getenv("QDRANT_API_KEY"))
+    parser.add_argument("--points", type=int, default=100000)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--profiles", nargs="+", choices=list(PROFILES), default=list(PROFILES))
+    parser.add_argument("--estimate-only", action="store_true", help="Skip the server and print RAM estimates")
+    parser.add_argument("--json", action="store_true", help="Print machine-readable results only")
+    args = parser.parse_args()
+
+    results = {
+        name: {"estimated_ram_mb": round(estimate_ram_bytes(get_profile(name), args.points, args.dim) / 2**20, 1)}
+        for name in args.profiles
+    }
+
+    if not args.estimate_only:
+        from qdrant_client import QdrantClient
+
+        client = QdrantClient(url=args.url, api_key=args.api_key, timeout=120)
+        try:
+            client.get_collections()
+        except Exception as e:
+            print(f"⚠️ No Qdrant server at {args.url} ({e}); printing estimates only.", file=sys.stderr)
+            client = None
+        if client is not None:
+            vectors = clustered_vectors(args.points, args.dim)
+            rng = np.random.default_rng(2)
+            picks = rng.integers(0, args.points, args.queries)
+            queries = vectors[picks] + rng.normal(scale=0.05, size=(args.queries, args.dim)).astype(np.float32)
+            # Ground truth by brute force over the same vectors
+            truth = [set(np.argsort(-(vectors @ q))[:args.k].tolist()) for q in queries]
+            for name in args.profiles:
+                results[name].update(bench_profile(client, args.url, name, vectors, queries, truth, args.k))
+
+    if args.json:
+        print(json.dumps(results))
+        return
+    print(f"{args.points} points x {args.dim} dims")
+    for name, row in results.items():
+        print(f"{name:>8}: {row}")
+
+
+if __name__ == "__main__":
+    main()
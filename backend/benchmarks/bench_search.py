@@ -0,0 +1,165 @@
+"""Load benchmark for POST /search against a fake Azure OpenAI server.
+
+The backend runs as a single uvicorn worker in its own process, with Qdrant
+in ":memory:" mode seeded with synthetic tickets, so the numbers show how
+many chat sessions one worker can keep in flight.
+
+    python benchmarks/bench_search.py --requests 400 --concurrency 100
+
+--history sends a prior turn with every request (half of the questions are
+pronoun follow-ups) so the follow-up resolution stage is exercised; compare
+--followup-mode combined against legacy.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+import httpx
+
+from fakes import (
+    EMBED_DIM, ISSUES, FakeServer, configure_env, create_fake_openai_app,
+    fake_embedding, percentile, synthetic_tickets,
+)
+
+
+FOLLOW_UPS = ["What about on the other laptop?", "Does that also fix it for them?", "Why does it keep happening?"]
+
+
+def create_search_app(openai_url: str, ticket_count: int, semantic_cache: bool = False,
+                      followup_mode: str = "combined", coalescing: bool = True):
+    """Backend app factory, executed inside the FakeServer process."""
+    configure_env(openai_url)
+    os.environ["SEMANTIC_CACHE_ENABLED"] = "true" if semantic_cache else "false"
+    os.environ["FOLLOWUP_MODE"] = followup_mode
+    os.environ["SEARCH_COALESCING_ENABLED"] = "true" if coalescing else "false"
+    os.chdir(tempfile.mkdtemp(prefix="itrs-bench-"))
+
+    import rag_qdrant
+    import main
+    from qdrant_client import AsyncQdrantClient, models as rest
+
+    async def seed_qdrant():
+        client = AsyncQdrantClient(location=":memory:")
+        await client.create_collection(
+            collection_name=rag_qdrant.COLLECTION_NAME,
+            vectors_config=rest.VectorParams(size=EMBED_DIM, distance=rest.Distance.COSINE),
+        )
+        tickets = synthetic_tickets(ticket_count)
+        await client.upsert(
+            collection_name=rag_qdrant.COLLECTION_NAME,
+            points=[
+                rest.PointStruct(id=i, vector=fake_embedding(t["problem_text"]), payload=t)
+                for i, t in enumerate(tickets)
+            ],
+        )
+        rag_qdrant.qdrant = client
+        main.qdrant = client
+
+    main.app.router.on_startup.insert(0, seed_qdrant)
+    return main.app
+
+
+def build_payload(with_history: bool):
+    if not with_history:
+        return {"query": random.choice(ISSUES), "conversation_history": []}
+    previous = random.choice(ISSUES)
+    query = random.choice(FOLLOW_UPS) if random.random() < 0.5 else random.choice(ISSUES)
+    return {
+        "query": query,
+        "conversation_history": [
+            {"role": "user", "content": previous},
+            {"role": "assistant", "content": "1. Restart the affected service."},
+            {"role": "user", "content": query},
+        ],
+    }
+
+
+async def run_load(base_url: str, total_requests: int, concurrency: int, stream: bool = False,
+                   with_history: bool = False):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    first_token = []
+    errors = 0
+
+    async def one(client):
+        nonlocal errors
+        payload = build_payload(with_history)
+        async with semaphore:
+            start = time.perf_counter()
+            if stream:
+                seen_token = False
+                async with client.stream("POST", "/search/stream", json=payload) as response:
+                    async for line in response.aiter_lines():
+                        event = json.loads(line) if line else {}
+                        if event.get("type") == "token" and not seen_token:
+                            seen_token = True
+                            first_token.append(time.perf_counter() - start)
+                        if event.get("type") == "error":
+                            errors += 1
+            else:
+                response = await client.post("/search", json=payload)
+            latencies.append(time.perf_counter() - start)
+            if response.status_code != 200:
+                errors += 1
+
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=None) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(one(client) for _ in range(total_requests)))
+        elapsed = time.perf_counter() - start
+        stages = (await client.get("/admin/metrics/latency")).json()
+
+    result = {
+        "requests": total_requests,
+        "concurrency": concurrency,
+        "errors": errors,
+        "elapsed_s": round(elapsed, 3),
+        "requests_per_s": round(total_requests / elapsed, 2),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+    }
+    if stream:
+        result["ttft_p50_ms"] = round(percentile(first_token, 50) * 1000, 1)
+        result["ttft_p99_ms"] = round(percentile(first_token, 99) * 1000, 1)
+    result["stages"] = {name: {"p50_ms": s["p50_ms"], "p99_ms": s["p99_ms"]} for name, s in stages["stages"].items()}
+    result["counters"] = stages["counters"]
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--tickets", type=int, default=500)
+    parser.add_argument("--embed-latency", type=float, default=0.05)
+    parser.add_argument("--chat-latency", type=float, default=0.5)
+    parser.add_argument("--stream", action="store_true", help="Use /search/stream and report time to first token")
+    parser.add_argument("--semantic-cache", action="store_true", help="Enable the answer cache")
+    parser.add_argument("--history", action="store_true", help="Send a prior turn so follow-up resolution runs")
+    parser.add_argument("--followup-mode", choices=["combined", "legacy"], default="combined")
+    parser.add_argument("--json", action="store_true", help="Print machine-readable results only")
+    args = parser.parse_args()
+
+    with FakeServer(create_fake_openai_app, embed_latency=args.embed_latency,
+                    chat_latency=args.chat_latency) as llm:
+        with FakeServer(create_search_app, openai_url=llm.url, ticket_count=args.tickets,
+                        semantic_cache=args.semantic_cache, followup_mode=args.followup_mode,
+                        ready_path="/") as backend:
+            result = asyncio.run(run_load(backend.url, args.requests, args.concurrency, args.stream,
+                                          args.history))
+        result["llm_calls"] = llm.stats()
+
+    if args.json:
+        print(json.dumps(result))
+    else:
+        for key, value in result.items():
+            print(f"{key:>16}: {value}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,207 @@
+"""Offline quality and latency benchmark for rag_pipeline.
+
+Replays a labelled query set through the real rag_qdrant code against an
+in-memory Qdrant and the deterministic fake Azure OpenAI server, then
+reports:
+
+- quality: recall@k and MRR of the deduplicated ranking that feeds synthesis
+- latency: per-stage p50/p95 (embed, vector_search, lexical_search, dedupe,
+  pack_context, completion) and end-to-end p50/p95
+- throughput: pipeline runs per second at the given concurrency
+
+The corpus defaults to the synthetic identifier tickets from eval_retrieval;
+--corpus takes an export in any ingest_qdrant input format and --queries a
+JSONL file of {"query": ..., "relevant": [TicketID, ...]}. Retrieval knobs
+can be overridden to see their effect before changing the defaults:
+
+    python benchmarks/eval_pipeline.py --output baseline.json
+    python benchmarks/eval_pipeline.py --similarity-threshold 0.6 --baseline baseline.json
+
+With --baseline the run exits 1 when a quality metric drops by more than
+--quality-tolerance or a latency p95 grows by more than --latency-tolerance.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+from fakes import FakeServer, configure_env, create_fake_openai_app, fake_embedding, percentile
+from eval_retrieval import build_collection, labelled_corpus, labelled_queries
+
+# CLI option -> rag_qdrant setting it overrides
+CONFIG_KNOBS = {
+    "similarity_threshold": "SIMILARITY_THRESHOLD",
+    "max_solutions": "MAX_SOLUTIONS_FOR_SYNTHESIS",
+    "max_context_tokens": "MAX_CONTEXT_TOKENS",
+    "retrieval_mode": "RETRIEVAL_MODE",
+    "dedup_mode": "DEDUP_MODE",
+}
+# Stage latencies below this are timer noise, never a regression
+LATENCY_NOISE_MS = 1.0
+
+
+def load_dataset(args):
+    if args.corpus:
+        from ingest_sources import iter_rows
+        tickets = list(iter_rows(args.corpus))
+    else:
+        tickets = labelled_corpus(args.tickets, args.codes)
+    if args.queries:
+        with open(args.queries, encoding="utf-8") as f:
+            queries = [json.loads(line) for line in f if line.strip()]
+        for item in queries:
+            item["relevant"] = set(item["relevant"])
+    else:
+        queries = labelled_queries(tickets, args.codes, args.query_count)
+    return tickets, queries
+
+
+async def score_quality(queries, ks):
+    """recall@k and MRR over the deduplicated candidate ranking of each query."""
+    import rag_qdrant
+
+    recalls = {k: [] for k in ks}
+    reciprocal_ranks = []
+    for item in queries:
+        query_vector = await rag_qdrant.embed_text(item["query"])
+        points = await rag_qdrant.search_candidates(query_vector, item["query"])
+        ranked = [solution["source_id"] for solution in rag_qdrant.get_unique_and_filtered_solutions(points)]
+        for k in ks:
+            recalls[k].append(len(item["relevant"].intersection(ranked[:k])) / len(item["relevant"]))
+        first = next((rank for rank, ticket_id in enumerate(ranked, 1) if ticket_id in item["relevant"]), None)
+        reciprocal_ranks.append(1 / first if first else 0.0)
+    quality = {f"recall@{k}": round(sum(values) / len(values), 3) for k, values in recalls.items()}
+    quality["mrr"] = round(sum(reciprocal_ranks) / len(reciprocal_ranks), 3)
+    return quality
+
+
+async def run_load(queries, total: int, concurrency: int):
+    import rag_qdrant
+    from metrics import latency
+
+    latency.reset()
+    semaphore = asyncio.Semaphore(concurrency)
+    timings = []
+
+    async def one(item):
+        async with semaphore:
+            started = time.perf_counter()
+            await rag_qdrant.rag_pipeline(item["query"])
+            timings.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(queries[i % len(queries)]) for i in range(total)))
+    elapsed = time.perf_counter() - started
+    stages = latency.snapshot()["stages"]
+    return {
+        "requests": total,
+        "concurrency": concurrency,
+        "requests_per_s": round(total / elapsed, 2),
+        "p50_ms": round(percentile(timings, 50) * 1000, 2),
+        "p95_ms": round(percentile(timings, 95) * 1000, 2),
+        "stages": {name: {"p50_ms": s["p50_ms"], "p95_ms": s["p95_ms"]} for name, s in stages.items()},
+    }
+
+
+async def run(args, openai_url: str):
+    configure_env(openai_url)
+    os.environ["SEMANTIC_CACHE_ENABLED"] = "false"
+    os.environ["EMBEDDING_CACHE_ENABLED"] = "false"
+    os.chdir(tempfile.mkdtemp(prefix="itrs-eval-"))
+    import rag_qdrant
+
+    for option, setting in CONFIG_KNOBS.items():
+        value = getattr(args, option)
+        if value is not None:
+            setattr(rag_qdrant, setting, value)
+
+    tickets, queries = load_dataset(args)
+    rag_qdrant.qdrant = await build_collection(tickets, embed=fake_embedding)
+    return {
+        "config": {knob: getattr(rag_qdrant, knob) for knob in CONFIG_KNOBS.values()},
+        "dataset": {"tickets": len(tickets), "queries": len(queries)},
+        "quality": await score_quality(queries, args.k),
+        "load": await run_load(queries, args.requests or len(queries), args.concurrency),
+    }
+
+
+def compare(result, baseline, quality_tolerance: float, latency_tolerance: float):
+    """Regressions of result against baseline, as human-readable strings."""
+    regressions = []
+    for key, value in result["quality"].items():
+        before = baseline.get("quality", {}).get(key)
+        if before is not None and value < before - quality_tolerance:
+            regressions.append(f"{key}: {before} -> {value}")
+    latencies = {"end_to_end": result["load"]["p95_ms"]}
+    latencies.update({name: s["p95_ms"] for name, s in result["load"]["stages"].items()})
+    previous = {"end_to_end": baseline.get("load", {}).get("p95_ms")}
+    previous.update({name: s["p95_ms"] for name, s in baseline.get("load", {}).get("stages", {}).items()})
+    for name, value in latencies.items():
+        before = previous.get(name)
+        if before and value > before * (1 + latency_tolerance) and value - before > LATENCY_NOISE_MS:
+            regressions.append(f"{name} p95: {before} ms -> {value} ms")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", help="Ticket export (.csv/.parquet/.xlsx) instead of the synthetic corpus")
+    parser.add_argument("--queries", help="Labelled queries JSONL instead of the synthetic queries")
+    parser.add_argument("--tickets", type=int, default=2000, help="Synthetic corpus size")
+    parser.add_argument("--codes", type=int, default=400, help="Distinct identifiers in the synthetic corpus")
+    parser.add_argument("--query-count", type=int, default=100, help="Synthetic query count")
+    parser.add_argument("--k", type=int, nargs="+", default=[1, 3, 5])
+    parser.add_argument("--requests", type=int, help="Pipeline runs for the load phase (default: one per query)")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--embed-latency", type=float, default=0.02)
+    parser.add_argument("--chat-latency", type=float, default=0.2)
+    parser.add_argument("--similarity-threshold", type=float)
+    parser.add_argument("--max-solutions", type=int)
+    parser.add_argument("--max-context-tokens", type=int)
+    parser.add_argument("--retrieval-mode", choices=["dense", "sparse", "hybrid"])
+    parser.add_argument("--dedup-mode", choices=["exact", "mmr"])
+    parser.add_argument("--output", help="Write the JSON result to this file")
+    parser.add_argument("--baseline", help="JSON result of an earlier run to compare against")
+    parser.add_argument("--quality-tolerance", type=float, default=0.02)
+    parser.add_argument("--latency-tolerance", type=float, default=0.25)
+    parser.add_argument("--json", action="store_true", help="Print machine-readable results only")
+    args = parser.parse_args()
+    for name in ("corpus", "queries", "output", "baseline"):
+        if getattr(args, name):
+            setattr(args, name, os.path.abspath(getattr(args, name)))
+
+    with FakeServer(create_fake_openai_app, embed_latency=args.embed_latency,
+                    chat_latency=args.chat_latency) as llm:
+        result = asyncio.run(run(args, llm.url))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(result, json.load(f), args.quality_tolerance, args.latency_tolerance)
+        result["regressions"] = regressions
+
+    if args.json:
+        print(json.dumps(result))
+    else:
+        print(f"config:  {result['config']}")
+        print(f"dataset: {result['dataset']}")
+        print(f"quality: {result['quality']}")
+        load = result["load"]
+        print(f"load:    {load['requests_per_s']} req/s at concurrency {load['concurrency']}, "
+              f"p50 {load['p50_ms']} ms, p95 {load['p95_ms']} ms")
+        for name, stage in load["stages"].items():
+            print(f"  {name:>22}: p50 {stage['p50_ms']:>8} ms   p95 {stage['p95_ms']:>8} ms")
+        if args.baseline:
+            print("❌ Regressions:\n  " + "\n  ".join(regressions) if regressions else "✅ No regressions against baseline")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
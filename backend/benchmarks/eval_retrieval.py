@@ -0,0 +1,153 @@
+"""Offline retrieval eval: recall@k and latency for dense, sparse and hybrid search.
+
+Builds a labelled corpus where each ticket carries an exact identifier (an
+error code or a hostname) on top of one of the common issue texts, ingests
+it into an in-memory Qdrant the way ingest_qdrant does (dense vector plus
+the BM25 lexical vector), and runs rag_qdrant.search_candidates in each
+retrieval mode. A query names an issue in its own words plus one
+identifier; the relevant tickets are the ones carrying that identifier.
+
+Real embedding models blur rare identifiers into the surrounding meaning.
+The bag-of-words fake embedding would not, so the dense side here embeds
+text with the identifier tokens removed to keep the comparison honest.
+
+    python benchmarks/eval_retrieval.py --tickets 5000 --queries 200 --k 5 10
+"""
+import argparse
+import asyncio
+import json
+import random
+import re
+import time
+
+from fakes import EMBED_DIM, ISSUES, configure_env, fake_embedding, percentile
+
+MODES = ["dense", "sparse", "hybrid"]
+IDENTIFIER_TOKEN = re.compile(r"\S*\d\S*")
+
+
+def semantic_embedding(text: str):
+    return fake_embedding(IDENTIFIER_TOKEN.sub(" ", text), EMBED_DIM)
+
+
+def identifier_for(i: int, codes: int) -> str:
+    # Every `codes`-th ticket repeats an identifier, so queries have several relevant tickets
+    slot = i % codes
+    if slot % 2:
+        return f"ws-{slot:05d}.corp.local"
+    return f"0x8007{slot:04X}"
+
+
+def labelled_corpus(count: int, codes: int):
+    tickets = []
+    for i in range(count):
+        issue = ISSUES[i % len(ISSUES)]
+        identifier = identifier_for(i, codes)
+        tickets.append({
+            "TicketID": f"TKT-{i:06d}",
+            "problem_text": f"{issue}, reported with {identifier}",
+            "resolution_text": f"Checked {identifier} (ticket {i}): {issue.lower()} was fixed by restarting "
+                               f"the affected service and re-applying the profile.",
+            "language": "en",
+            "category": "it",
+        })
+    return tickets
+
+
+def labelled_queries(tickets, codes: int, count: int, seed: int = 7):
+    rng = random.Random(seed)
+    relevant = {}
+    for ticket in tickets:
+        relevant.setdefault(identifier_for(int(ticket["TicketID"][4:]), codes), set()).add(ticket["TicketID"])
+    queries = []
+    for slot in rng.sample(range(min(codes, len(tickets))), min(count, codes, len(tickets))):
+        identifier = identifier_for(slot, codes)
+        words = ISSUES[slot % len(ISSUES)].lower().split()
+        phrase = " ".join(rng.sample(words, max(3, len(words) // 2)))
+        queries.append({"query": f"{phrase} {identifier}", "relevant": relevant[identifier]})
+    return queries
+
+
+async def build_collection(tickets, embed=semantic_embedding):
+    import ingest_qdrant
+    import rag_qdrant
+    from lexical import LEXICAL_VECTOR_NAME
+    from qdrant_client import AsyncQdrantClient, models
+
+    client = AsyncQdrantClient(location=":memory:")
+    await client.create_collection(
+        collection_name=rag_qdrant.COLLECTION_NAME,
+        vectors_config=models.VectorParams(size=EMBED_DIM, distance=models.Distance.COSINE),
+        sparse_vectors_config={LEXICAL_VECTOR_NAME: models.SparseVectorParams(modifier=models.Modifier.IDF)},
+    )
+    points = []
+    for row in tickets:
+        record = ingest_qdrant.make_record(row)
+        points.append(ingest_qdrant.build_point(record, embed(record["embedding_text"]), lexical=True))
+    for start in range(0, len(points), 500):
+        await client.upsert(collection_name=rag_qdrant.COLLECTION_NAME, points=points[start:start + 500])
+    return client
+
+
+async def evaluate(queries, ks, modes):
+    import rag_qdrant
+
+    results = {}
+    depth = max(ks)
+    for mode in modes:
+        recalls = {k: [] for k in ks}
+        timings = []
+        for item in queries:
+            started = time.perf_counter()
+            points = await rag_qdrant.search_candidates(
+                semantic_embedding(item["query"]), item["query"], mode=mode, limit=depth
+            )
+            timings.append((time.perf_counter() - started) * 1000)
+            ranked = [point.payload["ticket_id"] for point in points]
+            for k in ks:
+                hits = len(item["relevant"].intersection(ranked[:k]))
+                recalls[k].append(hits / len(item["relevant"]))
+        results[mode] = {
+            **{f"recall@{k}": round(sum(values) / len(values), 3) for k, values in recalls.items()},
+            "p50_ms": round(percentile(timings, 50), 2),
+            "p95_ms": round(percentile(timings, 95), 2),
+        }
+    return results
+
+
+async def run(args):
+    import rag_qdrant
+
+    tickets = labelled_corpus(args.tickets, args.codes)
+    queries = labelled_queries(tickets, args.codes, args.queries)
+    rag_qdrant.qdrant = await build_collection(tickets)
+    # Rank-only comparison: no cosine cut-off on the dense side
+    rag_qdrant.SIMILARITY_THRESHOLD = None
+    return await evaluate(queries, args.k, args.modes)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tickets", type=int, default=5000)
+    parser.add_argument("--codes", type=int, default=1000, help="Distinct identifiers across the corpus")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, nargs="+", default=[5, 10])
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=MODES)
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    configure_env("http://127.0.0.1:9")
+    results = asyncio.run(run(args))
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{args.tickets} tickets, {min(args.queries, args.codes)} identifier queries")
+    columns = [f"recall@{k}" for k in args.k] + ["p50_ms", "p95_ms"]
+    print(f"{'mode':>8} " + " ".join(f"{column:>10}" for column in columns))
+    for mode, row in results.items():
+        print(f"{mode:>8} " + " ".join(f"{row[column]:>10}" for column in columns))
+
+
+if __name__ == "__main__":
+    main()
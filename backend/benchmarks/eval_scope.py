@@ -0,0 +1,169 @@
+"""Offline eval of category/language-scoped retrieval.
+
+Builds a multilingual corpus in an in-memory Qdrant: every common issue
+belongs to a category and is reported in English, German or French (the
+issue text plus a phrase in that language). A query describes an issue in
+one language; the relevant tickets are those with the same issue and
+language. Each query runs unscoped, with an explicit category + language
+scope, and with the scope auto-detected from the query text (language
+from function words, category from the naive Bayes classifier fitted on
+the indexed tickets). Reports precision@k, search latency and how often
+auto-detection picked the right scope.
+
+The in-memory client filters by scanning payloads, so absolute latencies
+only hint at what Qdrant's keyword payload indexes do on a real server.
+
+    python benchmarks/eval_scope.py --tickets 20000 --queries 200 --k 5
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+
+from fakes import ISSUES, configure_env, fake_embedding, percentile
+
+CATEGORIES = {
+    ISSUES[0]: "Network", ISSUES[4]: "Network",
+    ISSUES[1]: "Access", ISSUES[7]: "Access", ISSUES[8]: "Access",
+    ISSUES[2]: "Email", ISSUES[9]: "Email",
+    ISSUES[3]: "Hardware", ISSUES[5]: "Hardware",
+    ISSUES[6]: "Collaboration",
+}
+PHRASES = {
+    "English": ["it is not working since this morning", "the problem is back after the update",
+                "this happens when I start my laptop"],
+    "German": ["das funktioniert seit heute Morgen nicht mehr", "der Fehler ist nach dem Update wieder da",
+               "das passiert wenn ich mein Notebook starte"],
+    "French": ["cela ne fonctionne plus depuis ce matin", "le problème est revenu avec la mise à jour",
+               "cela arrive quand je démarre mon poste"],
+}
+MODES = ["unscoped", "explicit", "auto"]
+
+
+def scoped_corpus(count: int, seed: int = 11):
+    rng = random.Random(seed)
+    tickets = []
+    for i in range(count):
+        issue = ISSUES[i % len(ISSUES)]
+        language = list(PHRASES)[(i // len(ISSUES)) % len(PHRASES)]
+        tickets.append({
+            "TicketID": f"TKT-{i:06d}",
+            "problem_text": f"{issue}, {rng.choice(PHRASES[language])}",
+            "resolution_text": f"Ticket {i}: {issue.lower()}, {rng.choice(PHRASES[language])}; "
+                               f"fixed by restarting the affected service.",
+            "language": language,
+            "category": CATEGORIES[issue],
+        })
+    return tickets
+
+
+def scoped_queries(tickets, count: int, seed: int = 13):
+    rng = random.Random(seed)
+    relevant = {}
+    for ticket in tickets:
+        issue = ticket["problem_text"].split(",")[0]
+        relevant.setdefault((issue, ticket["language"]), set()).add(ticket["TicketID"])
+    queries = []
+    for _ in range(count):
+        issue, language = rng.choice(sorted(relevant))
+        words = issue.lower().split()
+        phrase = " ".join(rng.sample(words, max(3, len(words) // 2)))
+        queries.append({
+            "query": f"{phrase}, {rng.choice(PHRASES[language])}",
+            "category": CATEGORIES[issue],
+            "language": language,
+            "relevant": relevant[(issue, language)],
+        })
+    return queries
+
+
+async def build_collection(tickets):
+    import ingest_qdrant
+    import rag_qdrant
+    from collection_profiles import PAYLOAD_INDEXES
+    from qdrant_client import AsyncQdrantClient, models
+
+    client = AsyncQdrantClient(location=":memory:")
+    await client.create_collection(
+        collection_name=rag_qdrant.COLLECTION_NAME,
+        vectors_config=models.VectorParams(size=len(fake_embedding("")), distance=models.Distance.COSINE),
+    )
+    for field, schema in PAYLOAD_INDEXES.items():
+        await client.create_payload_index(collection_name=rag_qdrant.COLLECTION_NAME, field_name=field,
+                                          field_schema=schema)
+    points = []
+    for row in tickets:
+        record = ingest_qdrant.make_record(row)
+        points.append(ingest_qdrant.build_point(record, fake_embedding(record["embedding_text"])))
+    for start in range(0, len(points), 1000):
+        await client.upsert(collection_name=rag_qdrant.COLLECTION_NAME, points=points[start:start + 1000])
+    return client
+
+
+async def evaluate(queries, k: int, modes):
+    import rag_qdrant
+
+    results = {}
+    for mode in modes:
+        precision, timings, detected_right = [], [], []
+        for item in queries:
+            scope = None
+            if mode == "explicit":
+                scope = {"categories": [item["category"]], "languages": [item["language"]]}
+            elif mode == "auto":
+                scope = {"auto": True}
+            vector = fake_embedding(item["query"])
+            started = time.perf_counter()
+            explicit, detected = await rag_qdrant.resolve_scope(item["query"], scope)
+            points = await rag_qdrant.search_scoped(vector, item["query"], explicit, detected)
+            timings.append((time.perf_counter() - started) * 1000)
+            ranked = [point.payload["ticket_id"] for point in points][:k]
+            precision.append(len(item["relevant"].intersection(ranked)) / k)
+            if mode == "auto":
+                detected_right.append(detected.get("category") == [item["category"]] and
+                                      detected.get("language") == [item["language"]])
+        results[mode] = {
+            f"precision@{k}": round(sum(precision) / len(precision), 3),
+            "p50_ms": round(percentile(timings, 50), 2),
+            "p95_ms": round(percentile(timings, 95), 2),
+        }
+        if detected_right:
+            results[mode]["scope_detected"] = round(sum(detected_right) / len(detected_right), 3)
+    return results
+
+
+async def run(args):
+    import rag_qdrant
+
+    tickets = scoped_corpus(args.tickets)
+    queries = scoped_queries(tickets, args.queries)
+    rag_qdrant.qdrant = await build_collection(tickets)
+    rag_qdrant.SIMILARITY_THRESHOLD = None
+    rag_qdrant.RETRIEVAL_MODE = "dense"
+    await rag_qdrant.scope_index.refresh(rag_qdrant.qdrant, rag_qdrant.COLLECTION_NAME, force=True)
+    return await evaluate(queries, args.k, args.modes)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tickets", type=int, default=5000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=MODES)
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    configure_env("http://127.0.0.1:9")
+    results = asyncio.run(run(args))
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{args.tickets} tickets, {args.queries} queries")
+    for mode, row in results.items():
+        print(f"{mode:>9}: {row}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,268 @@
+"""Local stand-ins for Azure OpenAI used by the benchmark scripts.
+
+The fake server speaks just enough of the Azure OpenAI REST API for the
+`openai` SDK (embeddings + chat completions) and injects configurable
+latency, so benchmarks exercise the real client code paths without
+touching a paid deployment.
+"""
+import asyncio
+import hashlib
+import json
+import math
+import os
+import re
+import random
+import socket
+import sys
+import time
+import multiprocessing
+from collections import deque
+from typing import Optional
+
+import httpx
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+EMBED_DIM = 64
+CHAT_DEPLOYMENT = "bench-chat"
+EMBEDDING_DEPLOYMENT = "bench-embedding"
+API_VERSION = "2024-06-01"
+
+ISSUES = [
+    "VPN client is not connecting from the home office network",
+    "Password reset link has expired for my user account",
+    "Outlook keeps asking for credentials after the update",
+    "Laptop docking station does not detect the external monitor",
+    "Shared network drive is not mapped after login",
+    "Printer on the third floor shows paper jam error",
+    "Teams meeting audio drops every few minutes",
+    "Cannot install software because admin rights are missing",
+    "SAP login fails with error code 401 unauthorized",
+    "Mobile phone does not sync corporate email anymore",
+]
+FOLLOW_UP_PATTERN = re.compile(r"\b(it|that|them|they|other)\b", re.IGNORECASE)
+
+
+def fake_embedding(text: str, dim: int = EMBED_DIM):
+    """Deterministic bag-of-words embedding: similar wording -> high cosine."""
+    vector = [0.0] * dim
+    for token in text.lower().split():
+        digest = hashlib.blake2b(token.encode(), digest_size=4).digest()
+        bucket = int.from_bytes(digest, "little")
+        vector[bucket % dim] += 1.0 if bucket & 0x80000000 else -1.0
+    norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+    return [v / norm for v in vector]
+
+
+def synthetic_tickets(count: int):
+    tickets = []
+    for i in range(count):
+        issue = ISSUES[i % len(ISSUES)]
+        tickets.append({
+            "ticket_id": f"TKT-{i:06d}",
+            "problem_text": f"{issue} (ticket {i})",
+            "resolution_text": f"Resolution for ticket {i}: {issue.lower()} was fixed by "
+                               f"restarting the affected service and re-applying the profile.",
+            "language": "en",
+            "category": "it",
+        })
+    return tickets
+
+
+def create_fake_openai_app(embed_latency: float = 0.05, chat_latency: float = 0.5,
+                           embed_latency_per_item: float = 0.0,
+                           embed_quota_per_second: Optional[int] = None, error_status: Optional[int] = None,
+                           slow_share: float = 0.0, slow_factor: float = 10.0, seed: int = 0) -> FastAPI:
+    """Fake Azure OpenAI.
+
+    embed_quota_per_second caps embedded texts per rolling second; requests
+    over the quota get a 429 with retry-after-ms, like an exhausted TPM quota.
+    error_status answers every request with that status (429 = a region out
+    of quota, 503 = an outage). slow_share of chat completions take
+    slow_factor times chat_latency, for tail-latency experiments.
+    """
+    app = FastAPI()
+    app.state.calls = {"embeddings": 0, "chat": 0, "throttled": 0, "errors": 0}
+    window = deque()
+    rng = random.Random(seed)
+
+    def injected_error():
+        app.state.calls["errors"] += 1
+        return JSONResponse(
+            status_code=error_status,
+            headers={"retry-after-ms": "1000"} if error_status == 429 else {},
+            content={"error": {"code": str(error_status), "message": "Injected failure"}},
+        )
+
+    @app.get("/_stats")
+    async def stats():
+        return app.state.calls
+
+    @app.get("/openai/models")
+    async def models():
+        return {"object": "list", "data": []}
+
+    @app.post("/openai/deployments/{deployment}/embeddings")
+    async def embeddings(deployment: str, request: Request):
+        if error_status:
+            return injected_error()
+        body = await request.json()
+        inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+        if embed_quota_per_second is not None:
+            now = time.monotonic()
+            while window and now - window[0][0] > 1.0:
+                window.popleft()
+            used = sum(count for _, count in window)
+            if used + len(inputs) > embed_quota_per_second:
+                app.state.calls["throttled"] += 1
+                retry_ms = int((1.0 - (now - window[0][0])) * 1000) + 1 if window else 100
+                return JSONResponse(
+                    status_code=429,
+                    headers={"retry-after-ms": str(retry_ms)},
+                    content={"error": {"code": "429", "message": "Rate limit exceeded"}},
+                )
+            window.append((now, len(inputs)))
+        app.state.calls["embeddings"] += 1
+        await asyncio.sleep(embed_latency + embed_latency_per_item * len(inputs))
+        return {
+            "object": "list",
+            "model": deployment,
+            "data": [
+                {"object": "embedding", "index": i, "embedding": fake_embedding(text)}
+                for i, text in enumerate(inputs)
+            ],
+            "usage": {"prompt_tokens": 0, "total_tokens": 0},
+        }
+
+    @app.post("/openai/deployments/{deployment}/chat/completions")
+    async def chat_completions(deployment: str, request: Request):
+        if error_status:
+            return injected_error()
+        body = await request.json()
+        app.state.calls["chat"] += 1
+        latency = chat_latency * (slow_factor if rng.random() < slow_share else 1.0)
+        prompt = body.get("messages", [{}])[-1].get("content", "")
+        question = re.findall(r'^Question: "(.*)"$', prompt, re.MULTILINE)
+        follow_up = bool(question and FOLLOW_UP_PATTERN.search(question[-1]))
+        # Follow-up classifier asks for a tiny YES/NO answer, the combined resolver for JSON
+        if body.get("max_tokens", 0) <= 5:
+            content = "YES" if follow_up else "NO"
+        elif '"standalone_question"' in prompt:
+            content = json.dumps({
+                "follow_up": follow_up,
+                "standalone_question": f"{ISSUES[0]} on the other laptop" if follow_up else "",
+            })
+        elif prompt.startswith("Rewrite the follow-up"):
+            content = f"{ISSUES[0]} on the other laptop"
+        else:
+            content = "1. Restart the affected service.\n2. Re-apply the user profile."
+        if body.get("stream"):
+            return StreamingResponse(_stream_chat(deployment, content, latency), media_type="text/event-stream")
+        await asyncio.sleep(latency)
+        return {
+            "id": "chatcmpl-bench",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": deployment,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }],
+            "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+        }
+
+    return app
+
+
+async def _stream_chat(deployment: str, content: str, latency: float):
+    """SSE chat completion; tokens are spread evenly over `latency` seconds."""
+    tokens = content.split(" ")
+    for i, token in enumerate(tokens):
+        await asyncio.sleep(latency / len(tokens))
+        chunk = {
+            "id": "chatcmpl-bench",
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": deployment,
+            "choices": [{
+                "index": 0,
+                "delta": {"content": token if i == 0 else " " + token},
+                "finish_reason": None,
+            }],
+        }
+        yield f"data: {json.dumps(chunk)}\n\n"
+    yield "data: [DONE]\n\n"
+
+
+class FakeServer:
+    """Runs an app factory with uvicorn in a separate process.
+
+    A separate process keeps the fake's event loop from competing for the
+    GIL with the code under test, which would otherwise dominate latency.
+    """
+
+    def __init__(self, factory, host: str = "127.0.0.1", port: int = 0,
+                 ready_path: str = "/_stats", **factory_kwargs):
+        self.host = host
+        self.ready_path = ready_path
+        self.port = port or _free_port()
+        context = multiprocessing.get_context("spawn")
+        self._process = context.Process(
+            target=_serve, args=(factory, factory_kwargs, host, self.port), daemon=True
+        )
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def stats(self) -> dict:
+        return httpx.get(f"{self.url}/_stats").json()
+
+    def __enter__(self):
+        self._process.start()
+        deadline = time.time() + 30
+        while time.time() < deadline:
+            try:
+                httpx.get(f"{self.url}{self.ready_path}").raise_for_status()
+                return self
+            except httpx.TransportError:
+                time.sleep(0.05)
+        raise RuntimeError("Fake server did not start")
+
+    def __exit__(self, *exc):
+        self._process.terminate()
+        self._process.join(timeout=5)
+
+
+def _serve(factory, factory_kwargs, host, port):
+    uvicorn.run(factory(**factory_kwargs), host=host, port=port, log_level="warning")
+
+
+def configure_env(openai_url: str):
+    """Point the backend modules at the fake server. Call before importing them."""
+    os.environ["AZURE_OPENAI_KEY"] = "bench-key"
+    os.environ["AZURE_OPENAI_ENDPOINT"] = openai_url
+    os.environ["AZURE_OPENAI_API_VERSION"] = API_VERSION
+    os.environ["AZURE_OPENAI_CHAT_DEPLOYMENT"] = CHAT_DEPLOYMENT
+    os.environ["AZURE_OPENAI_EMBEDDING_DEPLOYMENT"] = EMBEDDING_DEPLOYMENT
+    os.environ.setdefault("QDRANT_URL", "http://127.0.0.1:6333")
+
+
+def percentile(values, pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
@@ -0,0 +1,264 @@
+"""Contract checks for the TicketStore backends.
+
+Runs the same scenarios (ids, round-trips, comments and resolution,
+listing, keyset pages, analytics rollups, concurrent writers) against
+each backend on a fresh database and reports every check that fails.
+SQLite uses a temporary file; PostgreSQL creates a scratch database on
+the server at --database-url (needs CREATEDB) and drops it afterwards.
+
+    python benchmarks/store_contract.py --backends sqlite postgres \\
+        --database-url postgresql://postgres@localhost:5432/postgres
+
+tests/test_store_contract.py runs the same checks under pytest.
+"""
+import argparse
+import asyncio
+import inspect
+import os
+import sys
+import tempfile
+import traceback
+import uuid
+from datetime import datetime, timedelta, timezone
+from urllib.parse import urlsplit, urlunsplit
+
+import fakes  # noqa: F401  (puts the backend on sys.path)
+
+HISTORY = [{"role": "user", "content": "VPN drops"}, {"role": "assistant", "content": "Restart the client"}]
+
+
+def ticket(submitted_at: str, status: str = "pending", **extra):
+    return {
+        "user_query": "VPN client is not connecting",
+        "ai_answer": "1. Restart the VPN service.",
+        "user_feedback": "Did not help",
+        "status": status,
+        "submitted_at": submitted_at,
+        "conversation_history": HISTORY,
+        **extra,
+    }
+
+
+def comment(timestamp: str, author: str = "admin", **extra):
+    return {"author": author, "author_name": author.title(), "content": f"Note by {author}",
+            "timestamp": timestamp, **extra}
+
+
+def ago(**delta) -> str:
+    return (datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(**delta)).isoformat()
+
+
+def check(condition, message: str):
+    if not condition:
+        raise AssertionError(message)
+
+
+async def check_ticket_round_trip(db):
+    first = await db.create_ticket(ticket(ago(hours=2)))
+    second = await db.create_ticket(ticket(ago(hours=1), conversation_history=[]))
+    check(first.startswith("ESC-") and second.startswith("ESC-"), f"ticket ids {first}, {second}")
+    check(first != second, "ticket ids repeat")
+
+    stored = await db.get_ticket(first)
+    check(stored is not None, "created ticket not found")
+    for field in ("user_query", "ai_answer", "user_feedback", "status"):
+        check(stored[field] == ticket("")[field], f"{field} = {stored[field]!r}")
+    check(stored["conversation_history"] == HISTORY, f"history = {stored['conversation_history']!r}")
+    check(stored["comments"] == [], "new ticket has comments")
+    check(stored["created_at"] and stored["updated_at"], "created_at/updated_at not set")
+    check((await db.get_ticket(second))["conversation_history"] == [], "empty history not []")
+    check(await db.get_ticket("ESC-999999") is None, "unknown ticket is not None")
+
+
+async def check_comments_and_resolution(db):
+    ticket_id = await db.create_ticket(ticket(ago(hours=5)))
+    later = await db.create_comment(ticket_id, comment(ago(hours=1), author="user"))
+    earlier = await db.create_comment(ticket_id, comment(ago(hours=3)))
+    check(later.startswith("COMMENT-") and later != earlier, f"comment ids {later}, {earlier}")
+    check(await db.create_comment(ticket_id, {"author": "admin"}) is None, "incomplete comment accepted")
+
+    resolved_at = ago(hours=0)
+    updates = {"status": "resolved", "resolved_at": resolved_at, "resolved_by": "admin", "admin_solution": "Fixed"}
+    await db.create_comment(ticket_id, comment(resolved_at, type="resolution"), ticket_updates=updates)
+    stored = await db.get_ticket(ticket_id)
+    check([c["id"] for c in stored["comments"]][:2] == [earlier, later], "comments not oldest first")
+    check(stored["comments"][-1]["type"] == "resolution", "comment type lost")
+    check(stored["comments"][0]["type"] == "comment", "default comment type")
+    for field, value in updates.items():
+        check(stored[field] == value, f"{field} = {stored[field]!r} after resolution")
+
+    check(await db.update_ticket(ticket_id, {"user_query": "ignored"}) is False, "non-updatable field applied")
+    check(await db.update_ticket(ticket_id, {"status": "pending"}) is True, "update_ticket failed")
+    check((await db.get_ticket(ticket_id))["status"] == "pending", "status not updated")
+
+
+async def check_get_tickets(db):
+    tickets = await db.get_tickets()
+    submitted = [t["submitted_at"] for t in tickets]
+    check(submitted == sorted(submitted, reverse=True), "get_tickets not newest first")
+    for t in tickets:
+        check(t["comment_count"] == len(t["comments"]), f"{t['id']} comment_count mismatch")
+    pending = await db.get_tickets(status_filter="pending")
+    check(pending and all(t["status"] == "pending" for t in pending), "status filter")
+    light = await db.get_tickets(include_comments=False, include_history=False)
+    check(len(light) == len(tickets), "include flags change the result size")
+    check(all("comments" not in t and "conversation_history" not in t for t in light), "include flags ignored")
+
+
+async def check_pagination(db):
+    for i in range(7):
+        ticket_id = await db.create_ticket(ticket(f"2020-01-0{1 + i % 3}T10:00:00", "resolved" if i % 2 else "pending"))
+        if i % 3 == 0:
+            await db.create_comment(ticket_id, comment(f"2020-01-05T10:00:0{i}", author="pager"))
+    everything = await db.get_tickets(include_comments=False, include_history=False)
+    expected = [t["id"] for t in sorted(everything, key=lambda t: (t["submitted_at"], t["id"]), reverse=True)]
+
+    seen, cursor = [], None
+    while True:
+        page, cursor = await db.list_tickets(limit=3, cursor=cursor)
+        seen += [t["id"] for t in page]
+        check(len(page) <= 3, "page larger than limit")
+        if not cursor:
+            break
+    check(seen == expected, "pages skip, repeat or reorder tickets")
+
+    page, _ = await db.list_tickets(limit=50, status="resolved", submitted_from="2020-01-02", submitted_to="2020-01-03")
+    check(page and all(t["status"] == "resolved" and t["submitted_at"].startswith("2020-01-02") for t in page),
+          "status/date filters")
+    page, _ = await db.list_tickets(limit=50, author="pager", fields=["id", "comments"])
+    check(len(page) == 3 and all(c["author"] == "pager" for t in page for c in t["comments"]), "author filter")
+    check(set(page[0]) == {"id", "submitted_at", "comments"}, f"projection keys {sorted(page[0])}")
+    page, _ = await db.list_tickets(limit=1, fields=["id", "conversation_history", "comment_count"])
+    check(isinstance(page[0]["conversation_history"], list), "projected history not decoded")
+
+    for kwargs in ({"cursor": "not-a-cursor"}, {"limit": 0}, {"fields": ["password"]}):
+        try:
+            await db.list_tickets(**kwargs)
+        except ValueError:
+            continue
+        raise AssertionError(f"list_tickets({kwargs}) did not raise ValueError")
+
+
+async def check_analytics(db):
+    before = await db.get_analytics()
+    submitted_at = ago(days=2)
+    ticket_id = await db.create_ticket(ticket(submitted_at))
+    resolved_at = (datetime.fromisoformat(submitted_at) + timedelta(hours=6)).isoformat()
+    await db.create_comment(ticket_id, comment(resolved_at),
+                            ticket_updates={"status": "resolved", "resolved_at": resolved_at})
+    after = await db.get_analytics()
+    check(after["total_escalated_tickets"] == before["total_escalated_tickets"] + 1, "total not incremented")
+    check(after["resolved_tickets"] == before["resolved_tickets"] + 1, "resolved not incremented")
+    check(after["pending_tickets"] == before["pending_tickets"], "pending changed")
+    check(after["recent_tickets_7_days"] == before["recent_tickets_7_days"] + 1, "recent not incremented")
+    check(any(day["date"] == submitted_at[:10] for day in after["daily_stats"]), "day missing from daily_stats")
+    check(after["avg_resolution_hours"] > 0, "avg_resolution_hours")
+    check(await db.check_rollups() == [], "rollups drifted from the base tables")
+    await db.rebuild_rollups()
+    check(await db.get_analytics() == after, "rebuild changed the analytics")
+
+
+async def check_concurrent_writers(db):
+    stamp = ago(minutes=1)
+    ids = await asyncio.gather(*(db.create_ticket(ticket(stamp)) for _ in range(40)))
+    check(len(set(ids)) == len(ids), "concurrent create_ticket returned duplicate ids")
+    comments = await asyncio.gather(*(db.create_comment(ticket_id, comment(stamp)) for ticket_id in ids))
+    check(len(set(comments)) == len(comments), "concurrent create_comment returned duplicate ids")
+    check(await db.check_rollups() == [], "rollups drifted under concurrent writes")
+
+
+async def check_id_block_skips_taken_ids(db):
+    # SQLite only: PostgreSQL allocates from sequences, not counter blocks
+    if not hasattr(db, "db"):
+        return
+    from database import TicketDatabase
+
+    def scenario():
+        with db.db.pool.connection() as conn:
+            counter = conn.execute("SELECT value FROM counters WHERE name = 'ticket'").fetchone()[0]
+        # A second process whose first block [counter+1, counter+10] has an id taken in the middle
+        other = TicketDatabase(db.db.db_path, pool_size=2, id_block_size=10)
+        try:
+            taken = other.ticket_ids.format(counter + 5)
+            check(other.save_ticket(ticket(ago(minutes=1), id=taken)), "explicit ticket id not saved")
+            ids = [other.create_ticket(ticket(ago(minutes=1))) for _ in range(10)]
+            check(taken not in ids and len(set(ids)) == len(ids), f"block reissued {taken}")
+        finally:
+            other.close()
+
+    await asyncio.to_thread(scenario)
+    check(await db.check_rollups() == [], "rollups drifted after the id skip")
+
+
+CHECKS = [obj for name, obj in list(globals().items()) if name.startswith("check_") and inspect.iscoroutinefunction(obj)]
+
+
+async def scratch_postgres(database_url: str):
+    import asyncpg
+
+    name = f"itrs_contract_{uuid.uuid4().hex[:8]}"
+    conn = await asyncpg.connect(database_url)
+    try:
+        await conn.execute(f"CREATE DATABASE {name}")
+    finally:
+        await conn.close()
+    parts = urlsplit(database_url)
+    return name, urlunsplit(parts._replace(path=f"/{name}"))
+
+
+async def drop_postgres(database_url: str, name: str):
+    import asyncpg
+
+    conn = await asyncpg.connect(database_url)
+    try:
+        await conn.execute(f"DROP DATABASE IF EXISTS {name}")
+    finally:
+        await conn.close()
+
+
+async def run_backend(backend: str, database_url: str) -> int:
+    from storage import create_store
+
+    scratch = None
+    if backend == "postgres":
+        scratch, dsn = await scratch_postgres(database_url)
+        db = create_store("postgres", database_url=dsn)
+    else:
+        db = create_store("sqlite", db_path=os.path.join(tempfile.mkdtemp(prefix="itrs-contract-"), "tickets.db"))
+
+    failures = 0
+    try:
+        await db.init()
+        for contract in CHECKS:
+            try:
+                await contract(db)
+                print(f"✅ {backend}: {contract.__name__}")
+            except Exception as e:
+                failures += 1
+                print(f"❌ {backend}: {contract.__name__}: {e}")
+                if not isinstance(e, AssertionError):
+                    traceback.print_exc()
+    finally:
+        await db.close()
+        if scratch:
+            await drop_postgres(database_url, scratch)
+    return failures
+
+
+def main():
+    from storage import DATABASE_URL
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", nargs="+", choices=["sqlite", "postgres"], default=["sqlite", "postgres"])
+    parser.add_argument("--database-url", default=DATABASE_URL, help="Server for the scratch PostgreSQL database")
+    args = parser.parse_args()
+
+    failures = 0
+    for backend in args.backends:
+        failures += asyncio.run(run_backend(backend, args.database_url))
+    print(f"{'❌' if failures else '✅'} {failures} failed checks")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
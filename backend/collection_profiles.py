@@ -0,0 +1,102 @@
+import os
+from typing import Dict, Optional
+
+from qdrant_client import models
+
+# Storage/search trade-offs for the ticket collection. ingest_qdrant.py builds
+# the collection with a profile and stamps its name into the collection
+# metadata; the API reads QDRANT_COLLECTION_PROFILE for the matching search
+# params, so both sides must use the same value.
+#
+#   default  float32 vectors and HNSW graph in RAM (Qdrant defaults)
+#   scalar   int8 copy in RAM (4x smaller), originals on disk for rescoring
+#   binary   1-bit copy in RAM (32x smaller), originals on disk; best for
+#            1536+ dim OpenAI embeddings, needs more oversampling
+#   disk     vectors, HNSW graph and payload on disk; smallest RAM, slowest
+PROFILES = {
+    "default": {
+        "quantization": None, "on_disk_vectors": False, "on_disk_payload": False, "hnsw_on_disk": False,
+        "hnsw_m": None, "hnsw_ef_construct": None, "hnsw_ef": None, "oversampling": None,
+    },
+    "scalar": {
+        "quantization": "scalar", "on_disk_vectors": True, "on_disk_payload": True, "hnsw_on_disk": False,
+        "hnsw_m": 16, "hnsw_ef_construct": 100, "hnsw_ef": 128, "oversampling": 2.0,
+    },
+    "binary": {
+        "quantization": "binary", "on_disk_vectors": True, "on_disk_payload": True, "hnsw_on_disk": False,
+        "hnsw_m": 16, "hnsw_ef_construct": 100, "hnsw_ef": 128, "oversampling": 3.0,
+    },
+    "disk": {
+        "quantization": None, "on_disk_vectors": True, "on_disk_payload": True, "hnsw_on_disk": True,
+        "hnsw_m": 16, "hnsw_ef_construct": 100, "hnsw_ef": 64, "oversampling": None,
+    },
+}
+COLLECTION_PROFILE = os.getenv("QDRANT_COLLECTION_PROFILE", "default").lower()
+
+# Filterable payload fields get keyword indexes so filtered searches stay on the HNSW path
+PAYLOAD_INDEXES = {
+    "category": models.PayloadSchemaType.KEYWORD,
+    "language": models.PayloadSchemaType.KEYWORD,
+}
+
+
+def get_profile(name: Optional[str] = None) -> Dict:
+    """Profile settings, with QDRANT_HNSW_M / _EF_CONSTRUCT / _EF and QDRANT_OVERSAMPLING overrides."""
+    name = (name or COLLECTION_PROFILE).lower()
+    if name not in PROFILES:
+        raise ValueError(f"Unknown collection profile '{name}'. Use one of: {', '.join(PROFILES)}")
+    profile = dict(PROFILES[name], name=name)
+    for key, env in (("hnsw_m", "QDRANT_HNSW_M"), ("hnsw_ef_construct", "QDRANT_HNSW_EF_CONSTRUCT"),
+                     ("hnsw_ef", "QDRANT_HNSW_EF")):
+        if os.getenv(env):
+            profile[key] = int(os.getenv(env))
+    if os.getenv("QDRANT_OVERSAMPLING"):
+        profile["oversampling"] = float(os.getenv("QDRANT_OVERSAMPLING"))
+    return profile
+
+
+def collection_config(profile: Dict, dim: int) -> Dict:
+    """create_collection keyword arguments for the dense vector side of a profile."""
+    hnsw = {key: profile[f"hnsw_{key}"] for key in ("m", "ef_construct") if profile[f"hnsw_{key}"]}
+    if profile["hnsw_on_disk"]:
+        hnsw["on_disk"] = True
+    quantization = None
+    if profile["quantization"] == "scalar":
+        quantization = models.ScalarQuantization(scalar=models.ScalarQuantizationConfig(
+            type=models.ScalarType.INT8, quantile=0.99, always_ram=True,
+        ))
+    elif profile["quantization"] == "binary":
+        quantization = models.BinaryQuantization(binary=models.BinaryQuantizationConfig(always_ram=True))
+    return {
+        "vectors_config": models.VectorParams(
+            size=dim, distance=models.Distance.COSINE, on_disk=profile["on_disk_vectors"] or None,
+        ),
+        "hnsw_config": models.HnswConfigDiff(**hnsw) if hnsw else None,
+        "quantization_config": quantization,
+        "on_disk_payload": profile["on_disk_payload"] or None,
+    }
+
+
+def search_params(profile: Dict) -> Optional[models.SearchParams]:
+    """Query-time params matching how the collection was built."""
+    quantization = None
+    if profile["quantization"]:
+        quantization = models.QuantizationSearchParams(rescore=True, oversampling=profile["oversampling"])
+    if profile["hnsw_ef"] is None and quantization is None:
+        return None
+    return models.SearchParams(hnsw_ef=profile["hnsw_ef"], quantization=quantization)
+
+
+def estimate_ram_bytes(profile: Dict, points: int, dim: int) -> int:
+    """Rough resident size of vectors, quantized copies and the HNSW graph (payload excluded)."""
+    total = 0
+    if not profile["on_disk_vectors"]:
+        total += points * dim * 4
+    if profile["quantization"] == "scalar":
+        total += points * dim
+    elif profile["quantization"] == "binary":
+        total += points * dim // 8
+    if not profile["hnsw_on_disk"]:
+        # Level-0 links are 2*m per point, 4-byte ids
+        total += points * 2 * (profile["hnsw_m"] or 16) * 4
+    return total
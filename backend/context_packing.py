@@ -0,0 +1,110 @@
+import os
+import html
+import logging
+from typing import Dict, List, Optional, Tuple
+
+import tiktoken
+
+logger = logging.getLogger(__name__)
+
+# Room left for the system prompt, history and the answer
+PROMPT_RESERVE_TOKENS = int(os.getenv("PROMPT_RESERVE_TOKENS", "500"))
+# A solution is only cut to fit the remaining budget if at least this much of it survives
+MIN_TRUNCATED_TOKENS = int(os.getenv("MIN_TRUNCATED_TOKENS", "64"))
+TRUNCATION_MARKER = " ..."
+
+# The tokenizer may need a network download; count_tokens falls back to word counts
+try:
+    try:
+        TOKENIZER = tiktoken.encoding_for_model("gpt-4")
+    except KeyError:
+        TOKENIZER = tiktoken.get_encoding("cl100k_base")
+    TOKENIZER_NAME = TOKENIZER.name
+except Exception as e:
+    TOKENIZER = None
+    TOKENIZER_NAME = "words"
+    logger.error(f"Tokenizer init error: {e}")
+
+
+def count_tokens(text: str) -> int:
+    if TOKENIZER is None:
+        return len(text.split())
+    return len(TOKENIZER.encode(text))
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Cut text at a token boundary so it encodes to at most max_tokens."""
+    if TOKENIZER is None:
+        return " ".join(text.split()[:max_tokens])
+    return TOKENIZER.decode(TOKENIZER.encode(text)[:max_tokens])
+
+
+def solution_text(payload: Dict) -> str:
+    """The text of a point that goes into the prompt: resolution, else problem."""
+    text = payload.get("resolution_text") or payload.get("problem_text") or ""
+    return html.unescape(text).strip()
+
+
+def cached_token_count(payload: Dict) -> Optional[int]:
+    """Token count stored at ingest, if it was made with the tokenizer in use here."""
+    if payload.get("context_tokenizer") != TOKENIZER_NAME:
+        return None
+    return payload.get("context_tokens")
+
+
+def _wrap(number: int, text: str) -> str:
+    return f"<solution_{number}>\n{text}\n</solution_{number}>\n\n"
+
+
+# Tokens the <solution_N> wrapper adds around each solution
+WRAPPER_TOKENS = count_tokens(_wrap(1, ""))
+
+
+def pack_context(solutions: List[Dict], budget: int, max_solutions: int) -> Tuple[str, List[Dict], int]:
+    """
+    Fill `budget` tokens with the best of the first `max_solutions` solutions.
+
+    Solutions come in the caller's preference order (by score, or MMR
+    selection order with DEDUP_MODE=mmr, which is not sorted by score) and
+    carry "text", "score", "source_id" and optional "fused_score" and
+    "tokens". When they don't all fit, they are taken greedily by score
+    (fused_score when present) per token, and the first one that no longer
+    fits is truncated at a token boundary if enough of it survives.
+    Returns (context, sources, tokens used), numbered in input order.
+    """
+    candidates = []
+    for rank, solution in enumerate(solutions[:max_solutions]):
+        tokens = solution.get("tokens")
+        if tokens is None:
+            tokens = count_tokens(solution["text"])
+        candidates.append((rank, solution, tokens + WRAPPER_TOKENS))
+
+    chosen = {}
+    total = sum(cost for _, _, cost in candidates)
+    if total <= budget:
+        chosen = {rank: solution["text"] for rank, solution, _ in candidates}
+        used = total
+    else:
+        remaining = budget
+        truncated = False
+        by_density = sorted(candidates, key=lambda c: c[1].get("fused_score", c[1]["score"]) / c[2], reverse=True)
+        for rank, solution, cost in by_density:
+            if cost <= remaining:
+                chosen[rank] = solution["text"]
+                remaining -= cost
+            elif not truncated and remaining - WRAPPER_TOKENS >= MIN_TRUNCATED_TOKENS:
+                keep = remaining - WRAPPER_TOKENS - count_tokens(TRUNCATION_MARKER)
+                chosen[rank] = truncate_to_tokens(solution["text"], keep) + TRUNCATION_MARKER
+                remaining = 0
+                truncated = True
+        used = budget - remaining
+
+    parts = []
+    sources = []
+    for rank, solution, _ in candidates:
+        if rank not in chosen:
+            continue
+        number = len(sources) + 1
+        parts.append(_wrap(number, chosen[rank]))
+        sources.append({"number": number, "ticket_id": solution["source_id"], "score": solution["score"]})
+    return "".join(parts), sources, used
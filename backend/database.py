@@ -1,18 +1,244 @@
+import os
+import base64
+import queue
 import sqlite3
 import json
+import threading
+from contextlib import contextmanager
 from typing import List, Dict, Optional
 import logging
+from metrics import timed
 
 logger = logging.getLogger(__name__)
 
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "8"))
+DB_SYNCHRONOUS = os.getenv("DB_SYNCHRONOUS", "NORMAL").upper()
+DB_BUSY_TIMEOUT_SECONDS = float(os.getenv("DB_BUSY_TIMEOUT_SECONDS", "30"))
+DB_ID_BLOCK_SIZE = int(os.getenv("DB_ID_BLOCK_SIZE", "100"))
+SYNCHRONOUS_MODES = ("OFF", "NORMAL", "FULL", "EXTRA")
+TICKET_COLUMNS = (
+    "id", "user_query", "ai_answer", "user_feedback", "status", "submitted_at",
+    "resolved_at", "resolved_by", "admin_solution", "created_at", "updated_at",
+)
+LIST_FIELDS = TICKET_COLUMNS + ("conversation_history", "comment_count", "comments")
+DEFAULT_PAGE_FIELDS = TICKET_COLUMNS + ("comment_count",)
+MAX_PAGE_SIZE = 200
+
+# Fresh aggregates over the base tables, shared by the rollup backfill and the consistency check
+STATUS_ROLLUP_QUERY = """
+    SELECT COALESCE(status, '') AS status, COUNT(*) AS ticket_count,
+           COALESCE(SUM(hours), 0) AS resolution_hours_sum, COUNT(hours) AS resolution_hours_count
+    FROM (SELECT status, (julianday(resolved_at) - julianday(submitted_at)) * 24 AS hours FROM tickets)
+    GROUP BY 1
+"""
+DAILY_ROLLUP_QUERY = """
+    SELECT day, SUM(submitted) AS submitted_count, SUM(commented) AS comment_count
+    FROM (
+        SELECT date(submitted_at) AS day, 1 AS submitted, 0 AS commented FROM tickets
+        UNION ALL
+        SELECT date(timestamp) AS day, 0 AS submitted, 1 AS commented FROM comments
+    )
+    WHERE day IS NOT NULL
+    GROUP BY day
+"""
+
+
+def as_dict(data) -> Dict:
+    """Ticket/comment payloads arrive as pydantic models or plain dicts."""
+    if hasattr(data, 'model_dump'):
+        return data.model_dump()
+    if hasattr(data, 'dict'):
+        return data.dict()
+    return dict(data)
+
+
+def page_fields(fields: Optional[List[str]], limit: int) -> List[str]:
+    """Validates a list_tickets projection and page size. Raises ValueError."""
+    fields = list(fields or DEFAULT_PAGE_FIELDS)
+    unknown = [field for field in fields if field not in LIST_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}. Allowed: {', '.join(LIST_FIELDS)}")
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise ValueError(f"limit must be between 1 and {MAX_PAGE_SIZE}")
+    return fields
+
+
+def encode_cursor(submitted_at: str, ticket_id: str) -> str:
+    raw = json.dumps([submitted_at, ticket_id]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def decode_cursor(cursor: str):
+    try:
+        submitted_at, ticket_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return str(submitted_at), str(ticket_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
+class ConnectionPool:
+    """Thread-safe pool of SQLite connections tuned for concurrent writers.
+
+    Connections are opened lazily up to `size`, run in WAL mode and are
+    handed out LIFO so the warmest connection (and its prepared statement
+    cache) is reused first. Transactions are explicit: `transaction()`
+    takes the write lock up front with BEGIN IMMEDIATE, so concurrent
+    writers queue on the busy timeout instead of failing on lock upgrade.
+    """
+
+    def __init__(self, db_path: str, size: int = DB_POOL_SIZE, synchronous: str = DB_SYNCHRONOUS,
+                 busy_timeout: float = DB_BUSY_TIMEOUT_SECONDS):
+        if synchronous not in SYNCHRONOUS_MODES:
+            raise ValueError(f"synchronous must be one of {', '.join(SYNCHRONOUS_MODES)}")
+        self.db_path = db_path
+        self.size = size
+        self.synchronous = synchronous
+        self.busy_timeout = busy_timeout
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._opened: List[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+
+    def _open(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=self.busy_timeout,
+            isolation_level=None,
+            check_same_thread=False,
+            cached_statements=256,
+        )
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        # NORMAL is durable in WAL mode except for the last commits on power loss
+        conn.execute(f"PRAGMA synchronous={self.synchronous}")
+        with self._lock:
+            self._opened.append(conn)
+        return conn
+
+    @contextmanager
+    def connection(self):
+        self._slots.acquire()
+        try:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                conn = self._open()
+            try:
+                yield conn
+            finally:
+                if conn.in_transaction:
+                    conn.rollback()
+                self._idle.put(conn)
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def transaction(self):
+        with self.connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.rollback()
+                raise
+            conn.commit()
+
+    def close(self):
+        with self._lock:
+            for conn in self._opened:
+                conn.close()
+            self._opened.clear()
+        self._idle = queue.LifoQueue()
+
+
+class IdAllocator:
+    """Hands out PREFIX-000123 ids from blocks reserved in the counters table.
+
+    Each process reserves `block_size` ids in one short transaction and
+    serves them from memory, so writes no longer touch the counters row
+    and startup needs no scan. Ids are unique and increasing within a
+    process; across workers they interleave, and the unused rest of a
+    block is skipped when the process exits.
+
+    When any id of a reserved block is taken already (ids written
+    around the counter, e.g. a restored backup), the counter is moved
+    past the highest id in the table once and the block re-reserved.
+    """
+
+    def __init__(self, pool: ConnectionPool, name: str, prefix: str, table: str,
+                 block_size: int = DB_ID_BLOCK_SIZE):
+        if block_size < 1:
+            raise ValueError("block_size must be at least 1")
+        self.pool = pool
+        self.name = name
+        self.prefix = prefix
+        self.table = table
+        self.block_size = block_size
+        self._lock = threading.Lock()
+        self._next = 0
+        self._end = 0
+
+    def format(self, value: int) -> str:
+        return f"{self.prefix}-{value:06d}"
+
+    def next_id(self) -> str:
+        """Never call while holding a write transaction: a new block needs its own."""
+        with self._lock:
+            if self._next >= self._end:
+                self._next, self._end = self._reserve()
+            value = self._next
+            self._next += 1
+        return self.format(value)
+
+    def _reserve(self):
+        with self.pool.transaction() as conn:
+            conn.execute("UPDATE counters SET value = value + ? WHERE name = ?", (self.block_size, self.name))
+            last = conn.execute("SELECT value FROM counters WHERE name = ?", (self.name,)).fetchone()[0]
+            first = last - self.block_size + 1
+            if self._taken(conn, first, last):
+                highest = conn.execute(f"""
+                    SELECT MAX(CAST(substr(id, {len(self.prefix) + 2}) AS INTEGER))
+                    FROM {self.table} WHERE id LIKE '{self.prefix}-%'
+                """).fetchone()[0]
+                first = max(first, highest + 1)
+                last = first + self.block_size - 1
+                conn.execute("UPDATE counters SET value = ? WHERE name = ?", (last, self.name))
+                logger.info(f"{self.name} id counter was behind the data, moved to {last}")
+        return first, last + 1
+
+    def _taken(self, conn, first: int, last: int) -> bool:
+        """Whether any id in [first, last] exists, via primary-key range scans.
+
+        Ids of one width sort like their numbers, so each width the range
+        spans (PREFIX-999999 -> PREFIX-1000000) gets its own BETWEEN.
+        """
+        while first <= last:
+            width = max(6, len(str(first)))
+            end = min(last, 10 ** width - 1)
+            hit = conn.execute(
+                f"SELECT 1 FROM {self.table} WHERE id BETWEEN ? AND ? LIMIT 1", (self.format(first), self.format(end))
+            ).fetchone()
+            if hit:
+                return True
+            first = end + 1
+        return False
+
+
 class TicketDatabase:
-    def __init__(self, db_path: str = "tickets.db"):
+    def __init__(self, db_path: str = "tickets.db", pool_size: int = DB_POOL_SIZE, synchronous: str = DB_SYNCHRONOUS,
+                 id_block_size: int = DB_ID_BLOCK_SIZE):
         self.db_path = db_path
+        self.pool = ConnectionPool(db_path, size=pool_size, synchronous=synchronous)
         self.init_database()
+        self.ticket_ids = IdAllocator(self.pool, "ticket", "ESC", "tickets", id_block_size)
+        self.comment_ids = IdAllocator(self.pool, "comment", "COMMENT", "comments", id_block_size)
+    
+    def close(self):
+        self.pool.close()
     
     def init_database(self):
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self.pool.transaction() as conn:
                 cursor = conn.cursor()
                 
                 cursor.execute("""
@@ -48,6 +274,11 @@ class TicketDatabase:
                 cursor.execute("CREATE INDEX IF NOT EXISTS idx_tickets_status ON tickets(status)")
                 cursor.execute("CREATE INDEX IF NOT EXISTS idx_tickets_submitted_at ON tickets(submitted_at)")
                 cursor.execute("CREATE INDEX IF NOT EXISTS idx_comments_ticket_id ON comments(ticket_id)")
+                cursor.execute("CREATE INDEX IF NOT EXISTS idx_comments_ticket_timestamp ON comments(ticket_id, timestamp)")
+                # Keyset pagination walks (submitted_at, id), optionally within one status
+                cursor.execute("CREATE INDEX IF NOT EXISTS idx_tickets_submitted_id ON tickets(submitted_at, id)")
+                cursor.execute("CREATE INDEX IF NOT EXISTS idx_tickets_status_submitted_id ON tickets(status, submitted_at, id)")
+                cursor.execute("CREATE INDEX IF NOT EXISTS idx_comments_author ON comments(author, ticket_id)")
                 
                 cursor.execute("""
                     CREATE TABLE IF NOT EXISTS counters (
@@ -59,118 +290,180 @@ class TicketDatabase:
                 cursor.execute("INSERT OR IGNORE INTO counters (name, value) VALUES ('ticket', 1000)")
                 cursor.execute("INSERT OR IGNORE INTO counters (name, value) VALUES ('comment', 1000)")
                 
-                try:
+                columns = {row["name"] for row in cursor.execute("PRAGMA table_info(tickets)")}
+                if "conversation_history" not in columns:
                     cursor.execute("ALTER TABLE tickets ADD COLUMN conversation_history TEXT")
-                except sqlite3.OperationalError:
-                    pass
                 
-                conn.commit()
+                # Materialized analytics, maintained in the same transaction as every write
+                rollups_exist = cursor.execute(
+                    "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'ticket_status_stats'"
+                ).fetchone()
+                cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS ticket_status_stats (
+                        status TEXT PRIMARY KEY,
+                        ticket_count INTEGER NOT NULL DEFAULT 0,
+                        resolution_hours_sum REAL NOT NULL DEFAULT 0,
+                        resolution_hours_count INTEGER NOT NULL DEFAULT 0
+                    )
+                """)
+                cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS ticket_daily_stats (
+                        day TEXT PRIMARY KEY,
+                        submitted_count INTEGER NOT NULL DEFAULT 0,
+                        comment_count INTEGER NOT NULL DEFAULT 0
+                    )
+                """)
+                if not rollups_exist:
+                    self._rebuild_rollups(conn)
         except Exception as e:
             logger.error(f"Database init error: {e}")
             raise
     
+    @staticmethod
+    def _apply_status_rollup(conn, status: Optional[str], submitted_at: Optional[str],
+                             resolved_at: Optional[str], sign: int):
+        """Adds (sign=1) or removes (sign=-1) one ticket's contribution to ticket_status_stats."""
+        conn.execute("""
+            INSERT INTO ticket_status_stats (status, ticket_count, resolution_hours_sum, resolution_hours_count)
+            SELECT COALESCE(?, ''), ?, COALESCE(hours, 0) * ?, CASE WHEN hours IS NULL THEN 0 ELSE ? END
+            FROM (SELECT (julianday(?) - julianday(?)) * 24 AS hours) WHERE 1
+            ON CONFLICT(status) DO UPDATE SET
+                ticket_count = ticket_count + excluded.ticket_count,
+                resolution_hours_sum = resolution_hours_sum + excluded.resolution_hours_sum,
+                resolution_hours_count = resolution_hours_count + excluded.resolution_hours_count
+        """, (status, sign, sign, sign, resolved_at, submitted_at))
+    
+    @staticmethod
+    def _apply_daily_rollup(conn, timestamp: Optional[str], column: str):
+        conn.execute(f"""
+            INSERT INTO ticket_daily_stats (day, {column}) SELECT date(?), 1 WHERE date(?) IS NOT NULL
+            ON CONFLICT(day) DO UPDATE SET {column} = {column} + 1
+        """, (timestamp, timestamp))
+    
+    @staticmethod
+    def _rebuild_rollups(conn):
+        conn.execute("DELETE FROM ticket_status_stats")
+        conn.execute("DELETE FROM ticket_daily_stats")
+        conn.execute(f"""
+            INSERT INTO ticket_status_stats (status, ticket_count, resolution_hours_sum, resolution_hours_count)
+            {STATUS_ROLLUP_QUERY}
+        """)
+        conn.execute(f"INSERT INTO ticket_daily_stats (day, submitted_count, comment_count) {DAILY_ROLLUP_QUERY}")
+    
+    def rebuild_rollups(self):
+        """Backfills the analytics rollup tables from tickets and comments."""
+        try:
+            with self.pool.transaction() as conn:
+                self._rebuild_rollups(conn)
+        except Exception as e:
+            logger.error(f"Rollup backfill error: {e}")
+            raise
+    
+    def check_rollups(self) -> List[Dict]:
+        """
+        Compares the rollup tables with fresh aggregates over the base
+        tables in one read snapshot. Returns the mismatches (empty when
+        consistent) as {table, key, column, expected, actual}.
+        """
+        with self.pool.connection() as conn:
+            conn.execute("BEGIN")
+            try:
+                checks = [
+                    ("ticket_status_stats", "status", STATUS_ROLLUP_QUERY,
+                     "SELECT * FROM ticket_status_stats"),
+                    ("ticket_daily_stats", "day", DAILY_ROLLUP_QUERY,
+                     "SELECT * FROM ticket_daily_stats"),
+                ]
+                mismatches = []
+                for table, key, expected_query, actual_query in checks:
+                    expected = {row[key]: dict(row) for row in conn.execute(expected_query)}
+                    actual = {row[key]: dict(row) for row in conn.execute(actual_query)}
+                    for key_value in sorted(set(expected) | set(actual)):
+                        expected_row = expected.get(key_value, {})
+                        actual_row = actual.get(key_value, {})
+                        for column in (expected_row or actual_row):
+                            if column == key:
+                                continue
+                            want = expected_row.get(column, 0)
+                            got = actual_row.get(column, 0)
+                            if abs(want - got) > 1e-6:
+                                mismatches.append({
+                                    "table": table, "key": key_value, "column": column,
+                                    "expected": want, "actual": got,
+                                })
+                return mismatches
+            finally:
+                conn.rollback()
+    
     def get_next_ticket_id(self) -> str:
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                conn.isolation_level = 'EXCLUSIVE'
-                cursor = conn.cursor()
-                cursor.execute("UPDATE counters SET value = value + 1 WHERE name = 'ticket'")
-                cursor.execute("SELECT value FROM counters WHERE name = 'ticket'")
-                result = cursor.fetchone()
-                conn.commit()
-                return f"ESC-{result[0]:06d}"
+            return self.ticket_ids.next_id()
         except Exception as e:
             logger.error(f"Ticket ID generation error: {e}")
             raise
     
     def get_next_comment_id(self) -> str:
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                conn.isolation_level = 'EXCLUSIVE'
-                cursor = conn.cursor()
-                cursor.execute("UPDATE counters SET value = value + 1 WHERE name = 'comment'")
-                cursor.execute("SELECT value FROM counters WHERE name = 'comment'")
-                result = cursor.fetchone()
-                conn.commit()
-                return f"COMMENT-{result[0]:06d}"
+            return self.comment_ids.next_id()
         except Exception as e:
             logger.error(f"Comment ID generation error: {e}")
             raise
     
-    def sync_counters_with_data(self):
-        try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                
-                cursor.execute("SELECT id FROM tickets WHERE id LIKE 'ESC-%'")
-                max_ticket = 1000
-                for row in cursor.fetchall():
-                    try:
-                        num = int(row[0].split('-')[1])
-                        max_ticket = max(max_ticket, num)
-                    except:
-                        pass
-                
-                cursor.execute("SELECT id FROM comments WHERE id LIKE 'COMMENT-%'")
-                max_comment = 1000
-                for row in cursor.fetchall():
-                    try:
-                        num = int(row[0].split('-')[1])
-                        max_comment = max(max_comment, num)
-                    except:
-                        pass
-                
-                cursor.execute("UPDATE counters SET value = ? WHERE name = 'ticket' AND value < ?", (max_ticket, max_ticket))
-                cursor.execute("UPDATE counters SET value = ? WHERE name = 'comment' AND value < ?", (max_comment, max_comment))
-                conn.commit()
-        except Exception as e:
-            logger.error(f"Counter sync error: {e}")
+    @staticmethod
+    def _insert_ticket(conn, ticket_dict: Dict):
+        conversation_history = ticket_dict.get('conversation_history', [])
+        conversation_history_json = json.dumps(conversation_history) if conversation_history else None
+        
+        conn.execute("""
+            INSERT INTO tickets (
+                id, user_query, ai_answer, user_feedback, status, 
+                submitted_at, resolved_at, resolved_by, admin_solution, conversation_history
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, (
+            ticket_dict.get('id'),
+            ticket_dict.get('user_query'),
+            ticket_dict.get('ai_answer'),
+            ticket_dict.get('user_feedback'),
+            ticket_dict.get('status', 'pending'),
+            ticket_dict.get('submitted_at'),
+            ticket_dict.get('resolved_at'),
+            ticket_dict.get('resolved_by'),
+            ticket_dict.get('admin_solution'),
+            conversation_history_json
+        ))
+        TicketDatabase._apply_status_rollup(
+            conn, ticket_dict.get('status', 'pending'), ticket_dict.get('submitted_at'),
+            ticket_dict.get('resolved_at'), 1
+        )
+        TicketDatabase._apply_daily_rollup(conn, ticket_dict.get('submitted_at'), "submitted_count")
     
+    @timed("db_save_ticket")
     def save_ticket(self, ticket_data) -> bool:
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                
-                if hasattr(ticket_data, 'model_dump'):
-                    ticket_dict = ticket_data.model_dump()
-                elif hasattr(ticket_data, 'dict'):
-                    ticket_dict = ticket_data.dict()
-                else:
-                    ticket_dict = ticket_data
-                
-                conversation_history = ticket_dict.get('conversation_history', [])
-                conversation_history_json = json.dumps(conversation_history) if conversation_history else None
-                
-                cursor.execute("""
-                    INSERT INTO tickets (
-                        id, user_query, ai_answer, user_feedback, status, 
-                        submitted_at, resolved_at, resolved_by, admin_solution, conversation_history
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """, (
-                    ticket_dict.get('id'),
-                    ticket_dict.get('user_query'),
-                    ticket_dict.get('ai_answer'),
-                    ticket_dict.get('user_feedback'),
-                    ticket_dict.get('status', 'pending'),
-                    ticket_dict.get('submitted_at'),
-                    ticket_dict.get('resolved_at'),
-                    ticket_dict.get('resolved_by'),
-                    ticket_dict.get('admin_solution'),
-                    conversation_history_json
-                ))
-                
-                conn.commit()
+            with self.pool.transaction() as conn:
+                self._insert_ticket(conn, as_dict(ticket_data))
                 return True
-                
         except Exception as e:
             logger.error(f"Save ticket error: {e}")
             return False
-            return False
     
+    @timed("db_create_ticket")
+    def create_ticket(self, ticket_data) -> str:
+        """Takes the next ESC- id from the allocator and inserts the ticket."""
+        try:
+            ticket_dict = as_dict(ticket_data)
+            ticket_dict['id'] = self.ticket_ids.next_id()
+            with self.pool.transaction() as conn:
+                self._insert_ticket(conn, ticket_dict)
+                return ticket_dict['id']
+        except Exception as e:
+            logger.error(f"Create ticket error: {e}")
+            raise
+    
+    @timed("db_get_ticket")
     def get_ticket(self, ticket_id: str) -> Optional[Dict]:
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                conn.row_factory = sqlite3.Row
+            with self.pool.connection() as conn:
                 cursor = conn.cursor()
                 
                 cursor.execute("SELECT * FROM tickets WHERE id = ?", (ticket_id,))
@@ -181,13 +474,7 @@ class TicketDatabase:
                 
                 ticket = dict(ticket_row)
                 
-                if ticket.get('conversation_history'):
-                    try:
-                        ticket['conversation_history'] = json.loads(ticket['conversation_history'])
-                    except json.JSONDecodeError:
-                        ticket['conversation_history'] = []
-                else:
-                    ticket['conversation_history'] = []
+                ticket['conversation_history'] = self._decode_history(ticket.get('conversation_history'))
                 
                 cursor.execute("""
                     SELECT * FROM comments WHERE ticket_id = ? ORDER BY timestamp ASC
@@ -200,137 +487,270 @@ class TicketDatabase:
             logger.error(f"Get ticket error: {e}")
             return None
     
-    def get_tickets(self, status_filter: Optional[str] = None) -> List[Dict]:
+    @staticmethod
+    def _decode_history(raw: Optional[str]) -> List[Dict]:
+        if not raw:
+            return []
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                conn.row_factory = sqlite3.Row
-                cursor = conn.cursor()
+            return json.loads(raw)
+        except json.JSONDecodeError:
+            return []
+    
+    @timed("db_get_tickets")
+    def get_tickets(self, status_filter: Optional[str] = None, include_comments: bool = True,
+                    include_history: bool = True) -> List[Dict]:
+        """
+        Lists tickets newest first with `comment_count` computed in SQL.
+        Comments are loaded for all returned tickets in one query and the
+        conversation history JSON is only read and decoded when requested.
+        """
+        try:
+            with self.pool.connection() as conn:
+                columns = ", ".join(f"t.{column}" for column in TICKET_COLUMNS)
+                if include_history:
+                    columns += ", t.conversation_history"
+                where, params = ("WHERE t.status = ?", (status_filter,)) if status_filter else ("", ())
                 
-                if status_filter:
-                    cursor.execute("SELECT * FROM tickets WHERE status = ? ORDER BY submitted_at DESC", (status_filter,))
-                else:
-                    cursor.execute("SELECT * FROM tickets ORDER BY submitted_at DESC")
+                # Plain tuples zipped with the column names build dicts much faster than sqlite3.Row
+                cursor = conn.cursor()
+                cursor.row_factory = None
+                cursor.execute(f"""
+                    SELECT {columns},
+                           (SELECT COUNT(*) FROM comments c WHERE c.ticket_id = t.id) AS comment_count
+                    FROM tickets t {where}
+                    ORDER BY t.submitted_at DESC
+                """, params)
+                names = [description[0] for description in cursor.description]
                 
                 tickets = []
-                for row in cursor.fetchall():
-                    ticket = dict(row)
-                    
-                    if ticket.get('conversation_history'):
-                        try:
-                            ticket['conversation_history'] = json.loads(ticket['conversation_history'])
-                        except json.JSONDecodeError:
-                            ticket['conversation_history'] = []
-                    else:
-                        ticket['conversation_history'] = []
-                    
-                    cursor.execute("SELECT * FROM comments WHERE ticket_id = ? ORDER BY timestamp ASC", (ticket['id'],))
-                    comments = [dict(c) for c in cursor.fetchall()]
-                    ticket['comments'] = comments
-                    ticket['comment_count'] = len(comments)
+                by_id = {}
+                for row in cursor:
+                    ticket = dict(zip(names, row))
+                    if include_history:
+                        ticket['conversation_history'] = self._decode_history(ticket['conversation_history'])
+                    if include_comments:
+                        ticket['comments'] = []
+                        if ticket['comment_count']:
+                            by_id[ticket['id']] = ticket
                     tickets.append(ticket)
                 
+                if by_id:
+                    if status_filter:
+                        cursor.execute("""
+                            SELECT c.* FROM comments c JOIN tickets t ON t.id = c.ticket_id
+                            WHERE t.status = ? ORDER BY c.ticket_id, c.timestamp ASC
+                        """, params)
+                    else:
+                        cursor.execute("SELECT * FROM comments ORDER BY ticket_id, timestamp ASC")
+                    names = [description[0] for description in cursor.description]
+                    ticket_id_index = names.index('ticket_id')
+                    for row in cursor:
+                        ticket = by_id.get(row[ticket_id_index])
+                        if ticket is not None:
+                            ticket['comments'].append(dict(zip(names, row)))
+                
                 return tickets
                 
         except Exception as e:
             logger.error(f"Get tickets error: {e}")
             return []
     
-    def update_ticket(self, ticket_id: str, updates: Dict) -> bool:
+    @timed("db_list_tickets")
+    def list_tickets(self, limit: int = 50, cursor: Optional[str] = None, status: Optional[str] = None,
+                     submitted_from: Optional[str] = None, submitted_to: Optional[str] = None,
+                     author: Optional[str] = None, fields: Optional[List[str]] = None):
+        """
+        One page of tickets, newest first, using keyset pagination on
+        (submitted_at, id). `cursor` is the `next_cursor` of the previous
+        page; `submitted_to` is exclusive; `author` matches tickets with a
+        comment by that author. Returns (tickets, next_cursor).
+        Raises ValueError for an invalid cursor, limit or field name.
+        """
+        fields = page_fields(fields, limit)
+        
+        conditions, params = [], []
+        if cursor:
+            conditions.append("(t.submitted_at, t.id) < (?, ?)")
+            params.extend(decode_cursor(cursor))
+        if status:
+            conditions.append("t.status = ?")
+            params.append(status)
+        if submitted_from:
+            conditions.append("t.submitted_at >= ?")
+            params.append(submitted_from)
+        if submitted_to:
+            conditions.append("t.submitted_at < ?")
+            params.append(submitted_to)
+        if author:
+            conditions.append("EXISTS (SELECT 1 FROM comments a WHERE a.author = ? AND a.ticket_id = t.id)")
+            params.append(author)
+        
+        # id and submitted_at are always selected because the cursor needs them
+        columns = [f"t.{column}" for column in ("id", "submitted_at")]
+        columns += [f"t.{field}" for field in fields if field in TICKET_COLUMNS + ("conversation_history",)
+                    and field not in ("id", "submitted_at")]
+        if "comment_count" in fields:
+            columns.append("(SELECT COUNT(*) FROM comments c WHERE c.ticket_id = t.id) AS comment_count")
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                
-                set_clauses = []
-                values = []
-                
-                for field, value in updates.items():
-                    if field in ['status', 'resolved_at', 'resolved_by', 'admin_solution']:
-                        set_clauses.append(f"{field} = ?")
-                        values.append(value)
-                
-                if not set_clauses:
-                    return False
-                
-                set_clauses.append("updated_at = CURRENT_TIMESTAMP")
-                values.append(ticket_id)
+            with self.pool.connection() as conn:
+                db_cursor = conn.cursor()
+                db_cursor.row_factory = None
+                db_cursor.execute(f"""
+                    SELECT {', '.join(columns)} FROM tickets t {where}
+                    ORDER BY t.submitted_at DESC, t.id DESC
+                    LIMIT ?
+                """, params + [limit + 1])
+                names = [description[0] for description in db_cursor.description]
+                rows = db_cursor.fetchall()
+                
+                next_cursor = None
+                if len(rows) > limit:
+                    rows = rows[:limit]
+                    next_cursor = encode_cursor(rows[-1][1], rows[-1][0])
+                
+                tickets = [dict(zip(names, row)) for row in rows]
+                if "conversation_history" in fields:
+                    for ticket in tickets:
+                        ticket['conversation_history'] = self._decode_history(ticket['conversation_history'])
+                
+                if "comments" in fields and tickets:
+                    by_id = {ticket['id']: ticket for ticket in tickets}
+                    for ticket in tickets:
+                        ticket['comments'] = []
+                    placeholders = ",".join("?" * len(by_id))
+                    db_cursor.execute(
+                        f"SELECT * FROM comments WHERE ticket_id IN ({placeholders}) ORDER BY ticket_id, timestamp ASC",
+                        list(by_id),
+                    )
+                    comment_names = [description[0] for description in db_cursor.description]
+                    for row in db_cursor:
+                        comment = dict(zip(comment_names, row))
+                        by_id[comment['ticket_id']]['comments'].append(comment)
                 
-                query = f"UPDATE tickets SET {', '.join(set_clauses)} WHERE id = ?"
-                cursor.execute(query, values)
-                conn.commit()
-                return True
+                return tickets, next_cursor
                 
+        except Exception as e:
+            logger.error(f"List tickets error: {e}")
+            raise
+    
+    @staticmethod
+    def _update_ticket(conn, ticket_id: str, updates: Dict) -> bool:
+        set_clauses = []
+        values = []
+        
+        for field, value in updates.items():
+            if field in ['status', 'resolved_at', 'resolved_by', 'admin_solution']:
+                set_clauses.append(f"{field} = ?")
+                values.append(value)
+        
+        if not set_clauses:
+            return False
+        
+        set_clauses.append("updated_at = CURRENT_TIMESTAMP")
+        values.append(ticket_id)
+        
+        rollup_columns = "SELECT status, submitted_at, resolved_at FROM tickets WHERE id = ?"
+        before = conn.execute(rollup_columns, (ticket_id,)).fetchone()
+        conn.execute(f"UPDATE tickets SET {', '.join(set_clauses)} WHERE id = ?", values)
+        if before is not None:
+            after = conn.execute(rollup_columns, (ticket_id,)).fetchone()
+            TicketDatabase._apply_status_rollup(conn, *before, -1)
+            TicketDatabase._apply_status_rollup(conn, *after, 1)
+        return True
+    
+    @timed("db_update_ticket")
+    def update_ticket(self, ticket_id: str, updates: Dict) -> bool:
+        try:
+            with self.pool.transaction() as conn:
+                return self._update_ticket(conn, ticket_id, updates)
         except Exception as e:
             logger.error(f"Update ticket error: {e}")
             return False
     
+    @staticmethod
+    def _insert_comment(conn, ticket_id: str, comment_dict: Dict) -> bool:
+        cursor = conn.execute("""
+            INSERT INTO comments (id, ticket_id, author, author_name, content, timestamp, type)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, (
+            comment_dict.get('id'),
+            ticket_id,
+            comment_dict.get('author'),
+            comment_dict.get('author_name'),
+            comment_dict.get('content'),
+            comment_dict.get('timestamp'),
+            comment_dict.get('type', 'comment')
+        ))
+        TicketDatabase._apply_daily_rollup(conn, comment_dict.get('timestamp'), "comment_count")
+        return cursor.rowcount > 0
+    
+    @timed("db_add_comment")
     def add_comment(self, ticket_id: str, comment_data) -> bool:
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                
-                if hasattr(comment_data, 'model_dump'):
-                    comment_dict = comment_data.model_dump()
-                elif hasattr(comment_data, 'dict'):
-                    comment_dict = comment_data.dict()
-                else:
-                    comment_dict = comment_data
-                
-                required_fields = ['id', 'author', 'author_name', 'content', 'timestamp']
-                for field in required_fields:
-                    if field not in comment_dict or comment_dict[field] is None:
-                        return False
-                
-                cursor.execute("""
-                    INSERT INTO comments (id, ticket_id, author, author_name, content, timestamp, type)
-                    VALUES (?, ?, ?, ?, ?, ?, ?)
-                """, (
-                    comment_dict.get('id'),
-                    ticket_id,
-                    comment_dict.get('author'),
-                    comment_dict.get('author_name'),
-                    comment_dict.get('content'),
-                    comment_dict.get('timestamp'),
-                    comment_dict.get('type', 'comment')
-                ))
-                
-                conn.commit()
-                return cursor.rowcount > 0
+            comment_dict = as_dict(comment_data)
+            
+            required_fields = ['id', 'author', 'author_name', 'content', 'timestamp']
+            for field in required_fields:
+                if field not in comment_dict or comment_dict[field] is None:
+                    return False
+            
+            with self.pool.transaction() as conn:
+                return self._insert_comment(conn, ticket_id, comment_dict)
                 
         except Exception as e:
             logger.error(f"Add comment error: {e}")
             return False
     
+    @timed("db_create_comment")
+    def create_comment(self, ticket_id: str, comment_data, ticket_updates: Optional[Dict] = None) -> Optional[str]:
+        """
+        Takes the next COMMENT- id, inserts the comment and applies
+        optional ticket updates (e.g. resolution) in one transaction.
+        Returns the comment id, or None if required fields are missing.
+        """
+        comment_dict = as_dict(comment_data)
+        required_fields = ['author', 'author_name', 'content', 'timestamp']
+        for field in required_fields:
+            if comment_dict.get(field) is None:
+                return None
+        
+        try:
+            comment_dict['id'] = self.comment_ids.next_id()
+            with self.pool.transaction() as conn:
+                self._insert_comment(conn, ticket_id, comment_dict)
+                if ticket_updates:
+                    self._update_ticket(conn, ticket_id, ticket_updates)
+                return comment_dict['id']
+        except Exception as e:
+            logger.error(f"Create comment error: {e}")
+            raise
+    
+    @timed("db_get_analytics")
     def get_analytics(self) -> Dict:
+        """Reads the rollup tables: O(statuses + days) regardless of table size."""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self.pool.connection() as conn:
                 cursor = conn.cursor()
                 
-                cursor.execute("SELECT COUNT(*) FROM tickets")
-                total_tickets = cursor.fetchone()[0]
-                
-                cursor.execute("SELECT COUNT(*) FROM tickets WHERE status = 'pending'")
-                pending_tickets = cursor.fetchone()[0]
+                by_status = {row["status"]: row for row in cursor.execute("SELECT * FROM ticket_status_stats")}
+                total_tickets = sum(row["ticket_count"] for row in by_status.values())
+                pending_tickets = by_status["pending"]["ticket_count"] if "pending" in by_status else 0
+                resolved = by_status.get("resolved")
+                resolved_tickets = resolved["ticket_count"] if resolved else 0
                 
-                cursor.execute("SELECT COUNT(*) FROM tickets WHERE status = 'resolved'")
-                resolved_tickets = cursor.fetchone()[0]
-                
-                cursor.execute("""
-                    SELECT AVG(
-                        CASE WHEN resolved_at IS NOT NULL AND submitted_at IS NOT NULL 
-                        THEN (julianday(resolved_at) - julianday(submitted_at)) * 24 
-                        ELSE NULL END
-                    ) FROM tickets WHERE status = 'resolved'
-                """)
-                avg_result = cursor.fetchone()[0]
-                avg_resolution_hours = round(avg_result, 2) if avg_result else 0
+                avg_resolution_hours = 0
+                if resolved and resolved["resolution_hours_count"]:
+                    avg_resolution_hours = round(resolved["resolution_hours_sum"] / resolved["resolution_hours_count"], 2)
                 
-                cursor.execute("SELECT COUNT(*) FROM tickets WHERE date(submitted_at) >= date('now', '-7 days')")
+                cursor.execute("SELECT COALESCE(SUM(submitted_count), 0) FROM ticket_daily_stats WHERE day >= date('now', '-7 days')")
                 recent_tickets = cursor.fetchone()[0]
                 
                 cursor.execute("""
-                    SELECT date(submitted_at) as date, COUNT(*) as count
-                    FROM tickets WHERE date(submitted_at) >= date('now', '-30 days')
-                    GROUP BY date(submitted_at) ORDER BY date(submitted_at)
+                    SELECT day, submitted_count FROM ticket_daily_stats
+                    WHERE day >= date('now', '-30 days') AND submitted_count > 0
+                    ORDER BY day
                 """)
                 daily_stats = [{"date": row[0], "count": row[1]} for row in cursor.fetchall()]
                 
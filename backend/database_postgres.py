@@ -0,0 +1,526 @@
+import os
+import json
+import logging
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional
+
+from database import DB_POOL_SIZE, TICKET_COLUMNS, as_dict, decode_cursor, encode_cursor, page_fields
+from metrics import timed
+from storage import TicketStore
+
+logger = logging.getLogger(__name__)
+
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "1"))
+DB_COMMAND_TIMEOUT_SECONDS = float(os.getenv("DB_COMMAND_TIMEOUT_SECONDS", "30"))
+# Serializes schema setup when several workers start at once
+SCHEMA_LOCK_ID = 74_110_024
+
+# Timestamps stay ISO-8601 text as in SQLite, so payloads and page cursors are
+# identical on both backends. Sessions run in UTC like SQLite's date functions.
+NOW = "to_char(now() AT TIME ZONE 'UTC', 'YYYY-MM-DD HH24:MI:SS')"
+
+
+def hours_between(resolved_at: str, submitted_at: str) -> str:
+    return f"EXTRACT(EPOCH FROM ({resolved_at}::timestamptz - {submitted_at}::timestamptz))::double precision / 3600"
+
+
+def day_of(value: str) -> str:
+    return f"({value}::timestamptz AT TIME ZONE 'UTC')::date"
+
+
+SCHEMA = [
+    "CREATE SEQUENCE IF NOT EXISTS ticket_id_seq START WITH 1001",
+    "CREATE SEQUENCE IF NOT EXISTS comment_id_seq START WITH 1001",
+    f"""
+    CREATE TABLE IF NOT EXISTS tickets (
+        id TEXT PRIMARY KEY,
+        user_query TEXT NOT NULL,
+        ai_answer TEXT NOT NULL,
+        user_feedback TEXT NOT NULL,
+        status TEXT DEFAULT 'pending',
+        submitted_at TEXT NOT NULL,
+        resolved_at TEXT,
+        resolved_by TEXT,
+        admin_solution TEXT,
+        conversation_history JSONB,
+        created_at TEXT DEFAULT {NOW},
+        updated_at TEXT DEFAULT {NOW}
+    )
+    """,
+    f"""
+    CREATE TABLE IF NOT EXISTS comments (
+        id TEXT PRIMARY KEY,
+        ticket_id TEXT NOT NULL REFERENCES tickets (id),
+        author TEXT NOT NULL,
+        author_name TEXT NOT NULL,
+        content TEXT NOT NULL,
+        "timestamp" TEXT NOT NULL,
+        type TEXT DEFAULT 'comment',
+        created_at TEXT DEFAULT {NOW}
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_tickets_status ON tickets(status)",
+    "CREATE INDEX IF NOT EXISTS idx_tickets_submitted_at ON tickets(submitted_at)",
+    "CREATE INDEX IF NOT EXISTS idx_comments_ticket_id ON comments(ticket_id)",
+    'CREATE INDEX IF NOT EXISTS idx_comments_ticket_timestamp ON comments(ticket_id, "timestamp")',
+    "CREATE INDEX IF NOT EXISTS idx_tickets_submitted_id ON tickets(submitted_at, id)",
+    "CREATE INDEX IF NOT EXISTS idx_tickets_status_submitted_id ON tickets(status, submitted_at, id)",
+    "CREATE INDEX IF NOT EXISTS idx_comments_author ON comments(author, ticket_id)",
+    """
+    CREATE TABLE IF NOT EXISTS ticket_status_stats (
+        status TEXT PRIMARY KEY,
+        ticket_count BIGINT NOT NULL DEFAULT 0,
+        resolution_hours_sum DOUBLE PRECISION NOT NULL DEFAULT 0,
+        resolution_hours_count BIGINT NOT NULL DEFAULT 0
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS ticket_daily_stats (
+        day DATE PRIMARY KEY,
+        submitted_count BIGINT NOT NULL DEFAULT 0,
+        comment_count BIGINT NOT NULL DEFAULT 0
+    )
+    """,
+]
+
+STATUS_ROLLUP_QUERY = f"""
+    SELECT COALESCE(status, '') AS status, COUNT(*) AS ticket_count,
+           COALESCE(SUM(hours), 0) AS resolution_hours_sum, COUNT(hours) AS resolution_hours_count
+    FROM (SELECT status, {hours_between('resolved_at', 'submitted_at')} AS hours FROM tickets) t
+    GROUP BY 1
+"""
+DAILY_ROLLUP_QUERY = f"""
+    SELECT day, SUM(submitted)::bigint AS submitted_count, SUM(commented)::bigint AS comment_count
+    FROM (
+        SELECT {day_of('submitted_at')} AS day, 1 AS submitted, 0 AS commented FROM tickets
+        UNION ALL
+        SELECT {day_of('"timestamp"')} AS day, 0 AS submitted, 1 AS commented FROM comments
+    ) d
+    WHERE day IS NOT NULL
+    GROUP BY day
+"""
+
+
+class PostgresTicketStore(TicketStore):
+    """
+    TicketStore on PostgreSQL for multi-worker and multi-host deployments.
+
+    Uses an asyncpg connection pool, native sequences for ESC-/COMMENT-
+    ids (no counters row to lock) and JSONB for conversation_history.
+    Writes run at READ COMMITTED; rollup rows are maintained with atomic
+    upserts in the write transaction, as in the SQLite store.
+    """
+
+    def __init__(self, dsn: str, pool_size: int = DB_POOL_SIZE, min_size: int = DB_POOL_MIN_SIZE):
+        self.dsn = dsn
+        self.pool_size = pool_size
+        self.min_size = min(min_size, pool_size)
+        self.pool = None
+
+    @staticmethod
+    async def _init_connection(conn):
+        await conn.set_type_codec("jsonb", encoder=json.dumps, decoder=json.loads, schema="pg_catalog")
+
+    async def init(self):
+        try:
+            import asyncpg
+        except ImportError:
+            raise ImportError("DB_BACKEND=postgres requires the asyncpg package: pip install asyncpg")
+
+        try:
+            if self.pool is None:
+                self.pool = await asyncpg.create_pool(
+                    self.dsn,
+                    min_size=self.min_size,
+                    max_size=self.pool_size,
+                    command_timeout=DB_COMMAND_TIMEOUT_SECONDS,
+                    server_settings={"timezone": "UTC"},
+                    init=self._init_connection,
+                )
+            async with self._transaction() as conn:
+                await conn.execute("SELECT pg_advisory_xact_lock($1)", SCHEMA_LOCK_ID)
+                rollups_exist = await conn.fetchval("SELECT to_regclass('ticket_status_stats') IS NOT NULL")
+                for statement in SCHEMA:
+                    await conn.execute(statement)
+                if not rollups_exist:
+                    await self._rebuild_rollups(conn)
+        except Exception as e:
+            logger.error(f"Database init error: {e}")
+            raise
+
+    async def close(self):
+        if self.pool is not None:
+            await self.pool.close()
+            self.pool = None
+
+    @asynccontextmanager
+    async def _transaction(self, **options):
+        async with self.pool.acquire() as conn:
+            async with conn.transaction(**options):
+                yield conn
+
+    @staticmethod
+    async def _apply_status_rollup(conn, status: Optional[str], submitted_at: Optional[str],
+                                   resolved_at: Optional[str], sign: int):
+        """Adds (sign=1) or removes (sign=-1) one ticket's contribution to ticket_status_stats."""
+        await conn.execute(f"""
+            INSERT INTO ticket_status_stats AS s (status, ticket_count, resolution_hours_sum, resolution_hours_count)
+            SELECT COALESCE($1::text, ''), $2::int, COALESCE(hours, 0) * $2::int,
+                   CASE WHEN hours IS NULL THEN 0 ELSE $2::int END
+            FROM (SELECT {hours_between('$3::text', '$4::text')} AS hours) h
+            ON CONFLICT (status) DO UPDATE SET
+                ticket_count = s.ticket_count + excluded.ticket_count,
+                resolution_hours_sum = s.resolution_hours_sum + excluded.resolution_hours_sum,
+                resolution_hours_count = s.resolution_hours_count + excluded.resolution_hours_count
+        """, status, sign, resolved_at, submitted_at)
+
+    @staticmethod
+    async def _apply_daily_rollup(conn, timestamp: Optional[str], column: str):
+        await conn.execute(f"""
+            INSERT INTO ticket_daily_stats AS d (day, {column})
+            SELECT day, 1 FROM (SELECT {day_of('$1::text')} AS day) x WHERE day IS NOT NULL
+            ON CONFLICT (day) DO UPDATE SET {column} = d.{column} + 1
+        """, timestamp)
+
+    @staticmethod
+    async def _rebuild_rollups(conn):
+        await conn.execute("DELETE FROM ticket_status_stats")
+        await conn.execute("DELETE FROM ticket_daily_stats")
+        await conn.execute(f"""
+            INSERT INTO ticket_status_stats (status, ticket_count, resolution_hours_sum, resolution_hours_count)
+            {STATUS_ROLLUP_QUERY}
+        """)
+        await conn.execute(f"INSERT INTO ticket_daily_stats (day, submitted_count, comment_count) {DAILY_ROLLUP_QUERY}")
+
+    async def rebuild_rollups(self):
+        """Backfills the analytics rollup tables from tickets and comments."""
+        try:
+            async with self._transaction() as conn:
+                await self._rebuild_rollups(conn)
+        except Exception as e:
+            logger.error(f"Rollup backfill error: {e}")
+            raise
+
+    async def check_rollups(self) -> List[Dict]:
+        """Same contract as TicketDatabase.check_rollups, in one REPEATABLE READ snapshot."""
+        async with self._transaction(isolation="repeatable_read", readonly=True) as conn:
+            checks = [
+                ("ticket_status_stats", "status", STATUS_ROLLUP_QUERY, "SELECT * FROM ticket_status_stats"),
+                ("ticket_daily_stats", "day", DAILY_ROLLUP_QUERY, "SELECT * FROM ticket_daily_stats"),
+            ]
+            mismatches = []
+            for table, key, expected_query, actual_query in checks:
+                expected = {row[key]: dict(row) for row in await conn.fetch(expected_query)}
+                actual = {row[key]: dict(row) for row in await conn.fetch(actual_query)}
+                for key_value in sorted(set(expected) | set(actual)):
+                    expected_row = expected.get(key_value, {})
+                    actual_row = actual.get(key_value, {})
+                    for column in (expected_row or actual_row):
+                        if column == key:
+                            continue
+                        want = expected_row.get(column, 0)
+                        got = actual_row.get(column, 0)
+                        if abs(want - got) > 1e-6:
+                            mismatches.append({
+                                "table": table, "key": str(key_value), "column": column,
+                                "expected": want, "actual": got,
+                            })
+            return mismatches
+
+    @staticmethod
+    async def _next_id(conn, sequence: str, prefix: str) -> str:
+        # nextval never blocks other writers; ids of rolled-back transactions are skipped
+        value = await conn.fetchval(f"SELECT nextval('{sequence}')")
+        return f"{prefix}-{value:06d}"
+
+    @staticmethod
+    async def _insert_ticket(conn, ticket_dict: Dict):
+        status = ticket_dict.get('status', 'pending')
+        await conn.execute("""
+            INSERT INTO tickets (
+                id, user_query, ai_answer, user_feedback, status,
+                submitted_at, resolved_at, resolved_by, admin_solution, conversation_history
+            ) VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10)
+        """,
+            ticket_dict.get('id'),
+            ticket_dict.get('user_query'),
+            ticket_dict.get('ai_answer'),
+            ticket_dict.get('user_feedback'),
+            status,
+            ticket_dict.get('submitted_at'),
+            ticket_dict.get('resolved_at'),
+            ticket_dict.get('resolved_by'),
+            ticket_dict.get('admin_solution'),
+            ticket_dict.get('conversation_history') or None,
+        )
+        await PostgresTicketStore._apply_status_rollup(
+            conn, status, ticket_dict.get('submitted_at'), ticket_dict.get('resolved_at'), 1
+        )
+        await PostgresTicketStore._apply_daily_rollup(conn, ticket_dict.get('submitted_at'), "submitted_count")
+
+    @timed("db_create_ticket")
+    async def create_ticket(self, ticket_data) -> str:
+        """Allocates the next ESC- id from ticket_id_seq and inserts the ticket."""
+        try:
+            async with self._transaction() as conn:
+                ticket_dict = as_dict(ticket_data)
+                ticket_dict['id'] = await self._next_id(conn, "ticket_id_seq", "ESC")
+                await self._insert_ticket(conn, ticket_dict)
+                return ticket_dict['id']
+        except Exception as e:
+            logger.error(f"Create ticket error: {e}")
+            raise
+
+    @staticmethod
+    def _ticket(row) -> Dict:
+        ticket = dict(row)
+        if 'conversation_history' in ticket:
+            ticket['conversation_history'] = ticket['conversation_history'] or []
+        return ticket
+
+    @timed("db_get_ticket")
+    async def get_ticket(self, ticket_id: str) -> Optional[Dict]:
+        try:
+            async with self.pool.acquire() as conn:
+                row = await conn.fetchrow("SELECT * FROM tickets WHERE id = $1", ticket_id)
+                if not row:
+                    return None
+                ticket = self._ticket(row)
+                comments = await conn.fetch(
+                    'SELECT * FROM comments WHERE ticket_id = $1 ORDER BY "timestamp" ASC', ticket_id
+                )
+                ticket['comments'] = [dict(comment) for comment in comments]
+                return ticket
+        except Exception as e:
+            logger.error(f"Get ticket error: {e}")
+            return None
+
+    @timed("db_get_tickets")
+    async def get_tickets(self, status_filter: Optional[str] = None, include_comments: bool = True,
+                          include_history: bool = True) -> List[Dict]:
+        """Newest first with `comment_count`; comments for all tickets are loaded in one query."""
+        try:
+            async with self.pool.acquire() as conn:
+                columns = ", ".join(f"t.{column}" for column in TICKET_COLUMNS)
+                if include_history:
+                    columns += ", t.conversation_history"
+                where, params = ("WHERE t.status = $1", (status_filter,)) if status_filter else ("", ())
+                rows = await conn.fetch(f"""
+                    SELECT {columns},
+                           (SELECT COUNT(*) FROM comments c WHERE c.ticket_id = t.id) AS comment_count
+                    FROM tickets t {where}
+                    ORDER BY t.submitted_at DESC
+                """, *params)
+
+                tickets = []
+                by_id = {}
+                for row in rows:
+                    ticket = self._ticket(row)
+                    if include_comments:
+                        ticket['comments'] = []
+                        if ticket['comment_count']:
+                            by_id[ticket['id']] = ticket
+                    tickets.append(ticket)
+
+                if by_id:
+                    if status_filter:
+                        comments = await conn.fetch("""
+                            SELECT c.* FROM comments c JOIN tickets t ON t.id = c.ticket_id
+                            WHERE t.status = $1 ORDER BY c.ticket_id, c."timestamp" ASC
+                        """, *params)
+                    else:
+                        comments = await conn.fetch('SELECT * FROM comments ORDER BY ticket_id, "timestamp" ASC')
+                    for comment in comments:
+                        ticket = by_id.get(comment['ticket_id'])
+                        if ticket is not None:
+                            ticket['comments'].append(dict(comment))
+
+                return tickets
+
+        except Exception as e:
+            logger.error(f"Get tickets error: {e}")
+            return []
+
+    @timed("db_list_tickets")
+    async def list_tickets(self, limit: int = 50, cursor: Optional[str] = None, status: Optional[str] = None,
+                           submitted_from: Optional[str] = None, submitted_to: Optional[str] = None,
+                           author: Optional[str] = None, fields: Optional[List[str]] = None):
+        """Same contract as TicketDatabase.list_tickets."""
+        fields = page_fields(fields, limit)
+        params = []
+
+        def param(value) -> str:
+            params.append(value)
+            return f"${len(params)}"
+
+        conditions = []
+        if cursor:
+            submitted_at, ticket_id = decode_cursor(cursor)
+            conditions.append(f"(t.submitted_at, t.id) < ({param(submitted_at)}, {param(ticket_id)})")
+        if status:
+            conditions.append(f"t.status = {param(status)}")
+        if submitted_from:
+            conditions.append(f"t.submitted_at >= {param(submitted_from)}")
+        if submitted_to:
+            conditions.append(f"t.submitted_at < {param(submitted_to)}")
+        if author:
+            conditions.append(f"EXISTS (SELECT 1 FROM comments a WHERE a.author = {param(author)} AND a.ticket_id = t.id)")
+
+        # id and submitted_at are always selected because the cursor needs them
+        columns = [f"t.{column}" for column in ("id", "submitted_at")]
+        columns += [f"t.{field}" for field in fields if field in TICKET_COLUMNS + ("conversation_history",)
+                    and field not in ("id", "submitted_at")]
+        if "comment_count" in fields:
+            columns.append("(SELECT COUNT(*) FROM comments c WHERE c.ticket_id = t.id) AS comment_count")
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        try:
+            async with self.pool.acquire() as conn:
+                rows = await conn.fetch(f"""
+                    SELECT {', '.join(columns)} FROM tickets t {where}
+                    ORDER BY t.submitted_at DESC, t.id DESC
+                    LIMIT {param(limit + 1)}
+                """, *params)
+
+                next_cursor = None
+                if len(rows) > limit:
+                    rows = rows[:limit]
+                    next_cursor = encode_cursor(rows[-1]['submitted_at'], rows[-1]['id'])
+
+                tickets = [self._ticket(row) for row in rows]
+
+                if "comments" in fields and tickets:
+                    by_id = {ticket['id']: ticket for ticket in tickets}
+                    for ticket in tickets:
+                        ticket['comments'] = []
+                    comments = await conn.fetch(
+                        'SELECT * FROM comments WHERE ticket_id = ANY($1::text[]) ORDER BY ticket_id, "timestamp" ASC',
+                        list(by_id),
+                    )
+                    for comment in comments:
+                        by_id[comment['ticket_id']]['comments'].append(dict(comment))
+
+                return tickets, next_cursor
+
+        except Exception as e:
+            logger.error(f"List tickets error: {e}")
+            raise
+
+    @staticmethod
+    async def _update_ticket(conn, ticket_id: str, updates: Dict) -> bool:
+        set_clauses = []
+        values = []
+
+        for field, value in updates.items():
+            if field in ['status', 'resolved_at', 'resolved_by', 'admin_solution']:
+                values.append(value)
+                set_clauses.append(f"{field} = ${len(values)}")
+
+        if not set_clauses:
+            return False
+
+        set_clauses.append(f"updated_at = {NOW}")
+        values.append(ticket_id)
+
+        rollup_columns = "status, submitted_at, resolved_at"
+        before = await conn.fetchrow(f"SELECT {rollup_columns} FROM tickets WHERE id = $1 FOR UPDATE", ticket_id)
+        after = await conn.fetchrow(
+            f"UPDATE tickets SET {', '.join(set_clauses)} WHERE id = ${len(values)} RETURNING {rollup_columns}",
+            *values,
+        )
+        if before is not None:
+            # Touch the two status rows in a fixed order so concurrent updates can't deadlock
+            changes = sorted([(tuple(before), -1), (tuple(after), 1)], key=lambda change: change[0][0] or "")
+            for row, sign in changes:
+                await PostgresTicketStore._apply_status_rollup(conn, *row, sign)
+        return True
+
+    @timed("db_update_ticket")
+    async def update_ticket(self, ticket_id: str, updates: Dict) -> bool:
+        try:
+            async with self._transaction() as conn:
+                return await self._update_ticket(conn, ticket_id, updates)
+        except Exception as e:
+            logger.error(f"Update ticket error: {e}")
+            return False
+
+    @timed("db_create_comment")
+    async def create_comment(self, ticket_id: str, comment_data,
+                             ticket_updates: Optional[Dict] = None) -> Optional[str]:
+        """
+        Allocates the next COMMENT- id from comment_id_seq, inserts the
+        comment and applies optional ticket updates in one transaction.
+        """
+        comment_dict = as_dict(comment_data)
+        required_fields = ['author', 'author_name', 'content', 'timestamp']
+        for field in required_fields:
+            if comment_dict.get(field) is None:
+                return None
+
+        try:
+            async with self._transaction() as conn:
+                comment_dict['id'] = await self._next_id(conn, "comment_id_seq", "COMMENT")
+                await conn.execute("""
+                    INSERT INTO comments (id, ticket_id, author, author_name, content, "timestamp", type)
+                    VALUES ($1, $2, $3, $4, $5, $6, $7)
+                """,
+                    comment_dict['id'],
+                    ticket_id,
+                    comment_dict.get('author'),
+                    comment_dict.get('author_name'),
+                    comment_dict.get('content'),
+                    comment_dict.get('timestamp'),
+                    comment_dict.get('type', 'comment'),
+                )
+                await self._apply_daily_rollup(conn, comment_dict.get('timestamp'), "comment_count")
+                if ticket_updates:
+                    await self._update_ticket(conn, ticket_id, ticket_updates)
+                return comment_dict['id']
+        except Exception as e:
+            logger.error(f"Create comment error: {e}")
+            raise
+
+    @timed("db_get_analytics")
+    async def get_analytics(self) -> Dict:
+        """Reads the rollup tables: O(statuses + days) regardless of table size."""
+        try:
+            async with self.pool.acquire() as conn:
+                by_status = {row["status"]: row for row in await conn.fetch("SELECT * FROM ticket_status_stats")}
+                total_tickets = sum(row["ticket_count"] for row in by_status.values())
+                pending_tickets = by_status["pending"]["ticket_count"] if "pending" in by_status else 0
+                resolved = by_status.get("resolved")
+                resolved_tickets = resolved["ticket_count"] if resolved else 0
+
+                avg_resolution_hours = 0
+                if resolved and resolved["resolution_hours_count"]:
+                    avg_resolution_hours = round(resolved["resolution_hours_sum"] / resolved["resolution_hours_count"], 2)
+
+                recent_tickets = await conn.fetchval(
+                    "SELECT COALESCE(SUM(submitted_count), 0)::bigint FROM ticket_daily_stats WHERE day >= CURRENT_DATE - 7"
+                )
+                rows = await conn.fetch("""
+                    SELECT to_char(day, 'YYYY-MM-DD') AS day, submitted_count FROM ticket_daily_stats
+                    WHERE day >= CURRENT_DATE - 30 AND submitted_count > 0
+                    ORDER BY 1
+                """)
+                daily_stats = [{"date": row["day"], "count": row["submitted_count"]} for row in rows]
+
+                return {
+                    "total_escalated_tickets": total_tickets,
+                    "pending_tickets": pending_tickets,
+                    "resolved_tickets": resolved_tickets,
+                    "avg_resolution_hours": avg_resolution_hours,
+                    "recent_tickets_7_days": recent_tickets,
+                    "daily_stats": daily_stats
+                }
+
+        except Exception as e:
+            logger.error(f"Analytics error: {e}")
+            return {
+                "total_escalated_tickets": 0,
+                "pending_tickets": 0,
+                "resolved_tickets": 0,
+                "avg_resolution_hours": 0,
+                "recent_tickets_7_days": 0,
+                "daily_stats": []
+            }
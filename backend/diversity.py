@@ -0,0 +1,57 @@
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+
+def dense_vector(vector) -> Optional[Sequence[float]]:
+    """The dense embedding of a retrieved point (collections with a lexical index return a dict)."""
+    if isinstance(vector, dict):
+        return vector.get("")
+    return vector
+
+
+def mmr_order(scores: Sequence[float], vectors: Sequence[Optional[Sequence[float]]],
+              lambda_: float, duplicate_threshold: float) -> List[int]:
+    """
+    Maximal marginal relevance over retrieved candidates.
+
+    Returns candidate indexes in selection order: each pick maximises
+    lambda_ * relevance - (1 - lambda_) * (highest cosine to anything
+    already picked), and candidates at or above duplicate_threshold cosine
+    to a pick are dropped as near-duplicates. Relevance is the score
+    min-max scaled to [0, 1], so cosine and RRF scores behave the same.
+    Candidates without a vector are never treated as duplicates.
+    """
+    n = len(scores)
+    if n < 2:
+        return list(range(n))
+
+    has_vector = np.array([v is not None and len(v) > 0 for v in vectors])
+    if not has_vector.any():
+        return list(range(n))
+    matrix = np.asarray([v for v, ok in zip(vectors, has_vector) if ok], dtype=np.float32)
+    matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+    similarity = np.zeros((n, n), dtype=np.float32)
+    rows = np.flatnonzero(has_vector)
+    similarity[np.ix_(rows, rows)] = matrix @ matrix.T
+    duplicates = similarity >= duplicate_threshold
+
+    relevance = np.asarray(scores, dtype=np.float32)
+    spread = relevance.max() - relevance.min()
+    relevance = (relevance - relevance.min()) / spread if spread > 0 else np.ones(n, dtype=np.float32)
+    gain = lambda_ * relevance
+    penalty = 1 - lambda_
+
+    remaining = np.ones(n, dtype=bool)
+    redundancy = np.zeros(n, dtype=np.float32)
+    order = []
+    while True:
+        mmr = gain - penalty * redundancy
+        mmr[~remaining] = -np.inf
+        pick = int(mmr.argmax())
+        if not remaining[pick]:
+            return order
+        order.append(pick)
+        remaining[pick] = False
+        remaining &= ~duplicates[pick]
+        np.maximum(redundancy, similarity[pick], out=redundancy)
@@ -0,0 +1,136 @@
+import sqlite3
+import hashlib
+import logging
+import threading
+from array import array
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingCache:
+    """Exact-match embedding cache shared by the API and the ingest script.
+
+    Keys are a SHA-256 of the embedding deployment name and the text, so a
+    model change never returns stale vectors. Lookups go through an
+    in-process LRU tier first and then a local SQLite store holding the
+    vectors as packed float32 blobs.
+    """
+
+    def __init__(self, db_path: str = "embedding_cache.db", model: str = "", max_memory_entries: int = 10000):
+        self.db_path = db_path
+        self.model = model or ""
+        self.max_memory_entries = max_memory_entries
+        self._memory: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS embeddings (
+                key TEXT PRIMARY KEY,
+                dim INTEGER NOT NULL,
+                vector BLOB NOT NULL
+            )
+        """)
+        self._conn.commit()
+
+    def key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.model}\0{text}".encode("utf-8")).hexdigest()
+
+    def get(self, text: str) -> Optional[List[float]]:
+        return self.get_many([text])[0]
+
+    def get_many(self, texts: Sequence[str]) -> List[Optional[List[float]]]:
+        keys = [self.key(text) for text in texts]
+        results: List[Optional[List[float]]] = [None] * len(keys)
+        missing: Dict[str, List[int]] = {}
+
+        with self._lock:
+            for i, key in enumerate(keys):
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    results[i] = vector
+                    self.memory_hits += 1
+                else:
+                    missing.setdefault(key, []).append(i)
+
+            if missing:
+                found = self._load(list(missing))
+                for key, positions in missing.items():
+                    vector = found.get(key)
+                    if vector is None:
+                        self.misses += len(positions)
+                        continue
+                    self._remember(key, vector)
+                    self.disk_hits += len(positions)
+                    for i in positions:
+                        results[i] = vector
+
+        return results
+
+    def put(self, text: str, vector: Sequence[float]):
+        self.put_many([text], [vector])
+
+    def put_many(self, texts: Sequence[str], vectors: Sequence[Sequence[float]]):
+        rows = []
+        with self._lock:
+            for text, vector in zip(texts, vectors):
+                if not vector:
+                    continue
+                key = self.key(text)
+                vector = list(vector)
+                self._remember(key, vector)
+                rows.append((key, len(vector), array("f", vector).tobytes()))
+            if not rows:
+                return
+            try:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO embeddings (key, dim, vector) VALUES (?, ?, ?)", rows
+                )
+                self._conn.commit()
+            except sqlite3.Error as e:
+                logger.error(f"Embedding cache write error: {e}")
+
+    def stats(self) -> Dict:
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        hits = self.memory_hits + self.disk_hits
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "memory_entries": len(self._memory),
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _load(self, keys: List[str]) -> Dict[str, List[float]]:
+        found = {}
+        try:
+            # Stay well below SQLite's bound-parameter limit
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", chunk
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = array("f", blob).tolist()
+        except sqlite3.Error as e:
+            logger.error(f"Embedding cache read error: {e}")
+        return found
+
+    def _remember(self, key: str, vector: List[float]):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
@@ -0,0 +1,191 @@
+import os
+import json
+import asyncio
+import logging
+from datetime import datetime
+from typing import Callable, Dict, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+EVENTS_BACKEND = os.getenv("EVENTS_BACKEND", "memory").lower()
+EVENTS_REDIS_URL = os.getenv("EVENTS_REDIS_URL", "redis://localhost:6379/0")
+EVENTS_CHANNEL = os.getenv("EVENTS_CHANNEL", "itrs:ticket-events")
+EVENTS_SUBSCRIBER_QUEUE_SIZE = int(os.getenv("EVENTS_SUBSCRIBER_QUEUE_SIZE", "1000"))
+
+
+class Subscription:
+    """One connected client. A client that falls a full queue behind gets a single
+    "resync" event instead of an unbounded backlog and reloads from the API."""
+
+    def __init__(self, maxsize: int):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize)
+        self.lagged = False
+
+    def offer(self, event: Dict) -> bool:
+        if self.lagged:
+            return False
+        try:
+            self.queue.put_nowait(event)
+            return True
+        except asyncio.QueueFull:
+            self.lagged = True
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait({"type": "resync"})
+            return False
+
+    async def get(self) -> Dict:
+        event = await self.queue.get()
+        if event.get("type") == "resync":
+            self.lagged = False
+        return event
+
+
+class MemoryBackend:
+    """Single-process delivery: events only reach clients of this worker."""
+
+    async def start(self, deliver: Callable[[Dict], None]):
+        self._deliver = deliver
+
+    async def publish(self, event: Dict):
+        self._deliver(event)
+
+    async def stop(self):
+        pass
+
+
+class RedisBackend:
+    """Redis pub/sub delivery so every uvicorn worker sees every event."""
+
+    def __init__(self, url: str = EVENTS_REDIS_URL, channel: str = EVENTS_CHANNEL):
+        self.url = url
+        self.channel = channel
+        self._client = None
+        self._pubsub = None
+        self._listener: Optional[asyncio.Task] = None
+
+    async def start(self, deliver: Callable[[Dict], None]):
+        try:
+            import redis.asyncio as redis
+        except ImportError:
+            raise ImportError("EVENTS_BACKEND=redis requires the redis package: pip install redis")
+
+        self._client = redis.from_url(self.url)
+        self._pubsub = self._client.pubsub()
+        await self._pubsub.subscribe(self.channel)
+        self._listener = asyncio.create_task(self._listen(deliver))
+
+    async def _listen(self, deliver: Callable[[Dict], None]):
+        while True:
+            try:
+                async for message in self._pubsub.listen():
+                    if message.get("type") == "message":
+                        deliver(json.loads(message["data"]))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Event listener error: {e}")
+                await asyncio.sleep(1)
+
+    async def publish(self, event: Dict):
+        await self._client.publish(self.channel, json.dumps(event))
+
+    async def stop(self):
+        if self._listener:
+            self._listener.cancel()
+        if self._pubsub:
+            await self._pubsub.aclose()
+        if self._client:
+            await self._client.aclose()
+
+
+class EventBroker:
+    """
+    Fans ticket events out to connected event-stream clients. The async
+    ticket endpoints publish from the event loop (main.publish_ticket_event)
+    once their write has committed; the backend decides whether events also
+    reach the other workers. publish() never blocks, and a caller outside
+    the loop (a worker thread) is handed over with call_soon_threadsafe.
+    """
+
+    def __init__(self, backend=None, queue_size: int = EVENTS_SUBSCRIBER_QUEUE_SIZE):
+        self.backend = backend or MemoryBackend()
+        self.queue_size = queue_size
+        self._subscribers: Set[Subscription] = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        # asyncio only keeps weak references to tasks; pending publishes live here until done
+        self._tasks: Set[asyncio.Task] = set()
+
+        self.published = 0
+        self.delivered = 0
+        self.dropped = 0
+
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        await self.backend.start(self._fan_out)
+
+    async def stop(self):
+        # Let publishes already in flight reach the backend before it closes
+        while self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        await self.backend.stop()
+        self._loop = None
+
+    def publish(self, event_type: str, **data):
+        if self._loop is None:
+            return
+        event = {"type": event_type, "timestamp": datetime.now().isoformat(), **data}
+        self.published += 1
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self._loop:
+            self._schedule(event)
+        else:
+            self._loop.call_soon_threadsafe(self._schedule, event)
+
+    def _schedule(self, event: Dict):
+        if self._loop is None:
+            return
+        task = self._loop.create_task(self._publish(event))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _publish(self, event: Dict):
+        try:
+            await self.backend.publish(event)
+        except Exception as e:
+            logger.error(f"Event publish error: {e}")
+
+    def _fan_out(self, event: Dict):
+        for subscription in list(self._subscribers):
+            if subscription.offer(event):
+                self.delivered += 1
+            else:
+                self.dropped += 1
+
+    def subscribe(self) -> Subscription:
+        subscription = Subscription(self.queue_size)
+        self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        self._subscribers.discard(subscription)
+
+    def stats(self) -> Dict:
+        return {
+            "backend": type(self.backend).__name__,
+            "subscribers": len(self._subscribers),
+            "published": self.published,
+            "delivered": self.delivered,
+            "dropped": self.dropped,
+        }
+
+
+def create_broker() -> EventBroker:
+    if EVENTS_BACKEND == "redis":
+        return EventBroker(RedisBackend())
+    if EVENTS_BACKEND != "memory":
+        logger.error(f"Unknown EVENTS_BACKEND '{EVENTS_BACKEND}', using in-process events")
+    return EventBroker(MemoryBackend())
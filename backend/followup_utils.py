@@ -1,10 +1,34 @@
 import os
+import re
+import json
 import logging
-from typing import List, Dict
+from typing import List, Dict, Optional, Tuple
+
+from metrics import latency
 
 logger = logging.getLogger(__name__)
 AZURE_OPENAI_CHAT_DEPLOYMENT = os.getenv("AZURE_OPENAI_CHAT_DEPLOYMENT")
 
+# "combined" classifies and rewrites in one call; "legacy" keeps the two-call flow
+FOLLOWUP_MODE = os.getenv("FOLLOWUP_MODE", "combined").lower()
+FOLLOWUP_MIN_STANDALONE_WORDS = int(os.getenv("FOLLOWUP_MIN_STANDALONE_WORDS", "4"))
+FOLLOWUP_OVERLAP_THRESHOLD = float(os.getenv("FOLLOWUP_OVERLAP_THRESHOLD", "0.5"))
+
+BACK_REFERENCES = {
+    "it", "its", "it's", "itself", "that", "this", "these", "those", "they", "them", "their",
+    "he", "she", "him", "her", "same", "above", "earlier", "previous", "previously", "before",
+    "again", "also", "else", "another", "other", "instead", "still", "there", "one", "ones",
+    "former", "latter", "mentioned", "said",
+}
+BACK_REFERENCE_PHRASES = ("what about", "how about", "what if", "and if", "why not", "then what")
+STOPWORDS = {
+    "a", "an", "the", "and", "or", "but", "is", "are", "was", "were", "be", "been", "to", "of",
+    "in", "on", "for", "with", "at", "by", "from", "as", "i", "my", "me", "we", "our", "you",
+    "your", "do", "does", "did", "can", "could", "should", "would", "how", "what", "why", "when",
+    "where", "which", "who", "not", "no", "yes", "please", "get", "getting", "have", "has", "am",
+}
+WORD_PATTERN = re.compile(r"[a-z0-9']+")
+
 
 def _format_history(conversation_history: List[Dict], max_turns: int = 5) -> str:
     if not conversation_history:
@@ -13,7 +37,7 @@ def _format_history(conversation_history: List[Dict], max_turns: int = 5) -> str
     return "\n".join([f"{msg.get('role', '').capitalize()}: {msg.get('content', '')}" for msg in trimmed])
 
 
-def is_follow_up_question(user_question: str, conversation_history: List[Dict], llm_client) -> bool:
+async def is_follow_up_question(user_question: str, conversation_history: List[Dict], llm_client) -> bool:
     if not conversation_history:
         return False
 
@@ -28,7 +52,7 @@ Question: "{user_question}"
 Reply ONLY: YES or NO"""
 
     try:
-        response = llm_client.chat.completions.create(
+        response = await llm_client.chat.completions.create(
             model=AZURE_OPENAI_CHAT_DEPLOYMENT,
             messages=[{"role": "user", "content": prompt}],
             temperature=0,
@@ -40,7 +64,7 @@ Reply ONLY: YES or NO"""
         return False
 
 
-def rewrite_follow_up_question(user_question: str, conversation_history: List[Dict], llm_client) -> str:
+async def rewrite_follow_up_question(user_question: str, conversation_history: List[Dict], llm_client) -> str:
     prompt = f"""Rewrite the follow-up question as standalone by adding context.
 Rules: Preserve meaning, be concise, output ONLY the rewritten question.
 
@@ -52,7 +76,7 @@ Follow-up: "{user_question}"
 Standalone Question:"""
 
     try:
-        response = llm_client.chat.completions.create(
+        response = await llm_client.chat.completions.create(
             model=AZURE_OPENAI_CHAT_DEPLOYMENT,
             messages=[{"role": "user", "content": prompt}],
             temperature=0,
@@ -63,3 +87,112 @@ Standalone Question:"""
     except Exception as e:
         logger.error(f"Follow-up rewrite error: {e}")
         return user_question
+
+
+def _words(text: str) -> List[str]:
+    return WORD_PATTERN.findall((text or "").lower())
+
+
+def _prior_user_messages(user_question: str, conversation_history: List[Dict]) -> List[str]:
+    messages = [msg.get("content", "") for msg in conversation_history or [] if msg.get("role") == "user"]
+    # The client sends the current question as the last history entry
+    if messages and messages[-1].strip() == user_question.strip():
+        messages = messages[:-1]
+    return messages
+
+
+def heuristic_follow_up(user_question: str, conversation_history: List[Dict]) -> Optional[bool]:
+    """
+    Cheap local classifier. Returns False when the question is confidently
+    standalone, or None when the LLM has to decide. It never answers True
+    because a real follow-up still needs the LLM to rewrite it.
+    """
+    prior = _prior_user_messages(user_question, conversation_history)
+    if not prior:
+        return False
+
+    words = _words(user_question)
+    lowered = " ".join(words)
+    if any(word in BACK_REFERENCES for word in words) or any(phrase in lowered for phrase in BACK_REFERENCE_PHRASES):
+        return None
+
+    content = {word for word in words if word not in STOPWORDS}
+    if len(content) >= FOLLOWUP_MIN_STANDALONE_WORDS:
+        return False
+
+    # Short question that restates an earlier one already carries its own context
+    previous = {word for word in _words(" ".join(prior[-3:])) if word not in STOPWORDS}
+    if content and len(content & previous) / len(content) >= FOLLOWUP_OVERLAP_THRESHOLD:
+        return False
+    return None
+
+
+def _parse_resolution(text: str) -> Optional[Dict]:
+    match = re.search(r"\{.*\}", text or "", re.DOTALL)
+    if not match:
+        return None
+    try:
+        data = json.loads(match.group(0))
+    except json.JSONDecodeError:
+        return None
+    return data if isinstance(data, dict) else None
+
+
+async def classify_and_rewrite(user_question: str, conversation_history: List[Dict], llm_client) -> Tuple[bool, str]:
+    """Single round trip: returns (is_follow_up, standalone_question)."""
+    prompt = f"""Decide if QUESTION depends on the conversation context (pronouns like it, that, they or references like earlier, same problem).
+If it does, rewrite it as a concise standalone question that preserves its meaning.
+
+Conversation:
+{_format_history(conversation_history)}
+
+Question: "{user_question}"
+
+Reply ONLY with JSON: {{"follow_up": true or false, "standalone_question": "<rewritten question, or empty if not a follow-up>"}}"""
+
+    try:
+        response = await llm_client.chat.completions.create(
+            model=AZURE_OPENAI_CHAT_DEPLOYMENT,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=0,
+            max_tokens=150,
+        )
+        data = _parse_resolution(response.choices[0].message.content)
+    except Exception as e:
+        logger.error(f"Follow-up resolution error: {e}")
+        return False, user_question
+
+    if not data or not data.get("follow_up"):
+        return False, user_question
+    rewritten = str(data.get("standalone_question") or "").strip()
+    if not rewritten or len(rewritten.split()) < 3:
+        return True, user_question
+    return True, rewritten
+
+
+async def resolve_follow_up(user_question: str, conversation_history: List[Dict], llm_client) -> Tuple[bool, str]:
+    """
+    Returns (is_follow_up, final_query). The default mode tries the local
+    heuristic first and then makes one LLM call; FOLLOWUP_MODE=legacy keeps
+    the original classify + rewrite pair for comparison.
+    """
+    if not conversation_history:
+        return False, user_question
+
+    if FOLLOWUP_MODE == "legacy":
+        latency.increment("followup_llm_resolutions")
+        with latency.time("followup_llm"):
+            with latency.time("followup_classify"):
+                is_follow_up = await is_follow_up_question(user_question, conversation_history, llm_client)
+            if not is_follow_up:
+                return False, user_question
+            with latency.time("followup_rewrite"):
+                return True, await rewrite_follow_up_question(user_question, conversation_history, llm_client)
+
+    if heuristic_follow_up(user_question, conversation_history) is False:
+        latency.increment("followup_heuristic_skips")
+        return False, user_question
+
+    latency.increment("followup_llm_resolutions")
+    with latency.time("followup_llm"):
+        return await classify_and_rewrite(user_question, conversation_history, llm_client)
@@ -1,22 +1,34 @@
 import os
+import json
 import math
 import uuid
 import time
-import pandas as pd
+import queue
+import random
+import hashlib
+import argparse
+import threading
+from itertools import islice
 from dotenv import load_dotenv
-from openai import AzureOpenAI
-from qdrant_client import QdrantClient, models as rest
-from concurrent.futures import ThreadPoolExecutor, as_completed
-import warnings
 
 # --- Load Environment Variables ---
+# Before the local imports: they read their settings from the environment at import time
 load_dotenv()
+
+from openai import RateLimitError
+from qdrant_client import QdrantClient, models as rest
+from llm_client import LLMRouter, retry_after_seconds
+from embedding_cache import EmbeddingCache
+from lexical import LEXICAL_VECTOR_NAME, document_vector
+from context_packing import TOKENIZER_NAME, count_tokens, solution_text
+from collection_profiles import COLLECTION_PROFILE, PAYLOAD_INDEXES, PROFILES, collection_config, get_profile
+from ingest_sources import iter_rows, InputReadError, SUPPORTED_EXTENSIONS
+from concurrent.futures import ThreadPoolExecutor, wait
+import warnings
+
 warnings.filterwarnings("ignore")
 
 # --- Configuration ---
-AZURE_OPENAI_KEY = os.getenv("AZURE_OPENAI_KEY")
-AZURE_OPENAI_ENDPOINT = os.getenv("AZURE_OPENAI_ENDPOINT")
-AZURE_OPENAI_API_VERSION = os.getenv("AZURE_OPENAI_API_VERSION")
 AZURE_OPENAI_EMBEDDING_DEPLOYMENT = os.getenv("AZURE_OPENAI_EMBEDDING_DEPLOYMENT")
 
 QDRANT_URL = os.getenv("QDRANT_URL")
@@ -24,145 +36,587 @@ QDRANT_API_KEY = os.getenv("QDRANT_API_KEY")
 COLLECTION_NAME = os.getenv("QDRANT_COLLECTION", "ticket_data_rag")
 
 INPUT_FILE = "ticket_clean_rag.xlsx"
-BATCH_SIZE = 25
-MAX_WORKERS = 4
+BATCH_SIZE = 25  # Initial batch size; adapted between MIN_ and MAX_BATCH_SIZE
+MIN_BATCH_SIZE = 8
+MAX_BATCH_SIZE = 256
+MAX_WORKERS = int(os.getenv("INGEST_EMBED_WORKERS", "4"))  # Embedding workers
+UPSERT_WORKERS = int(os.getenv("INGEST_UPSERT_WORKERS", "2"))
+QUEUE_DEPTH = 8  # Embedded batches waiting for an upsert worker
+QUEUE_POLL_SECONDS = 0.5  # How often blocked workers re-check for a failed peer
 MAX_RETRIES = 5  # Retry for transient errors
 RETRY_BACKOFF = 2  # Exponential backoff factor in seconds
+MAX_BACKOFF = 60
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "embedding_cache.db")
+CHECKPOINT_FILE = os.getenv("INGEST_CHECKPOINT_FILE", "ingest_checkpoint.json")
+SCROLL_PAGE_SIZE = 1000
+DELETE_BATCH_SIZE = 500
+
+
+class IngestStats:
+    def __init__(self):
+        self.embedding_api_seconds = 0.0
+        self.embedding_api_texts = 0
+        self.upserted = 0
+        self.failed_batches = 0
+        self._lock = threading.Lock()
+
+    def record_embedding(self, seconds: float, texts: int):
+        with self._lock:
+            self.embedding_api_seconds += seconds
+            self.embedding_api_texts += texts
+
+    def record_upsert(self, points: int) -> int:
+        with self._lock:
+            self.upserted += points
+            return self.upserted
+
+    def record_failure(self):
+        with self._lock:
+            self.failed_batches += 1
+
+
+class AdaptiveBatchSizer:
+    """Grows the embedding batch after a run of successes, halves it when throttled."""
+
+    def __init__(self, initial=BATCH_SIZE, minimum=MIN_BATCH_SIZE, maximum=MAX_BATCH_SIZE, grow_after=3):
+        self.size = initial
+        self.minimum = minimum
+        self.maximum = maximum
+        self.grow_after = grow_after
+        self._streak = 0
+        self._lock = threading.Lock()
+
+    def current(self) -> int:
+        return self.size
+
+    def success(self):
+        with self._lock:
+            self._streak += 1
+            if self._streak >= self.grow_after and self.size < self.maximum:
+                self.size = min(self.maximum, self.size * 2)
+                self._streak = 0
+
+    def throttled(self):
+        with self._lock:
+            self.size = max(self.minimum, self.size // 2)
+            self._streak = 0
+
+
+class RateLimitGate:
+    """Shared pause so one 429 backs off every embedding worker, not just the caller."""
+
+    def __init__(self):
+        self._until = 0.0
+        self._lock = threading.Lock()
+
+    def block_for(self, seconds: float):
+        with self._lock:
+            self._until = max(self._until, time.monotonic() + seconds)
+
+    def wait(self):
+        remaining = self._until - time.monotonic()
+        if remaining > 0:
+            time.sleep(remaining)
+
+
+class RecordFeed:
+    """Thread-safe source that hands out record slices of whatever size is asked for."""
+
+    def __init__(self, records):
+        self._records = iter(records)
+        self._lock = threading.Lock()
+
+    def take(self, count: int):
+        with self._lock:
+            return list(islice(self._records, count))
+
+
+def backoff_seconds(attempt: int) -> float:
+    return min(MAX_BACKOFF, RETRY_BACKOFF ** attempt) * random.uniform(0.5, 1.0)
+
+
+def init_clients():
+    print("🟢 Initializing Azure OpenAI client...")
+    try:
+        # Fails over between AZURE_OPENAI_ENDPOINTS; a 429 only surfaces here when every
+        # endpoint is throttled, and is then shared across workers by RateLimitGate
+        openai_client = LLMRouter()
+        # Passes when any endpoint answers; unreachable ones start out behind their breaker
+        openai_client.models.list()
+        print("✅ Azure OpenAI client initialized successfully.")
+    except Exception as e:
+        print(f"❌ Failed to initialize Azure OpenAI client: {e}")
+        exit()
+
+    print("\n🟢 Initializing Qdrant Cloud client...")
+    try:
+        qdrant = QdrantClient(
+            url=QDRANT_URL,
+            api_key=QDRANT_API_KEY,
+            prefer_grpc=False,
+            timeout=120
+        )
+        qdrant.get_collections()
+        print(f"✅ Connected to Qdrant Cloud at {QDRANT_URL}")
+    except Exception as e:
+        print(f"❌ Failed to connect to Qdrant Cloud: {e}")
+        exit()
+
+    return openai_client, qdrant
 
-# --- Initialize Azure OpenAI Client ---
-print("🟢 Initializing Azure OpenAI client...")
-try:
-    openai_client = AzureOpenAI(
-        api_key=AZURE_OPENAI_KEY,
-        api_version=AZURE_OPENAI_API_VERSION,
-        azure_endpoint=AZURE_OPENAI_ENDPOINT,
-    )
-    openai_client.models.list()
-    print("✅ Azure OpenAI client initialized successfully.")
-except Exception as e:
-    print(f"❌ Failed to initialize Azure OpenAI client: {e}")
-    exit()
-
-# --- Initialize Qdrant Cloud Client ---
-print("\n🟢 Initializing Qdrant Cloud client...")
-try:
-    qdrant = QdrantClient(
-        url=QDRANT_URL,
-        api_key=QDRANT_API_KEY,
-        prefer_grpc=False,
-        timeout=120
-    )
-    qdrant.get_collections()
-    print(f"✅ Connected to Qdrant Cloud at {QDRANT_URL}")
-except Exception as e:
-    print(f"❌ Failed to connect to Qdrant Cloud: {e}")
-    exit()
-
-# --- Load and Prepare Data ---
-print(f"\n📚 Reading data from '{INPUT_FILE}'...")
-try:
-    df = pd.read_excel(INPUT_FILE)
-    df.columns = df.columns.str.strip()
-except FileNotFoundError:
-    print(f"❌ Error: The file '{INPUT_FILE}' was not found.")
-    exit()
 
 def is_valid_text(text) -> bool:
     if text is None or (isinstance(text, float) and math.isnan(text)):
         return False
     return str(text).strip().lower() not in ["", "nan", "null", "none"]
 
-comments_to_embed = []
-for i, row in df.iterrows():
-    problem = str(row.get("problem_text", "")).strip()
-    resolution = str(row.get("resolution_text", "")).strip()
+
+def content_hash(payload: dict) -> str:
+    """Hash of everything that ends up in a point, used to detect changed rows."""
+    fields = [payload["problem_text"], payload["resolution_text"], payload["language"], payload["category"]]
+    return hashlib.sha256("\0".join(fields).encode("utf-8")).hexdigest()
+
+
+def make_record(row: dict):
+    """Build the point for one input row, or None if it has nothing to embed."""
+    problem = row.get("problem_text", "")
+    resolution = row.get("resolution_text", "")
     text_for_embedding = problem if is_valid_text(problem) else resolution if is_valid_text(resolution) else None
     if not text_for_embedding:
-        continue
+        return None
 
-    tid = str(row.get("TicketID", "")).strip()
-    point_id = str(uuid.uuid5(uuid.NAMESPACE_DNS, tid)) if tid else str(uuid.uuid4())
+    tid = row.get("TicketID", "")
+    payload = {
+        "ticket_id": tid,
+        "problem_text": problem,
+        "resolution_text": resolution,
+        "language": row.get("language", ""),
+        "category": row.get("category", ""),
+    }
+    payload["content_hash"] = content_hash(payload)
+    # Lets the API pack prompts without re-tokenizing every retrieved solution
+    payload["context_tokens"] = count_tokens(solution_text(payload))
+    payload["context_tokenizer"] = TOKENIZER_NAME
+    # Deterministic ids let incremental runs match rows to existing points
+    point_id = str(uuid.uuid5(uuid.NAMESPACE_DNS, tid)) if tid else str(uuid.uuid5(uuid.NAMESPACE_URL, payload["content_hash"]))
 
-    comments_to_embed.append({
+    return {
         "id": point_id,
         "embedding_text": text_for_embedding,
-        "payload": {
-            "ticket_id": tid,
-            "problem_text": problem,
-            "resolution_text": resolution,
-            "language": str(row.get("language", "")),
-            "category": str(row.get("category", "")),
-        }
-    })
-
-print(f"✅ Prepared {len(comments_to_embed)} valid records for embedding.")
-if not comments_to_embed:
-    print("⚠️ No valid records to ingest. Exiting.")
-    exit()
-
-# --- Setup Qdrant Collection ---
-print("\n🛠️ Setting up Qdrant collection...")
-try:
-    test_embedding = openai_client.embeddings.create(
-        model=AZURE_OPENAI_EMBEDDING_DEPLOYMENT,
-        input="test"
-    ).data[0].embedding
-    dim = len(test_embedding)
-
-    existing_collections = qdrant.get_collections()
-    collection_names = [c.name for c in existing_collections.collections]
-
-    if COLLECTION_NAME in collection_names:
-        print(f"- Collection '{COLLECTION_NAME}' already exists. Deleting...")
-        qdrant.delete_collection(COLLECTION_NAME)
-
-    print(f"- Creating new collection '{COLLECTION_NAME}'...")
+        "lexical_text": f"{problem}\n{resolution}",
+        "payload": payload,
+    }
+
+
+def build_point(record: dict, embedding, lexical: bool = False):
+    """PointStruct for an embedded record, with the sparse lexical vector when the collection has one."""
+    if not lexical:
+        return rest.PointStruct(id=record["id"], vector=embedding, payload=record["payload"])
+    indices, values = document_vector(record.get("lexical_text") or record["embedding_text"])
+    return rest.PointStruct(
+        id=record["id"],
+        vector={"": embedding, LEXICAL_VECTOR_NAME: rest.SparseVector(indices=indices, values=values)},
+        payload=record["payload"],
+    )
+
+
+class IngestDiff:
+    """Streams input records against the indexed id -> content_hash map.
+
+    Every id seen in the input is popped from the map, so once the input is
+    exhausted whatever is left are points for rows that no longer exist.
+    """
+
+    def __init__(self, indexed: dict):
+        self.remaining = indexed
+        self.indexed = len(indexed)
+        self.valid = 0
+        self.changed = 0
+
+    def pending(self, rows):
+        for row in rows:
+            record = make_record(row)
+            if record is None:
+                continue
+            self.valid += 1
+            if self.remaining.pop(record["id"], None) != record["payload"]["content_hash"]:
+                self.changed += 1
+                yield record
+
+    def removed_ids(self):
+        return list(self.remaining)
+
+
+def resolve_alias(qdrant, alias_name: str):
+    for alias in qdrant.get_aliases().aliases:
+        if alias.alias_name == alias_name:
+            return alias.collection_name
+    return None
+
+
+def create_collection(qdrant, collection_name: str, dim: int, ingest_version: str, profile_name: str = COLLECTION_PROFILE):
+    # ingest_version lets the API's answer cache detect a re-ingest
+    # The sparse vector carries BM25 term weights; Qdrant applies the IDF part
+    profile = get_profile(profile_name)
     qdrant.create_collection(
-        collection_name=COLLECTION_NAME,
-        vectors_config=rest.VectorParams(size=dim, distance=rest.Distance.COSINE),
+        collection_name=collection_name,
+        sparse_vectors_config={LEXICAL_VECTOR_NAME: rest.SparseVectorParams(modifier=rest.Modifier.IDF)},
+        metadata={"ingest_version": ingest_version, "profile": profile["name"]},
+        **collection_config(profile, dim),
     )
-    print(f"✅ Created collection '{COLLECTION_NAME}' with vector size {dim}.")
-except Exception as e:
-    print(f"❌ Failed to set up Qdrant collection: {e}")
-    exit()
+    print(f"✅ Created collection '{collection_name}' with vector size {dim}, a lexical index "
+          f"and the '{profile['name']}' profile.")
+    ensure_payload_indexes(qdrant, collection_name)
+
+
+def ensure_payload_indexes(qdrant, collection_name: str):
+    existing = qdrant.get_collection(collection_name=collection_name).payload_schema or {}
+    for field, schema in PAYLOAD_INDEXES.items():
+        if field not in existing:
+            qdrant.create_payload_index(collection_name=collection_name, field_name=field, field_schema=schema)
+            print(f"✅ Indexed payload field '{field}' in '{collection_name}'.")
+
+
+def collection_profile(qdrant, collection_name: str) -> str:
+    metadata = qdrant.get_collection(collection_name=collection_name).config.metadata or {}
+    return metadata.get("profile", "default")
+
+
+def has_lexical_index(qdrant, collection_name: str) -> bool:
+    sparse = qdrant.get_collection(collection_name=collection_name).config.params.sparse_vectors or {}
+    return LEXICAL_VECTOR_NAME in sparse
+
+
+def fetch_indexed_hashes(qdrant, collection_name: str) -> dict:
+    """Map point id -> content_hash for everything already in the collection."""
+    indexed = {}
+    offset = None
+    while True:
+        points, offset = qdrant.scroll(
+            collection_name=collection_name,
+            limit=SCROLL_PAGE_SIZE,
+            offset=offset,
+            with_payload=["content_hash"],
+            with_vectors=False,
+        )
+        for point in points:
+            indexed[str(point.id)] = (point.payload or {}).get("content_hash")
+        if offset is None:
+            return indexed
+
+
+def embed_text_with_retry(openai_client, embedding_cache, texts, stats: IngestStats,
+                          gate: RateLimitGate = None, sizer: AdaptiveBatchSizer = None):
+    embeddings = embedding_cache.get_many(texts)
+    missing = [i for i, e in enumerate(embeddings) if e is None]
+    if not missing:
+        return embeddings
 
-# --- Helper function for safe embedding with retries ---
-def embed_text_with_retry(texts):
     for attempt in range(MAX_RETRIES):
+        if gate is not None:
+            gate.wait()
         try:
+            start = time.perf_counter()
             response = openai_client.embeddings.create(
                 model=AZURE_OPENAI_EMBEDDING_DEPLOYMENT,
-                input=texts
+                input=[texts[i] for i in missing]
             )
-            return [d.embedding for d in response.data]
+            stats.record_embedding(time.perf_counter() - start, len(missing))
+            fresh = [d.embedding for d in response.data]
+            embedding_cache.put_many([texts[i] for i in missing], fresh)
+            for i, embedding in zip(missing, fresh):
+                embeddings[i] = embedding
+            return embeddings
+        except RateLimitError as e:
+            wait_time = retry_after_seconds(e) or backoff_seconds(attempt)
+            print(f"⏳ Embedding rate limited (attempt {attempt+1}/{MAX_RETRIES}). Pausing embedding for {wait_time:.1f}s...")
+            if gate is not None:
+                gate.block_for(wait_time)
+            else:
+                time.sleep(wait_time)
+            if sizer is not None:
+                sizer.throttled()
         except Exception as e:
-            wait_time = RETRY_BACKOFF ** attempt
-            print(f"⚠️ Embedding failed (attempt {attempt+1}/{MAX_RETRIES}). Retrying in {wait_time}s...")
+            wait_time = backoff_seconds(attempt)
+            print(f"⚠️ Embedding failed (attempt {attempt+1}/{MAX_RETRIES}): {e}. Retrying in {wait_time:.1f}s...")
             time.sleep(wait_time)
+    # No dummy vectors: the rows stay un-indexed so the next run picks them up
     print("❌ Max retries reached. Skipping this batch.")
-    return [ [0.0]*dim for _ in texts ]  # fallback dummy vector
+    return None
 
-# --- Embed and Upsert Data ---
-print(f"\n⚡ Starting ingestion ({MAX_WORKERS} workers, batch size={BATCH_SIZE})...")
-total_batches = (len(comments_to_embed) + BATCH_SIZE - 1) // BATCH_SIZE
-
-for start_index in range(0, len(comments_to_embed), BATCH_SIZE):
-    batch_num = start_index // BATCH_SIZE + 1
-    batch = comments_to_embed[start_index:start_index+BATCH_SIZE]
-
-    embeddings = embed_text_with_retry([c["embedding_text"] for c in batch])
-    points = [rest.PointStruct(id=item["id"], vector=embeddings[i], payload=item["payload"]) for i, item in enumerate(batch)]
 
+def upsert_with_retry(qdrant, collection_name, points) -> bool:
     for attempt in range(MAX_RETRIES):
         try:
-            qdrant.upsert(COLLECTION_NAME, points=points, wait=True)
-            print(f"- Upserted batch {batch_num}/{total_batches}")
-            break
+            qdrant.upsert(collection_name, points=points, wait=True)
+            return True
         except Exception as e:
-            wait_time = RETRY_BACKOFF ** attempt
-            print(f"⚠️ Upsert failed (attempt {attempt+1}/{MAX_RETRIES}). Retrying in {wait_time}s...")
+            wait_time = backoff_seconds(attempt)
+            print(f"⚠️ Upsert failed (attempt {attempt+1}/{MAX_RETRIES}). Retrying in {wait_time:.1f}s...")
             time.sleep(wait_time)
-    else:
-        print(f"❌ Max retries reached for batch {batch_num}. Skipping.")
+    return False
+
+
+def upsert_records(openai_client, qdrant, embedding_cache, collection_name, records, stats,
+                   embed_workers: int = MAX_WORKERS, upsert_workers: int = UPSERT_WORKERS, lexical: bool = False):
+    """Pipelined ingest: embedding workers feed a bounded queue drained by upsert workers.
+
+    If any worker raises, the others stop (nothing blocks on the queue
+    forever) and the first error is re-raised once all of them have exited.
+    """
+    feed = RecordFeed(records)
+    sizer = AdaptiveBatchSizer()
+    gate = RateLimitGate()
+    embedded = queue.Queue(maxsize=QUEUE_DEPTH)
+    stop = threading.Event()
+
+    def hand_over(item) -> bool:
+        while not stop.is_set():
+            try:
+                embedded.put(item, timeout=QUEUE_POLL_SECONDS)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def embed_worker():
+        try:
+            while not stop.is_set():
+                batch = feed.take(sizer.current())
+                if not batch:
+                    return
+                embeddings = embed_text_with_retry(
+                    openai_client, embedding_cache, [c["embedding_text"] for c in batch], stats, gate, sizer
+                )
+                if embeddings is None:
+                    stats.record_failure()
+                    continue
+                sizer.success()
+                if not hand_over((batch, embeddings)):
+                    return
+        except BaseException:
+            stop.set()
+            raise
+
+    def upsert_worker():
+        try:
+            while True:
+                try:
+                    item = embedded.get(timeout=QUEUE_POLL_SECONDS)
+                except queue.Empty:
+                    if stop.is_set():
+                        return
+                    continue
+                if item is None:
+                    return
+                batch, embeddings = item
+                points = [build_point(r, embeddings[i], lexical) for i, r in enumerate(batch)]
+                if not upsert_with_retry(qdrant, collection_name, points):
+                    stats.record_failure()
+                    print(f"❌ Max retries reached for a batch of {len(points)} points. Skipping.")
+                    continue
+                upserted = stats.record_upsert(len(points))
+                print(f"- Upserted {len(points)} points ({upserted} total, batch size now {sizer.current()})")
+        except BaseException:
+            stop.set()
+            raise
+
+    with ThreadPoolExecutor(max_workers=embed_workers + upsert_workers) as executor:
+        upserters = [executor.submit(upsert_worker) for _ in range(upsert_workers)]
+        embedders = [executor.submit(embed_worker) for _ in range(embed_workers)]
+        # Sentinels only after every embedder is done, so none can land ahead of real batches
+        wait(embedders)
+        for _ in upserters:
+            if not hand_over(None):
+                break
+        wait(upserters)
+
+    errors = [future.exception() for future in embedders + upserters if future.exception() is not None]
+    if errors:
+        raise errors[0]
+
+
+def delete_points(qdrant, collection_name: str, point_ids):
+    for start_index in range(0, len(point_ids), DELETE_BATCH_SIZE):
+        qdrant.delete(
+            collection_name=collection_name,
+            points_selector=rest.PointIdsList(points=point_ids[start_index:start_index+DELETE_BATCH_SIZE]),
+            wait=True,
+        )
+    print(f"- Deleted {len(point_ids)} points for rows removed from the input.")
+
+
+def swap_alias(qdrant, alias_name: str, new_collection: str):
+    """Atomically point alias_name at new_collection and drop the old target."""
+    old_collection = resolve_alias(qdrant, alias_name)
+    if old_collection is None and qdrant.collection_exists(alias_name):
+        # A plain collection occupies the alias name; it has to go before the alias can exist
+        print(f"⚠️ '{alias_name}' is a collection, not an alias. Replacing it (brief search gap).")
+        qdrant.delete_collection(alias_name)
+
+    operations = []
+    if old_collection is not None:
+        operations.append(rest.DeleteAliasOperation(delete_alias=rest.DeleteAlias(alias_name=alias_name)))
+    operations.append(rest.CreateAliasOperation(
+        create_alias=rest.CreateAlias(collection_name=new_collection, alias_name=alias_name)
+    ))
+    qdrant.update_collection_aliases(change_aliases_operations=operations)
+    print(f"🔀 Alias '{alias_name}' now points to '{new_collection}'.")
+
+    if old_collection and old_collection != new_collection:
+        qdrant.delete_collection(old_collection)
+        print(f"- Dropped previous collection '{old_collection}'.")
+
+
+def load_checkpoint():
+    try:
+        with open(CHECKPOINT_FILE) as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def save_checkpoint(checkpoint: dict):
+    tmp_path = f"{CHECKPOINT_FILE}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp_path, CHECKPOINT_FILE)
+
+
+def clear_checkpoint():
+    if os.path.exists(CHECKPOINT_FILE):
+        os.remove(CHECKPOINT_FILE)
+
+
+def abandon_run(qdrant, mode: str, target: str):
+    """Drop a rebuild's shadow collection and the checkpoint after an unusable input."""
+    if mode == "rebuild":
+        # The alias still points at the old collection; a shadow built from a bad input is not worth resuming
+        qdrant.delete_collection(target)
+        print(f"- Dropped shadow collection '{target}'.")
+    clear_checkpoint()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingest ticket data into Qdrant.")
+    parser.add_argument("--input", default=INPUT_FILE, help=f"Ticket export ({', '.join(SUPPORTED_EXTENSIONS)})")
+    parser.add_argument(
+        "--mode", choices=["incremental", "rebuild"], default="incremental",
+        help="incremental: upsert new/changed rows and delete removed ones in place; "
+             "rebuild: build a fresh shadow collection and swap the alias to it",
+    )
+    parser.add_argument(
+        "--profile", choices=list(PROFILES), default=COLLECTION_PROFILE,
+        help="Storage profile for new collections (quantization, on-disk storage, HNSW); "
+             "set QDRANT_COLLECTION_PROFILE to the same value for the API",
+    )
+    args = parser.parse_args()
+
+    openai_client, qdrant = init_clients()
+    embedding_cache = EmbeddingCache(db_path=EMBEDDING_CACHE_PATH, model=AZURE_OPENAI_EMBEDDING_DEPLOYMENT)
+    stats = IngestStats()
+
+    print(f"\n📚 Streaming data from '{args.input}'...")
+    try:
+        rows = iter_rows(args.input)
+    except FileNotFoundError:
+        print(f"❌ Error: The file '{args.input}' was not found.")
+        exit()
+    except (ValueError, InputReadError) as e:
+        print(f"❌ Error: {e}")
+        exit()
+
+    # --- Setup Qdrant Collection ---
+    print("\n🛠️ Setting up Qdrant collection...")
+    try:
+        test_embedding = openai_client.embeddings.create(
+            model=AZURE_OPENAI_EMBEDDING_DEPLOYMENT,
+            input="test"
+        ).data[0].embedding
+        dim = len(test_embedding)
+        ingest_version = uuid.uuid4().hex
+
+        checkpoint = load_checkpoint()
+        if checkpoint and checkpoint.get("mode") == args.mode and qdrant.collection_exists(checkpoint["collection"]):
+            target = checkpoint["collection"]
+            print(f"↩️ Resuming interrupted {args.mode} run into '{target}'.")
+        elif args.mode == "rebuild":
+            target = f"{COLLECTION_NAME}__{ingest_version}"
+            print(f"- Building shadow collection '{target}'...")
+            create_collection(qdrant, target, dim, ingest_version, args.profile)
+        else:
+            target = resolve_alias(qdrant, COLLECTION_NAME) or COLLECTION_NAME
+            if not qdrant.collection_exists(target):
+                print(f"- Creating new collection '{target}'...")
+                create_collection(qdrant, target, dim, ingest_version, args.profile)
+            else:
+                print(f"- Updating collection '{target}' in place.")
+                ensure_payload_indexes(qdrant, target)
+                if collection_profile(qdrant, target) != args.profile:
+                    print(f"⚠️ '{target}' uses the '{collection_profile(qdrant, target)}' profile; "
+                          f"--mode rebuild applies '{args.profile}'.")
+        # Only which collection a run writes to: a resumed run re-diffs the input against
+        # the content hashes already indexed there, so no row offset is kept
+        save_checkpoint({"mode": args.mode, "input": args.input, "collection": target})
+    except Exception as e:
+        print(f"❌ Failed to set up Qdrant collection: {e}")
+        exit()
+
+    lexical = has_lexical_index(qdrant, target)
+    if not lexical:
+        print(f"⚠️ '{target}' has no lexical index; hybrid search needs a one-off --mode rebuild.")
+
+    # --- Diff Input Against Indexed Points ---
+    diff = IngestDiff(fetch_indexed_hashes(qdrant, target))
+    print(f"🔎 {diff.indexed} points already indexed in '{target}'.")
+
+    # --- Embed and Upsert Data ---
+    # Rows stream from the reader through the diff straight into the workers
+    print(f"\n⚡ Starting ingestion ({MAX_WORKERS} embedding workers, {UPSERT_WORKERS} upsert workers, "
+          f"initial batch size={BATCH_SIZE})...")
+    try:
+        upsert_records(openai_client, qdrant, embedding_cache, target, diff.pending(rows), stats, lexical=lexical)
+    except InputReadError as e:
+        # Rows read so far are indexed; removed rows are unknown, so nothing is deleted or swapped
+        print(f"❌ Error: {e}")
+        abandon_run(qdrant, args.mode, target)
+        embedding_cache.close()
+        exit(1)
+
+    to_delete = diff.removed_ids()
+    print(f"✅ Read {diff.valid} valid records: {diff.changed} new/changed, "
+          f"{diff.valid - diff.changed} unchanged, {len(to_delete)} removed.")
+    if not diff.valid:
+        # Never empty the collection because of an empty or unreadable export
+        print("⚠️ No valid records in the input. Leaving the collection untouched.")
+        abandon_run(qdrant, args.mode, target)
+        embedding_cache.close()
+        exit()
+
+    if stats.failed_batches:
+        print(f"\n⚠️ {stats.failed_batches} batches failed. Re-run to resume; removed rows were not deleted yet.")
+        embedding_cache.close()
+        exit(1)
+
+    if to_delete:
+        delete_points(qdrant, target, to_delete)
+
+    if args.mode == "rebuild":
+        swap_alias(qdrant, COLLECTION_NAME, target)
+    elif diff.changed or to_delete:
+        qdrant.update_collection(collection_name=target, metadata={"ingest_version": ingest_version})
+    clear_checkpoint()
+
+    print(f"\n🎉 Ingestion complete: {stats.upserted} upserted, {len(to_delete)} deleted.")
+
+    cache_stats = embedding_cache.stats()
+    cache_hits = cache_stats["memory_hits"] + cache_stats["disk_hits"]
+    avg_embed_seconds = stats.embedding_api_seconds / stats.embedding_api_texts if stats.embedding_api_texts else 0.0
+    print(f"🧠 Embedding cache: {cache_hits}/{cache_hits + cache_stats['misses']} hits "
+          f"({cache_stats['hit_rate']:.1%}), ~{cache_hits * avg_embed_seconds:.1f}s of embedding calls saved "
+          f"({stats.embedding_api_texts} texts embedded in {stats.embedding_api_seconds:.1f}s).")
+    embedding_cache.close()
+
 
-print("\n🎉 All comments ingested successfully (with automatic retry on failures)!")
+if __name__ == "__main__":
+    main()
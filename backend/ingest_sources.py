@@ -0,0 +1,103 @@
+import os
+import math
+from typing import Dict, Iterator
+
+CHUNK_SIZE = 5000
+SUPPORTED_EXTENSIONS = (".csv", ".parquet", ".xlsx", ".xlsm")
+
+
+class InputReadError(Exception):
+    """The input file could not be opened or parsed (also raised mid-stream by iter_rows)."""
+
+
+def iter_rows(path: str, chunk_size: int = CHUNK_SIZE) -> Iterator[Dict]:
+    """Yield spreadsheet rows as dicts, reading at most one chunk at a time.
+
+    Header names are stripped and missing cells come back as "" so every
+    format produces identical payloads (and content hashes) for the same data.
+    The file is opened before this returns, so a missing reader package or
+    an empty/corrupt file fails here; parse errors in later chunks surface
+    as InputReadError while iterating.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if not os.path.exists(path):
+        raise FileNotFoundError(path)
+    if extension not in SUPPORTED_EXTENSIONS:
+        raise ValueError(f"Unsupported input format '{extension}'. Use one of: {', '.join(SUPPORTED_EXTENSIONS)}")
+    try:
+        if extension == ".csv":
+            rows = _open_csv(path, chunk_size)
+        elif extension == ".parquet":
+            rows = _open_parquet(path, chunk_size)
+        else:
+            rows = _open_xlsx(path)
+    except Exception as e:
+        raise InputReadError(f"Cannot read '{path}': {e}") from e
+    return _guarded(path, rows)
+
+
+def _guarded(path: str, rows: Iterator[Dict]) -> Iterator[Dict]:
+    try:
+        yield from rows
+    except Exception as e:
+        raise InputReadError(f"Cannot read '{path}': {e}") from e
+
+
+def normalize_cell(value) -> str:
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        # Numeric ids read as float when a column has gaps ("123.0" vs "123")
+        value = int(value)
+    return str(value).strip()
+
+
+def _open_csv(path: str, chunk_size: int) -> Iterator[Dict]:
+    import pandas as pd
+
+    return _iter_csv(pd.read_csv(path, chunksize=chunk_size, dtype=str, keep_default_na=False))
+
+
+def _iter_csv(reader) -> Iterator[Dict]:
+    for chunk in reader:
+        chunk.columns = chunk.columns.str.strip()
+        for row in chunk.to_dict("records"):
+            yield {key: normalize_cell(value) for key, value in row.items()}
+
+
+def _open_parquet(path: str, chunk_size: int) -> Iterator[Dict]:
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError("Reading .parquet input requires pyarrow: pip install pyarrow")
+
+    return _iter_parquet(pq.ParquetFile(path), chunk_size)
+
+
+def _iter_parquet(parquet_file, chunk_size: int) -> Iterator[Dict]:
+    columns = [name.strip() for name in parquet_file.schema_arrow.names]
+    for batch in parquet_file.iter_batches(batch_size=chunk_size):
+        for values in zip(*(column.to_pylist() for column in batch.columns)):
+            yield {key: normalize_cell(value) for key, value in zip(columns, values)}
+
+
+def _open_xlsx(path: str) -> Iterator[Dict]:
+    from openpyxl import load_workbook
+
+    # read_only streams rows from the sheet XML instead of building the whole workbook
+    return _iter_xlsx(load_workbook(path, read_only=True, data_only=True))
+
+
+def _iter_xlsx(workbook) -> Iterator[Dict]:
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        columns = [normalize_cell(name) for name in header]
+        for values in rows:
+            if values is None or all(value is None for value in values):
+                continue
+            yield {key: normalize_cell(value) for key, value in zip(columns, values)}
+    finally:
+        workbook.close()
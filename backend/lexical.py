@@ -0,0 +1,57 @@
+import os
+import re
+import hashlib
+from collections import Counter
+from typing import List, Tuple
+
+# Sparse "lexical" vectors for hybrid retrieval. Documents carry BM25
+# term-frequency weights and queries a weight of 1 per term; the IDF part is
+# applied by Qdrant (Modifier.IDF on the sparse vector), so the dot product
+# Qdrant computes is the BM25 score.
+LEXICAL_VECTOR_NAME = "lexical"
+BM25_K1 = float(os.getenv("BM25_K1", "1.2"))
+BM25_B = float(os.getenv("BM25_B", "0.75"))
+BM25_AVG_DOC_TOKENS = float(os.getenv("BM25_AVG_DOC_TOKENS", "60"))
+
+# Identifiers such as "0x80070005", "srv-app01.corp.local" or "HP-123-45" stay whole
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[._:/\\-][a-z0-9]+)*")
+SEPARATOR_PATTERN = re.compile(r"[._:/\\-]")
+STOPWORDS = {
+    "a", "an", "the", "and", "or", "but", "is", "are", "was", "were", "be", "been", "to", "of",
+    "in", "on", "for", "with", "at", "by", "from", "as", "it", "its", "this", "that", "my", "me",
+    "we", "our", "you", "your", "do", "does", "did", "not", "no", "can", "could", "have", "has",
+    "after", "when", "what", "how", "why", "please", "i", "am", "so", "if", "then",
+}
+
+
+def tokenize(text: str) -> List[str]:
+    """Lower-cased terms; compound identifiers yield the whole token plus its parts."""
+    tokens = []
+    for match in TOKEN_PATTERN.findall((text or "").lower()):
+        parts = SEPARATOR_PATTERN.split(match)
+        if len(parts) > 1:
+            tokens.append(match)
+        tokens.extend(part for part in parts if len(part) > 1 and part not in STOPWORDS)
+    return tokens
+
+
+def term_index(term: str) -> int:
+    # Stable across processes (unlike hash()), 32-bit like Qdrant sparse indices
+    return int.from_bytes(hashlib.blake2b(term.encode("utf-8"), digest_size=4).digest(), "big")
+
+
+def document_vector(text: str) -> Tuple[List[int], List[float]]:
+    tokens = tokenize(text)
+    if not tokens:
+        return [], []
+    length_norm = 1 - BM25_B + BM25_B * len(tokens) / BM25_AVG_DOC_TOKENS
+    weights = {}
+    for term, tf in Counter(tokens).items():
+        index = term_index(term)
+        weights[index] = weights.get(index, 0.0) + tf * (BM25_K1 + 1) / (tf + BM25_K1 * length_norm)
+    return list(weights), list(weights.values())
+
+
+def query_vector(text: str) -> Tuple[List[int], List[float]]:
+    indices = sorted({term_index(term) for term in tokenize(text)})
+    return indices, [1.0] * len(indices)
@@ -0,0 +1,491 @@
+import os
+import json
+import time
+import random
+import asyncio
+import logging
+import threading
+from types import SimpleNamespace
+from typing import Dict, List, Optional
+from urllib.parse import urlparse
+
+import httpx
+from openai import (
+    APIConnectionError, APIError, APITimeoutError, AsyncAzureOpenAI, AzureOpenAI, DefaultAsyncHttpxClient,
+    InternalServerError, RateLimitError,
+)
+
+from context_packing import count_tokens
+from metrics import latency
+
+logger = logging.getLogger(__name__)
+
+# Azure OpenAI access shared by the API (rag_qdrant, followup_utils) and ingest_qdrant.py.
+# AZURE_OPENAI_ENDPOINTS lists deployments as JSON, e.g.
+#   [{"name": "weu", "endpoint": "https://weu.openai.azure.com", "api_key_env": "WEU_KEY",
+#     "chat_deployment": "gpt-4o", "embedding_deployment": "emb", "weight": 2, "tpm": 240000, "rpm": 1440},
+#    {"name": "swc", "endpoint": "https://swc.openai.azure.com", "api_key": "...", "weight": 1}]
+# Without it the single AZURE_OPENAI_* endpoint is used. Requests go to a
+# weighted-random endpoint whose circuit breaker is closed, that is not
+# cooling down after a 429 and whose token buckets have room; failures fail
+# over to the next endpoint.
+AZURE_OPENAI_ENDPOINTS = os.getenv("AZURE_OPENAI_ENDPOINTS", "")
+LLM_REQUEST_TIMEOUT_SECONDS = float(os.getenv("LLM_REQUEST_TIMEOUT_SECONDS", "30"))
+LLM_MAX_ATTEMPTS = int(os.getenv("LLM_MAX_ATTEMPTS", "3"))
+# How long a request may wait for an endpoint to come off throttling or free quota
+LLM_MAX_QUEUE_SECONDS = float(os.getenv("LLM_MAX_QUEUE_SECONDS", "5"))
+# Cool-down after a 429 without Retry-After
+LLM_THROTTLE_SECONDS = float(os.getenv("LLM_THROTTLE_SECONDS", "10"))
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+LLM_BREAKER_COOLDOWN_SECONDS = float(os.getenv("LLM_BREAKER_COOLDOWN_SECONDS", "30"))
+# Send a second copy of a non-streaming request to another endpoint after this long; 0 disables
+LLM_HEDGE_AFTER_MS = float(os.getenv("LLM_HEDGE_AFTER_MS", "0"))
+
+# Endpoint trouble worth failing over for; other errors (400, 401, content filter) are the request's
+RETRYABLE_ERRORS = (RateLimitError, APITimeoutError, APIConnectionError, InternalServerError)
+
+
+class LLMUnavailableError(Exception):
+    """No endpoint could take the request: breakers open, throttled or out of quota."""
+
+
+def retry_after_seconds(error):
+    """Seconds requested by a 429's Retry-After / retry-after-ms header, if any."""
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except ValueError:
+        pass
+    return None
+
+
+class CircuitBreaker:
+    """Opens after `failures` consecutive failures; after `cooldown` one probe request may go through."""
+
+    def __init__(self, failures: int = LLM_BREAKER_FAILURES, cooldown: float = LLM_BREAKER_COOLDOWN_SECONDS):
+        self.failures = failures
+        self.cooldown = cooldown
+        self.state = "closed"
+        self.opened = 0
+        self._consecutive = 0
+        self._opened_at = 0.0
+
+    def acquire(self, now: float):
+        if self.state == "open" and now - self._opened_at >= self.cooldown:
+            self.state = "half_open"
+
+    def record_success(self):
+        self._consecutive = 0
+        self.state = "closed"
+
+    def release(self):
+        """A probe that ended without a verdict (cancelled, or the request's own error) lets the next one try."""
+        if self.state == "half_open":
+            self.state = "open"
+
+    def record_failure(self, now: float):
+        self._consecutive += 1
+        if self.state == "half_open" or self._consecutive >= self.failures:
+            if self.state != "open":
+                self.opened += 1
+                latency.increment("llm_breaker_opened")
+            self.state = "open"
+            self._opened_at = now
+
+    def ready_in(self, now: float) -> float:
+        if self.state == "closed":
+            return 0.0
+        if self.state == "half_open":
+            return float("inf")
+        return max(0.0, self._opened_at + self.cooldown - now)
+
+
+class TokenBucket:
+    """Per-minute quota (Azure TPM/RPM) refilled continuously; spending may go into debt."""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60.0
+        self.tokens = self.capacity
+        self._updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def ready_in(self, cost: float, now: float) -> float:
+        self._refill(now)
+        needed = min(cost, self.capacity) - self.tokens
+        return max(0.0, needed / self.rate)
+
+    def spend(self, cost: float, now: float):
+        self._refill(now)
+        self.tokens -= cost
+
+
+class Endpoint:
+    def __init__(self, name: str, endpoint: str, api_key: str, api_version: str, chat_deployment=None,
+                 embedding_deployment=None, weight: float = 1.0, tpm=None, rpm=None):
+        self.name = name
+        self.endpoint = endpoint
+        self.api_key = api_key
+        self.api_version = api_version
+        self.chat_deployment = chat_deployment
+        self.embedding_deployment = embedding_deployment
+        self.weight = float(weight)
+        self.tokens = TokenBucket(tpm) if tpm else None
+        self.requests = TokenBucket(rpm) if rpm else None
+        self.breaker = CircuitBreaker()
+        self.throttled_until = 0.0
+        self.client = None
+        self.stats = {"requests": 0, "failures": 0, "throttled": 0, "hedges": 0, "latency_ms_total": 0.0}
+
+    def deployment(self, kind: str, requested: Optional[str]) -> Optional[str]:
+        configured = self.embedding_deployment if kind == "embeddings" else self.chat_deployment
+        return configured or requested
+
+    def ready_in(self, cost: float, now: float) -> float:
+        waits = [self.breaker.ready_in(now), max(0.0, self.throttled_until - now)]
+        if self.tokens is not None:
+            waits.append(self.tokens.ready_in(cost, now))
+        if self.requests is not None:
+            waits.append(self.requests.ready_in(1, now))
+        return max(waits)
+
+    def reserve(self, cost: float, now: float):
+        self.breaker.acquire(now)
+        if self.tokens is not None:
+            self.tokens.spend(cost, now)
+        if self.requests is not None:
+            self.requests.spend(1, now)
+
+    def settle(self, estimated: float, response):
+        """Charge the token bucket with the real usage once it is known."""
+        usage = getattr(response, "usage", None)
+        total = getattr(usage, "total_tokens", None)
+        if self.tokens is not None and total:
+            self.tokens.spend(total - estimated, time.monotonic())
+
+    def summary(self) -> Dict:
+        requests = self.stats["requests"]
+        return {
+            "name": self.name,
+            "weight": self.weight,
+            "breaker": self.breaker.state,
+            "breaker_opened": self.breaker.opened,
+            "throttled_for_s": round(max(0.0, self.throttled_until - time.monotonic()), 1),
+            "tokens_available": round(self.tokens.tokens) if self.tokens is not None else None,
+            **{key: value for key, value in self.stats.items() if key != "latency_ms_total"},
+            "avg_latency_ms": round(self.stats["latency_ms_total"] / requests, 1) if requests else None,
+        }
+
+
+def endpoints_from_env() -> List[Endpoint]:
+    api_version = os.getenv("AZURE_OPENAI_API_VERSION")
+    if not AZURE_OPENAI_ENDPOINTS:
+        endpoint = os.getenv("AZURE_OPENAI_ENDPOINT")
+        return [Endpoint(
+            name=urlparse(endpoint or "").hostname or "default", endpoint=endpoint,
+            api_key=os.getenv("AZURE_OPENAI_KEY"), api_version=api_version,
+            tpm=float(os.getenv("AZURE_OPENAI_TPM", "0")) or None,
+            rpm=float(os.getenv("AZURE_OPENAI_RPM", "0")) or None,
+        )]
+    endpoints = []
+    for i, config in enumerate(json.loads(AZURE_OPENAI_ENDPOINTS)):
+        endpoints.append(Endpoint(
+            name=config.get("name") or urlparse(config["endpoint"]).hostname or f"endpoint-{i}",
+            endpoint=config["endpoint"],
+            api_key=config.get("api_key") or os.getenv(config.get("api_key_env", ""), ""),
+            api_version=config.get("api_version", api_version),
+            chat_deployment=config.get("chat_deployment"),
+            embedding_deployment=config.get("embedding_deployment"),
+            weight=config.get("weight", 1.0),
+            tpm=config.get("tpm"),
+            rpm=config.get("rpm"),
+        ))
+    return endpoints
+
+
+def estimate_tokens(kind: str, request: Dict) -> int:
+    if kind == "embeddings":
+        inputs = request.get("input")
+        return sum(count_tokens(text) for text in ([inputs] if isinstance(inputs, str) else inputs or []))
+    prompt = sum(count_tokens(str(message.get("content") or "")) for message in request.get("messages", []))
+    return prompt + (request.get("max_tokens") or 0)
+
+
+class _EndpointStream:
+    """A streamed completion whose breaker verdict waits for the end of the stream.
+
+    Opening the stream only settles latency and quota: success is recorded
+    once the last chunk is read, and a connection drop or error event
+    halfway through counts as a failure of the endpoint. A stream the
+    caller closes or drops early (client disconnect) ends without a verdict.
+    """
+
+    def __init__(self, router, endpoint: "Endpoint", stream):
+        self._router = router
+        self._endpoint = endpoint
+        self._stream = stream
+
+    def __aiter__(self):
+        return self._chunks()
+
+    async def _chunks(self):
+        try:
+            async for chunk in self._stream:
+                yield chunk
+        except (APIError, httpx.TransportError) as e:
+            self._router._failed(self._endpoint, e)
+            raise
+        except BaseException:
+            self._router._released(self._endpoint)
+            raise
+        self._router._confirmed(self._endpoint)
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+
+class _Resource:
+    """Stands in for client.embeddings / client.chat.completions."""
+
+    def __init__(self, router, kind: str):
+        self._router = router
+        self._kind = kind
+
+    def create(self, **request):
+        return self._router.request(self._kind, request)
+
+
+class _RouterBase:
+    def __init__(self, endpoints: List[Endpoint], max_attempts: int = LLM_MAX_ATTEMPTS,
+                 max_queue_seconds: float = LLM_MAX_QUEUE_SECONDS):
+        if not endpoints:
+            raise ValueError("At least one Azure OpenAI endpoint is required")
+        self.endpoints = endpoints
+        self.max_attempts = max_attempts
+        self.max_queue_seconds = max_queue_seconds
+        self.embeddings = _Resource(self, "embeddings")
+        self.chat = SimpleNamespace(completions=_Resource(self, "chat"))
+        self._lock = threading.Lock()
+        # Tokenizing every prompt only pays off when some endpoint has a TPM bucket to charge
+        self._metered = any(endpoint.tokens is not None for endpoint in endpoints)
+
+    def _cost(self, kind: str, request: Dict) -> int:
+        return estimate_tokens(kind, request) if self._metered else 0
+
+    def _pick(self, cost: float, exclude=(), reuse: bool = True):
+        """Reserve a weighted-random ready endpoint; else (None, seconds until one is ready).
+
+        Endpoints in exclude are only reused when every endpoint was tried and reuse is set.
+        """
+        with self._lock:
+            now = time.monotonic()
+            candidates = [e for e in self.endpoints if e not in exclude] or (self.endpoints if reuse else [])
+            if not candidates:
+                return None, float("inf")
+            waits = [(e.ready_in(cost, now), e) for e in candidates]
+            ready = [e for wait, e in waits if wait == 0]
+            if not ready:
+                return None, min(wait for wait, _ in waits)
+            endpoint = random.choices(ready, weights=[e.weight for e in ready])[0]
+            endpoint.reserve(cost, now)
+            endpoint.stats["requests"] += 1
+            return endpoint, 0.0
+
+    def _unavailable(self, waited: float):
+        latency.increment("llm_unavailable")
+        return LLMUnavailableError(f"No Azure OpenAI endpoint available after waiting {waited:.1f}s")
+
+    def _failed(self, endpoint: Endpoint, error: Exception):
+        with self._lock:
+            now = time.monotonic()
+            endpoint.stats["failures"] += 1
+            if isinstance(error, RateLimitError):
+                # Quota, not health: stop routing here for a while without tripping the breaker
+                endpoint.stats["throttled"] += 1
+                endpoint.throttled_until = now + (retry_after_seconds(error) or LLM_THROTTLE_SECONDS)
+                endpoint.breaker.release()
+                latency.increment("llm_throttled")
+            else:
+                endpoint.breaker.record_failure(now)
+        logger.error(f"LLM endpoint {endpoint.name} failed: {type(error).__name__}: {error}")
+
+    def _succeeded(self, endpoint: Endpoint, started: float, estimated: float, response, confirm: bool = True):
+        with self._lock:
+            if confirm:
+                endpoint.breaker.record_success()
+            endpoint.stats["latency_ms_total"] += (time.perf_counter() - started) * 1000
+            endpoint.settle(estimated, response)
+
+    def _confirmed(self, endpoint: Endpoint):
+        with self._lock:
+            endpoint.breaker.record_success()
+
+    def _released(self, endpoint: Endpoint):
+        with self._lock:
+            endpoint.breaker.release()
+
+    def stats(self) -> Dict:
+        return {"endpoints": [endpoint.summary() for endpoint in self.endpoints]}
+
+
+class LLMRouter(_RouterBase):
+    """Blocking router over AzureOpenAI clients (ingest_qdrant.py). No hedging."""
+
+    def __init__(self, endpoints: List[Endpoint] = None, **kwargs):
+        super().__init__(endpoints or endpoints_from_env(), **kwargs)
+        for endpoint in self.endpoints:
+            endpoint.client = AzureOpenAI(
+                api_key=endpoint.api_key, api_version=endpoint.api_version, azure_endpoint=endpoint.endpoint,
+                timeout=LLM_REQUEST_TIMEOUT_SECONDS, max_retries=0,
+            )
+        self.models = SimpleNamespace(list=self._list_models)
+
+    def _list_models(self):
+        """Startup check: asks every endpoint, succeeds if any answers.
+
+        Endpoints that fail are recorded through _failed(), so the breaker
+        and throttling state route the first real requests around them.
+        """
+        answered, last_error = [], None
+        for endpoint in self.endpoints:
+            try:
+                answered.append(endpoint.client.models.list())
+            except Exception as e:
+                self._failed(endpoint, e)
+                last_error = e
+        if not answered:
+            raise last_error
+        return answered[0]
+
+    def request(self, kind: str, request: Dict):
+        cost = self._cost(kind, request)
+        tried, last_error, waited = [], None, 0.0
+        while len(tried) < self.max_attempts:
+            endpoint, wait = self._pick(cost, exclude=tried)
+            if endpoint is None:
+                if last_error is not None and waited + wait > self.max_queue_seconds:
+                    raise last_error
+                if waited + wait > self.max_queue_seconds:
+                    raise self._unavailable(waited)
+                time.sleep(wait)
+                waited += wait
+                continue
+            tried.append(endpoint)
+            if len(tried) > 1:
+                latency.increment("llm_failovers")
+            started = time.perf_counter()
+            try:
+                resource = endpoint.client.embeddings if kind == "embeddings" else endpoint.client.chat.completions
+                response = resource.create(**dict(request, model=endpoint.deployment(kind, request.get("model"))))
+            except RETRYABLE_ERRORS as e:
+                self._failed(endpoint, e)
+                last_error = e
+                continue
+            except BaseException:
+                self._released(endpoint)
+                raise
+            self._succeeded(endpoint, started, cost, response)
+            return response
+        raise last_error
+
+    def close(self):
+        for endpoint in self.endpoints:
+            endpoint.client.close()
+
+
+class AsyncLLMRouter(_RouterBase):
+    """Router over AsyncAzureOpenAI clients with optional hedging of non-streaming requests."""
+
+    def __init__(self, endpoints: List[Endpoint] = None, max_connections: int = 200,
+                 hedge_after_ms: float = LLM_HEDGE_AFTER_MS, **kwargs):
+        super().__init__(endpoints or endpoints_from_env(), **kwargs)
+        self.hedge_after = hedge_after_ms / 1000 if hedge_after_ms else None
+        for endpoint in self.endpoints:
+            endpoint.client = AsyncAzureOpenAI(
+                api_key=endpoint.api_key, api_version=endpoint.api_version, azure_endpoint=endpoint.endpoint,
+                timeout=LLM_REQUEST_TIMEOUT_SECONDS, max_retries=0,
+                http_client=DefaultAsyncHttpxClient(limits=httpx.Limits(
+                    max_connections=max_connections, max_keepalive_connections=max_connections,
+                )),
+            )
+
+    async def request(self, kind: str, request: Dict):
+        cost = self._cost(kind, request)
+        tried = []
+        if self.hedge_after is None or request.get("stream") or len(self.endpoints) < 2:
+            return await self._with_failover(kind, request, cost, tried)
+
+        primary = asyncio.ensure_future(self._with_failover(kind, request, cost, tried))
+        done, _ = await asyncio.wait({primary}, timeout=self.hedge_after)
+        if done:
+            return primary.result()
+        endpoint, _ = self._pick(cost, exclude=tried, reuse=False)
+        if endpoint is None:
+            return await primary
+        tried.append(endpoint)
+        endpoint.stats["hedges"] += 1
+        latency.increment("llm_hedges")
+        hedge = asyncio.ensure_future(self._attempt(endpoint, kind, request, cost))
+        pending = {primary, hedge}
+        error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            latency.increment("llm_hedge_wins")
+                        return task.result()
+                    error = error or task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def _with_failover(self, kind: str, request: Dict, cost: float, tried: list):
+        last_error, waited = None, 0.0
+        while len(tried) < self.max_attempts:
+            endpoint, wait = self._pick(cost, exclude=tried)
+            if endpoint is None:
+                if last_error is not None and waited + wait > self.max_queue_seconds:
+                    raise last_error
+                if waited + wait > self.max_queue_seconds:
+                    raise self._unavailable(waited)
+                await asyncio.sleep(wait)
+                waited += wait
+                continue
+            tried.append(endpoint)
+            if len(tried) > 1:
+                latency.increment("llm_failovers")
+            try:
+                return await self._attempt(endpoint, kind, request, cost)
+            except RETRYABLE_ERRORS as e:
+                last_error = e
+        raise last_error
+
+    async def _attempt(self, endpoint: Endpoint, kind: str, request: Dict, cost: float):
+        started = time.perf_counter()
+        try:
+            resource = endpoint.client.embeddings if kind == "embeddings" else endpoint.client.chat.completions
+            response = await resource.create(**dict(request, model=endpoint.deployment(kind, request.get("model"))))
+        except RETRYABLE_ERRORS as e:
+            self._failed(endpoint, e)
+            raise
+        except BaseException:
+            self._released(endpoint)
+            raise
+        if request.get("stream"):
+            self._succeeded(endpoint, started, cost, response, confirm=False)
+            return _EndpointStream(self, endpoint, response)
+        self._succeeded(endpoint, started, cost, response)
+        return response
+
+    async def close(self):
+        for endpoint in self.endpoints:
+            await endpoint.client.close()
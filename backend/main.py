@@ -1,18 +1,34 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from pydantic import BaseModel, Field
 from typing import List, Optional
 import uvicorn
 from datetime import datetime
 import logging
 import os
+import json
 import uuid
+import asyncio
+import hashlib
 
-from rag_qdrant import rag_pipeline, qdrant, openai_client, COLLECTION_NAME
-from database import TicketDatabase
-from followup_utils import is_follow_up_question, rewrite_follow_up_question
+from rag_qdrant import (
+    rag_pipeline, rag_pipeline_stream, rag_pipeline_batch, qdrant, openai_client, COLLECTION_NAME,
+    answer_cache, embedding_cache, refresh_cache_generation, scope_index,
+)
+from storage import create_store
+from followup_utils import resolve_follow_up
+from metrics import PROMETHEUS_CONTENT_TYPE, instrument_app, latency
+from events import create_broker
+from singleflight import SingleFlight
 
-db = TicketDatabase()
+db = create_store()
+events = create_broker()
+EVENTS_HEARTBEAT_SECONDS = float(os.getenv("EVENTS_HEARTBEAT_SECONDS", "15"))
+BATCH_MAX_QUERIES = int(os.getenv("BATCH_MAX_QUERIES", "500"))
+# Identical /search requests in flight at the same time share one pipeline run (per worker)
+SEARCH_COALESCING_ENABLED = os.getenv("SEARCH_COALESCING_ENABLED", "true").lower() == "true"
+search_flights = SingleFlight("search")
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -32,6 +48,7 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+instrument_app(app)
 
 class MessageHistory(BaseModel):
     role: str
@@ -43,6 +60,20 @@ class SearchRequest(BaseModel):
     similarity_threshold: Optional[float] = 0.7
     conversation_history: Optional[List[MessageHistory]] = Field(default_factory=list)
     conversation_id: Optional[str] = None
+    # Retrieval scope (payload filters); auto_scope=None follows SCOPE_AUTO_DETECT
+    categories: Optional[List[str]] = None
+    languages: Optional[List[str]] = None
+    auto_scope: Optional[bool] = None
+
+class BatchSearchItem(BaseModel):
+    query: str
+    id: Optional[str] = None
+
+class BatchSearchRequest(BaseModel):
+    queries: List[BatchSearchItem] = Field(..., min_length=1)
+    categories: Optional[List[str]] = None
+    languages: Optional[List[str]] = None
+    auto_scope: Optional[bool] = None
 
 class TicketInfo(BaseModel):
     ticket_id: str
@@ -105,15 +136,30 @@ async def startup_event():
         raise Exception("Azure OpenAI connection failed")
     
     try:
-        qdrant.get_collection(collection_name=COLLECTION_NAME)
+        await qdrant.get_collection(collection_name=COLLECTION_NAME)
         logger.info(f"Connected to Qdrant collection: {COLLECTION_NAME}")
+        await refresh_cache_generation(force=True)
+        await scope_index.refresh(qdrant, COLLECTION_NAME, force=True)
     except Exception as e:
         logger.error(f"Failed to connect to Qdrant: {e}")
         raise e
     
-    db.init_database()
-    db.sync_counters_with_data()
+    await db.init()
     logger.info("Database initialized")
+    
+    await events.start()
+    logger.info(f"Event stream ready ({type(events.backend).__name__})")
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    if openai_client is not None:
+        await openai_client.close()
+    if qdrant is not None:
+        await qdrant.close()
+    if embedding_cache is not None:
+        embedding_cache.close()
+    await events.stop()
+    await db.close()
 
 @app.get("/")
 async def root():
@@ -126,7 +172,7 @@ async def root():
 @app.get("/health")
 async def health_check():
     try:
-        qdrant.get_collection(collection_name=COLLECTION_NAME)
+        await qdrant.get_collection(collection_name=COLLECTION_NAME)
         qdrant_status = "connected"
     except Exception:
         qdrant_status = "disconnected"
@@ -143,44 +189,80 @@ async def health_check():
         }
     }
 
-@app.post("/search", response_model=SearchResponse)
-async def search_tickets(request: SearchRequest):
-    try:
-        logger.info(f"Processing search: {request.query[:50]}...")
-        
-        conversation_msgs = None
-        if request.conversation_history:
-            conversation_msgs = [
-                {"role": msg.role, "content": msg.content}
-                for msg in request.conversation_history
-            ]
-        
-        final_query = request.query
-        
-        is_followup = is_follow_up_question(
+async def resolve_search_query(request: SearchRequest):
+    """Returns (final_query, conversation_msgs, rewritten), rewriting follow-up questions as standalone."""
+    conversation_msgs = None
+    if request.conversation_history:
+        conversation_msgs = [
+            {"role": msg.role, "content": msg.content}
+            for msg in request.conversation_history
+        ]
+    
+    with latency.time("followup"):
+        is_followup, final_query = await resolve_follow_up(
             user_question=request.query,
             conversation_history=conversation_msgs or [],
             llm_client=openai_client
         )
 
-        if is_followup:
-            rewritten_query = rewrite_follow_up_question(
-                user_question=request.query,
-                conversation_history=conversation_msgs or [],
-                llm_client=openai_client
-            )
-            logger.info(f"[FOLLOW-UP] Rewritten: {rewritten_query}")
-            final_query = rewritten_query
+    rewritten = is_followup and final_query != request.query
+    if rewritten:
+        logger.info(f"[FOLLOW-UP] Rewritten: {final_query}")
+
+    return final_query, conversation_msgs, rewritten
+
+def request_scope(request) -> dict:
+    return {"categories": request.categories, "languages": request.languages, "auto": request.auto_scope}
+
+def to_ticket_sources(sources) -> List[TicketInfo]:
+    return [
+        TicketInfo(
+            ticket_id=str(source.get('ticket_id', 'N/A')),
+            score=float(source.get('score', 0.0))
+        )
+        for source in sources or []
+    ]
+
+def search_key(request: SearchRequest) -> str:
+    """Normalized query + history fingerprint + scope: requests with the same key get the same answer."""
+    def normalize(text):
+        return " ".join((text or "").lower().split())
+
+    fingerprint = json.dumps([
+        normalize(request.query),
+        [(msg.role, normalize(msg.content)) for msg in request.conversation_history or []],
+        sorted(normalize(value) for value in request.categories or []),
+        sorted(normalize(value) for value in request.languages or []),
+        request.auto_scope,
+    ])
+    return hashlib.blake2b(fingerprint.encode("utf-8"), digest_size=16).hexdigest()
 
-        answer, sources = rag_pipeline(final_query, conversation_history=conversation_msgs)
+async def run_search(request: SearchRequest):
+    """Follow-up resolution and the RAG pipeline; returns (final_query, rewritten, answer, sources).
+
+    Coalesced requests share the result but may differ from the leader in case
+    or whitespace, so callers report a rewrite from `rewritten`, not by
+    comparing final_query with their own query.
+    """
+    final_query, conversation_msgs, rewritten = await resolve_search_query(request)
+    answer, sources = await rag_pipeline(
+        final_query, conversation_history=conversation_msgs, scope=request_scope(request)
+    )
+    return final_query, rewritten, answer, sources
+
+@app.post("/search", response_model=SearchResponse)
+async def search_tickets(request: SearchRequest):
+    try:
+        logger.info(f"Processing search: {request.query[:50]}...")
         
-        ticket_sources = []
-        if sources:
-            for source in sources:
-                ticket_sources.append(TicketInfo(
-                    ticket_id=str(source.get('ticket_id', 'N/A')),
-                    score=float(source.get('score', 0.0))
-                ))
+        if SEARCH_COALESCING_ENABLED:
+            final_query, rewritten, answer, sources = await search_flights.run(
+                search_key(request), lambda: run_search(request)
+            )
+        else:
+            final_query, rewritten, answer, sources = await run_search(request)
+        
+        ticket_sources = to_ticket_sources(sources)
         
         conversation_id = request.conversation_id or str(uuid.uuid4())
         
@@ -188,7 +270,7 @@ async def search_tickets(request: SearchRequest):
             answer=answer,
             sources=ticket_sources,
             query=request.query,
-            rewritten_query=final_query if final_query != request.query else None,
+            rewritten_query=final_query if rewritten else None,
             total_sources=len(ticket_sources),
             conversation_id=conversation_id
         )
@@ -197,11 +279,108 @@ async def search_tickets(request: SearchRequest):
         logger.error(f"Search error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/search/stream")
+async def search_tickets_stream(request: SearchRequest):
+    """
+    Streaming variant of /search as newline-delimited JSON events:
+    one "sources" event as soon as retrieval finishes, "token" events with
+    answer deltas, then "done" with the full answer (or "error").
+    """
+    logger.info(f"Processing streaming search: {request.query[:50]}...")
+    conversation_id = request.conversation_id or str(uuid.uuid4())
+
+    async def events():
+        try:
+            final_query, conversation_msgs, rewritten = await resolve_search_query(request)
+            async for kind, value in rag_pipeline_stream(
+                final_query, conversation_history=conversation_msgs, scope=request_scope(request)
+            ):
+                if kind == "sources":
+                    ticket_sources = to_ticket_sources(value)
+                    event = {
+                        "type": "sources",
+                        "sources": [source.model_dump() for source in ticket_sources],
+                        "query": request.query,
+                        "rewritten_query": final_query if rewritten else None,
+                        "total_sources": len(ticket_sources),
+                        "conversation_id": conversation_id,
+                    }
+                elif kind == "token":
+                    event = {"type": "token", "content": value}
+                elif kind == "done":
+                    event = {"type": "done", "answer": value}
+                else:
+                    event = {"type": "error", "message": value}
+                yield json.dumps(event) + "\n"
+        except Exception as e:
+            logger.error(f"Streaming search error: {e}")
+            yield json.dumps({"type": "error", "message": str(e)}) + "\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.post("/search/batch")
+async def search_tickets_batch(request: BatchSearchRequest):
+    """
+    Answers many standalone queries (no conversation history) in one call.
+    Identical queries are answered once; results stream back as
+    newline-delimited JSON "result" events in completion order, each with
+    the item's index and id, followed by one "done" event.
+    """
+    if len(request.queries) > BATCH_MAX_QUERIES:
+        raise HTTPException(status_code=400, detail=f"At most {BATCH_MAX_QUERIES} queries per batch")
+
+    unique_queries = {}
+    items_by_query = []
+    for index, item in enumerate(request.queries):
+        key = " ".join(item.query.lower().split())
+        if key not in unique_queries:
+            unique_queries[key] = len(items_by_query)
+            items_by_query.append((item.query, []))
+        items_by_query[unique_queries[key]][1].append(index)
+    logger.info(f"Processing batch search: {len(request.queries)} queries, {len(items_by_query)} unique")
+
+    async def events():
+        try:
+            queries = [query for query, _ in items_by_query]
+            async for position, answer, sources in rag_pipeline_batch(queries, scope=request_scope(request)):
+                ticket_sources = [source.model_dump() for source in to_ticket_sources(sources)]
+                for index in items_by_query[position][1]:
+                    yield json.dumps({
+                        "type": "result",
+                        "index": index,
+                        "id": request.queries[index].id,
+                        "query": request.queries[index].query,
+                        "answer": answer,
+                        "sources": ticket_sources,
+                        "total_sources": len(ticket_sources),
+                    }) + "\n"
+            yield json.dumps({"type": "done", "total": len(request.queries), "unique": len(items_by_query)}) + "\n"
+        except Exception as e:
+            logger.error(f"Batch search error: {e}")
+            yield json.dumps({"type": "error", "message": str(e)}) + "\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+async def publish_ticket_event(event_type: str, stats_changed: bool = True, **data):
+    """Publishes a ticket event after its write committed; a failure here never fails the request."""
+    try:
+        if stats_changed:
+            data["stats"] = await get_admin_stats()
+        events.publish(event_type, **data)
+    except Exception as e:
+        logger.error(f"Event publish error: {e}")
+
 @app.post("/escalate", response_model=dict)
 async def escalate_ticket(request: EscalationRequest):
     try:
-        ticket_id = db.get_next_ticket_id()
-        
         conversation_history = []
         if request.conversation_history:
             conversation_history = [
@@ -209,18 +388,30 @@ async def escalate_ticket(request: EscalationRequest):
                 for msg in request.conversation_history
             ]
         
-        escalated_ticket = EscalatedTicket(
-            id=ticket_id,
-            user_query=request.user_query,
-            ai_answer=request.ai_answer,
-            user_feedback=request.user_feedback,
-            submitted_at=datetime.now().isoformat(),
-            conversation_history=conversation_history
-        )
-        
-        db.save_ticket(escalated_ticket.model_dump())
+        ticket = {
+            "user_query": request.user_query,
+            "ai_answer": request.ai_answer,
+            "user_feedback": request.user_feedback,
+            "status": "pending",
+            "submitted_at": datetime.now().isoformat(),
+            "conversation_history": conversation_history
+        }
+        ticket_id = await db.create_ticket(ticket)
         logger.info(f"Ticket escalated: {ticket_id}")
         
+        await publish_ticket_event(
+            "ticket_created",
+            ticket={
+                **ticket,
+                "id": ticket_id,
+                "resolved_at": None,
+                "resolved_by": None,
+                "admin_solution": None,
+                "comments": [],
+                "comment_count": 0
+            }
+        )
+        
         return {
             "message": "Ticket escalated successfully",
             "ticket_id": ticket_id,
@@ -232,60 +423,91 @@ async def escalate_ticket(request: EscalationRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/admin/tickets")
-async def get_escalated_tickets(status: Optional[str] = None):
+async def get_escalated_tickets(status: Optional[str] = None, include_comments: bool = True,
+                                include_history: bool = True):
     """
-    Get list of escalated tickets for admin review.
+    Get list of escalated tickets for admin review, newest first.
+    Pass include_comments=false / include_history=false to skip loading them.
     """
     try:
-        # Get tickets from database
-        all_tickets = db.get_tickets()
-        
-        if status:
-            filtered_tickets = [
-                ticket for ticket in all_tickets 
-                if ticket.get('status') == status
-            ]
-        else:
-            filtered_tickets = all_tickets
-        
-        # Sort by submission time (newest first)
-        filtered_tickets.sort(key=lambda x: x['submitted_at'], reverse=True)
+        tickets = await db.get_tickets(
+            status_filter=status,
+            include_comments=include_comments,
+            include_history=include_history
+        )
         
-        logger.info(f"Retrieved {len(filtered_tickets)} tickets with status filter: {status}")
-        return filtered_tickets
+        logger.info(f"Retrieved {len(tickets)} tickets with status filter: {status}")
+        return tickets
         
     except Exception as e:
         logger.error(f"Error retrieving escalated tickets: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to retrieve tickets: {str(e)}")
 
+@app.get("/admin/tickets/page")
+async def list_escalated_tickets(
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None,
+    status: Optional[str] = None,
+    submitted_from: Optional[str] = None,
+    submitted_to: Optional[str] = None,
+    author: Optional[str] = None,
+    fields: Optional[str] = None
+):
+    """
+    Keyset-paginated ticket listing, newest first. Pass the returned
+    next_cursor to get the following page; it is null on the last page.
+    `fields` is a comma-separated projection, e.g. "id,status,comment_count";
+    heavy fields (conversation_history, comments) are only loaded when listed.
+    """
+    field_list = [field.strip() for field in fields.split(",") if field.strip()] if fields else None
+    try:
+        tickets, next_cursor = await db.list_tickets(
+            limit=limit,
+            cursor=cursor,
+            status=status,
+            submitted_from=submitted_from,
+            submitted_to=submitted_to,
+            author=author,
+            fields=field_list
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error listing tickets: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to list tickets: {str(e)}")
+    
+    return {"tickets": tickets, "next_cursor": next_cursor, "count": len(tickets)}
+
 @app.post("/admin/resolve", response_model=dict)
 async def resolve_escalated_ticket(response: AdminResponse):
     try:
-        ticket = db.get_ticket(response.ticket_id)
+        ticket = await db.get_ticket(response.ticket_id)
         if not ticket:
             raise HTTPException(status_code=404, detail="Ticket not found")
         
-        comment_id = db.get_next_comment_id()
-        
-        resolution_comment = Comment(
-            id=comment_id,
-            author="admin",
-            author_name="Support Admin",
-            content=response.solution,
-            timestamp=datetime.now().isoformat(),
-            type="resolution"
-        )
-        
-        db.add_comment(response.ticket_id, resolution_comment.model_dump())
-        
-        db.update_ticket(ticket["id"], {
+        now = datetime.now().isoformat()
+        comment = {
+            "author": "admin",
+            "author_name": "Support Admin",
+            "content": response.solution,
+            "timestamp": now,
+            "type": "resolution"
+        }
+        ticket_updates = {
             "status": "resolved",
-            "resolved_at": datetime.now().isoformat(),
+            "resolved_at": now,
             "resolved_by": "admin",
             "admin_solution": response.solution
-        })
+        }
+        comment_id = await db.create_comment(response.ticket_id, comment, ticket_updates=ticket_updates)
         
         logger.info(f"Ticket {response.ticket_id} resolved")
+        await publish_ticket_event(
+            "ticket_resolved",
+            ticket_id=response.ticket_id,
+            comment={**comment, "id": comment_id, "ticket_id": response.ticket_id},
+            updates=ticket_updates
+        )
         
         return {
             "message": "Ticket resolved successfully",
@@ -302,32 +524,38 @@ async def resolve_escalated_ticket(response: AdminResponse):
 @app.post("/tickets/comment", response_model=dict)
 async def add_comment_to_ticket(request: AddCommentRequest):
     try:
-        ticket = db.get_ticket(request.ticket_id)
+        ticket = await db.get_ticket(request.ticket_id)
         if not ticket:
             raise HTTPException(status_code=404, detail="Ticket not found")
         
-        comment_id = db.get_next_comment_id()
-        
-        comment = Comment(
-            id=comment_id,
-            author=request.author,
-            author_name=request.author_name,
-            content=request.content,
-            timestamp=datetime.now().isoformat(),
-            type="resolution" if request.is_resolution else "comment"
-        )
-        
-        success = db.add_comment(request.ticket_id, comment.model_dump())
-        if not success:
-            raise HTTPException(status_code=500, detail="Failed to add comment")
-        
+        now = datetime.now().isoformat()
+        ticket_updates = None
         if request.is_resolution:
-            db.update_ticket(ticket["id"], {
+            ticket_updates = {
                 "status": "resolved",
-                "resolved_at": datetime.now().isoformat(),
+                "resolved_at": now,
                 "resolved_by": request.author,
                 "admin_solution": request.content if request.author == "admin" else None
-            })
+            }
+        
+        comment = {
+            "author": request.author,
+            "author_name": request.author_name,
+            "content": request.content,
+            "timestamp": now,
+            "type": "resolution" if request.is_resolution else "comment"
+        }
+        comment_id = await db.create_comment(request.ticket_id, comment, ticket_updates=ticket_updates)
+        if not comment_id:
+            raise HTTPException(status_code=500, detail="Failed to add comment")
+        
+        await publish_ticket_event(
+            "ticket_resolved" if request.is_resolution else "comment_added",
+            stats_changed=request.is_resolution,
+            ticket_id=request.ticket_id,
+            comment={**comment, "id": comment_id, "ticket_id": request.ticket_id},
+            updates=ticket_updates or {}
+        )
         
         return {
             "message": "Comment added successfully",
@@ -346,7 +574,7 @@ async def add_comment_to_ticket(request: AddCommentRequest):
 @app.get("/tickets/{ticket_id}")
 async def get_ticket_details(ticket_id: str):
     try:
-        ticket = db.get_ticket(ticket_id)
+        ticket = await db.get_ticket(ticket_id)
         if not ticket:
             raise HTTPException(status_code=404, detail="Ticket not found")
         return ticket
@@ -359,7 +587,7 @@ async def get_ticket_details(ticket_id: str):
 @app.get("/admin/stats")
 async def get_admin_stats():
     try:
-        analytics = db.get_analytics()
+        analytics = await db.get_analytics()
         total = analytics["total_escalated_tickets"]
         resolved = analytics["resolved_tickets"]
         
@@ -376,6 +604,77 @@ async def get_admin_stats():
         logger.error(f"Stats error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/events")
+async def ticket_event_stream(request: Request):
+    """
+    Server-sent events for dashboards: ticket_created, comment_added and
+    ticket_resolved (with the post-write stats), plus "resync" when a client
+    fell too far behind and must reload. Clients subscribe first, then load
+    /admin/tickets and /admin/stats once and apply events by ticket id.
+    """
+    subscription = events.subscribe()
+
+    async def stream():
+        try:
+            yield "retry: 3000\n\n"
+            yield f"data: {json.dumps({'type': 'ready'})}\n\n"
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(subscription.get(), timeout=EVENTS_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"data: {json.dumps(event)}\n\n"
+        finally:
+            events.unsubscribe(subscription)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.get("/admin/events/stats")
+async def get_event_stats():
+    return events.stats()
+
+@app.get("/admin/cache/stats")
+async def get_cache_stats():
+    return {
+        "answer_cache": {"enabled": True, **answer_cache.stats()} if answer_cache else {"enabled": False},
+        "embedding_cache": {"enabled": True, **embedding_cache.stats()} if embedding_cache else {"enabled": False},
+    }
+
+@app.post("/admin/cache/invalidate")
+async def invalidate_cache():
+    if answer_cache is None:
+        return {"enabled": False}
+    answer_cache.invalidate()
+    logger.info("Answer cache invalidated")
+    return {"enabled": True, "message": "Answer cache invalidated"}
+
+@app.get("/admin/search/coalescing")
+async def get_coalescing_stats():
+    """Executed vs coalesced /search requests on this worker since startup."""
+    return {"enabled": SEARCH_COALESCING_ENABLED, **search_flights.stats()}
+
+@app.get("/admin/llm/stats")
+async def get_llm_stats():
+    """Per-endpoint routing state: circuit breaker, throttling, quota and request counts."""
+    if openai_client is None:
+        return {"endpoints": []}
+    return openai_client.stats()
+
+@app.get("/admin/metrics/latency")
+async def get_latency_metrics():
+    """Per-stage latency percentiles (followup, embed, vector_search, completion) and counters."""
+    return latency.snapshot()
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    """Stage latency histograms and pipeline counters in Prometheus text format."""
+    return PlainTextResponse(latency.render_prometheus(), media_type=PROMETHEUS_CONTENT_TYPE)
+
 if __name__ == "__main__":
     port = int(os.getenv("PORT", 8000))
     uvicorn.run("main:app", host="0.0.0.0", port=port)
\ No newline at end of file
@@ -0,0 +1,49 @@
+import sys
+import asyncio
+import argparse
+
+from storage import DATABASE_URL, DB_BACKEND, DB_PATH, create_store
+
+
+async def run(args) -> int:
+    db = create_store(args.backend, db_path=args.db, database_url=args.database_url)
+    await db.init()
+    try:
+        if args.command == "backfill":
+            await db.rebuild_rollups()
+            print("✅ Analytics rollups rebuilt")
+            return 0
+
+        mismatches = await db.check_rollups()
+        if not mismatches:
+            print("✅ Analytics rollups are consistent")
+            return 0
+
+        print(f"⚠️ {len(mismatches)} rollup mismatches:")
+        for mismatch in mismatches:
+            print(f"   {mismatch['table']}[{mismatch['key']}].{mismatch['column']}: "
+                  f"expected {mismatch['expected']}, found {mismatch['actual']}")
+        if args.repair:
+            await db.rebuild_rollups()
+            print("✅ Analytics rollups rebuilt")
+            return 0
+        return 1
+    finally:
+        await db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain the materialized analytics rollups of the ticket store")
+    parser.add_argument("command", choices=["backfill", "check"],
+                        help="backfill: rebuild rollups from tickets/comments; check: report drift")
+    parser.add_argument("--backend", choices=["sqlite", "postgres"], default=DB_BACKEND,
+                        help="Ticket store (default: DB_BACKEND)")
+    parser.add_argument("--db", default=DB_PATH, help="Path to the SQLite database")
+    parser.add_argument("--database-url", default=DATABASE_URL, help="PostgreSQL DSN for --backend postgres")
+    parser.add_argument("--repair", action="store_true", help="With check: backfill when drift is found")
+    args = parser.parse_args()
+    return asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,188 @@
+import os
+import time
+import math
+import inspect
+import logging
+import functools
+import threading
+from collections import Counter, defaultdict, deque
+from contextlib import contextmanager, nullcontext
+from typing import Dict
+
+logger = logging.getLogger(__name__)
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+# Spans go to whatever tracer provider is configured, e.g. by running under
+# `opentelemetry-instrument` with the OTLP exporter settings in OTEL_* env vars
+OTEL_ENABLED = os.getenv("OTEL_ENABLED", "false").lower() == "true"
+METRICS_PREFIX = "itrs"
+HISTOGRAM_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+_NO_OP = nullcontext()
+
+
+def _load_tracer():
+    if not OTEL_ENABLED:
+        return None
+    try:
+        from opentelemetry import trace
+    except ImportError:
+        logger.error("OTEL_ENABLED=true requires opentelemetry-api: pip install opentelemetry-api")
+        return None
+    return trace.get_tracer("itrs")
+
+
+class LatencyRecorder:
+    """In-process per-stage latency samples and event counters.
+
+    Keeps the last `window` samples per stage, which is enough for
+    p50/p95/p99 over recent traffic without unbounded memory, plus
+    cumulative histogram buckets for Prometheus. Each timed stage is also
+    an OpenTelemetry span when a tracer is configured. With both disabled
+    time() and increment() return without doing any work.
+    """
+
+    def __init__(self, window: int = 2048, enabled: bool = METRICS_ENABLED, tracer=None):
+        self.enabled = enabled
+        self.tracer = tracer
+        self._lock = threading.Lock()
+        self._samples = defaultdict(lambda: deque(maxlen=window))
+        self._totals = Counter()
+        self._sums = defaultdict(float)
+        self._buckets = defaultdict(lambda: [0] * len(HISTOGRAM_BUCKETS))
+        self.counters = Counter()
+
+    @property
+    def active(self) -> bool:
+        return self.enabled or self.tracer is not None
+
+    def observe(self, stage: str, seconds: float):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._samples[stage].append(seconds)
+            self._totals[stage] += 1
+            self._sums[stage] += seconds
+            buckets = self._buckets[stage]
+            for i, bound in enumerate(HISTOGRAM_BUCKETS):
+                if seconds <= bound:
+                    buckets[i] += 1
+
+    def time(self, stage: str, **attributes):
+        if not self.active:
+            return _NO_OP
+        return self._timed(stage, attributes)
+
+    @contextmanager
+    def _timed(self, stage: str, attributes: Dict):
+        start = time.perf_counter()
+        try:
+            if self.tracer is None:
+                yield
+            else:
+                with self.tracer.start_as_current_span(stage, attributes=attributes or None):
+                    yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def increment(self, name: str, amount: int = 1):
+        if self.enabled:
+            with self._lock:
+                self.counters[name] += amount
+
+    def annotate(self, **attributes):
+        """Attach attributes (result counts, token counts) to the current span."""
+        if self.tracer is None:
+            return
+        from opentelemetry import trace
+        span = trace.get_current_span()
+        for key, value in attributes.items():
+            span.set_attribute(key, value)
+
+    def reset(self):
+        with self._lock:
+            self._samples.clear()
+            self._totals.clear()
+            self._sums.clear()
+            self._buckets.clear()
+            self.counters.clear()
+
+    def snapshot(self) -> Dict:
+        stages = {}
+        with self._lock:
+            for stage, samples in self._samples.items():
+                ordered = sorted(samples)
+                stages[stage] = {
+                    "count": self._totals[stage],
+                    "avg_ms": round(self._sums[stage] / self._totals[stage] * 1000, 2),
+                    "p50_ms": round(_percentile(ordered, 50) * 1000, 2),
+                    "p95_ms": round(_percentile(ordered, 95) * 1000, 2),
+                    "p99_ms": round(_percentile(ordered, 99) * 1000, 2),
+                }
+            counters = dict(self.counters)
+        return {"stages": stages, "counters": counters}
+
+    def render_prometheus(self) -> str:
+        """Prometheus text exposition of the stage histograms and counters."""
+        histogram = f"{METRICS_PREFIX}_stage_duration_seconds"
+        counter = f"{METRICS_PREFIX}_events_total"
+        lines = [
+            f"# HELP {histogram} Duration of RAG pipeline and database stages.",
+            f"# TYPE {histogram} histogram",
+        ]
+        with self._lock:
+            for stage in sorted(self._buckets):
+                for bound, count in zip(HISTOGRAM_BUCKETS, self._buckets[stage]):
+                    lines.append(f'{histogram}_bucket{{stage="{stage}",le="{bound}"}} {count}')
+                lines.append(f'{histogram}_bucket{{stage="{stage}",le="+Inf"}} {self._totals[stage]}')
+                lines.append(f'{histogram}_sum{{stage="{stage}"}} {self._sums[stage]:.6f}')
+                lines.append(f'{histogram}_count{{stage="{stage}"}} {self._totals[stage]}')
+            lines.append(f"# HELP {counter} Pipeline events: cache hits, result and token counts.")
+            lines.append(f"# TYPE {counter} counter")
+            for name in sorted(self.counters):
+                lines.append(f'{counter}{{event="{name}"}} {self.counters[name]}')
+        return "\n".join(lines) + "\n"
+
+
+def _percentile(ordered, pct: float) -> float:
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+latency = LatencyRecorder(tracer=_load_tracer())
+
+
+def timed(stage: str):
+    """Decorator form of latency.time() for sync and async functions."""
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                if not latency.active:
+                    return await func(*args, **kwargs)
+                with latency.time(stage):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not latency.active:
+                return func(*args, **kwargs)
+            with latency.time(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def instrument_app(app):
+    """Request spans for every endpoint when tracing is on and the FastAPI instrumentation is installed."""
+    if latency.tracer is None:
+        return
+    try:
+        from opentelemetry.instrumentation.fastapi import FastAPIInstrumentor
+    except ImportError:
+        logger.error("Request spans need opentelemetry-instrumentation-fastapi; only stage spans are recorded")
+        return
+    FastAPIInstrumentor.instrument_app(app)
@@ -1,17 +1,25 @@
 import os
-import html
-import tiktoken
+import asyncio
+import time
 import logging
 from dotenv import load_dotenv
-from openai import AzureOpenAI
-from qdrant_client import QdrantClient
 
+# Before the local imports: they read their settings from the environment at import time
 load_dotenv()
+
+from qdrant_client import AsyncQdrantClient, models
+from llm_client import AsyncLLMRouter
+from semantic_cache import SemanticCache
+from embedding_cache import EmbeddingCache
+from metrics import latency
+from lexical import LEXICAL_VECTOR_NAME, query_vector as lexical_query_vector
+from diversity import dense_vector, mmr_order
+from collection_profiles import get_profile, search_params
+from scope import SCOPE_AUTO_DETECT, SCOPE_MIN_RESULTS, ScopeIndex, scope_filter, scope_key
+from context_packing import PROMPT_RESERVE_TOKENS, cached_token_count, count_tokens, pack_context, solution_text
+
 logger = logging.getLogger(__name__)
 
-AZURE_OPENAI_KEY = os.getenv("AZURE_OPENAI_KEY")
-AZURE_OPENAI_ENDPOINT = os.getenv("AZURE_OPENAI_ENDPOINT")
-AZURE_OPENAI_API_VERSION = os.getenv("AZURE_OPENAI_API_VERSION")
 AZURE_OPENAI_CHAT_DEPLOYMENT = os.getenv("AZURE_OPENAI_CHAT_DEPLOYMENT")
 AZURE_OPENAI_EMBEDDING_DEPLOYMENT = os.getenv("AZURE_OPENAI_EMBEDDING_DEPLOYMENT")
 
@@ -19,29 +27,27 @@ QDRANT_URL = os.getenv("QDRANT_URL")
 QDRANT_API_KEY = os.getenv("QDRANT_API_KEY")
 COLLECTION_NAME = os.getenv("QDRANT_COLLECTION", "ticket_data_rag")
 
+# Upper bound on concurrent HTTP connections to Azure OpenAI per worker
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "200"))
+# Batch search: inputs per embeddings request and completions in flight per batch
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "256"))
+BATCH_COMPLETION_CONCURRENCY = int(os.getenv("BATCH_COMPLETION_CONCURRENCY", "16"))
+
+# Endpoints, failover, quotas and hedging: see llm_client.py (AZURE_OPENAI_ENDPOINTS, LLM_*)
 try:
-    openai_client = AzureOpenAI(
-        api_key=AZURE_OPENAI_KEY,
-        api_version=AZURE_OPENAI_API_VERSION,
-        azure_endpoint=AZURE_OPENAI_ENDPOINT,
-    )
-    try:
-        TOKENIZER = tiktoken.encoding_for_model("gpt-4")
-    except KeyError:
-        TOKENIZER = tiktoken.get_encoding("cl100k_base")
+    openai_client = AsyncLLMRouter(max_connections=LLM_MAX_CONNECTIONS)
 except Exception as e:
     openai_client = None
-    TOKENIZER = None
     logger.error(f"Azure OpenAI init error: {e}")
 
+# Collection availability is verified asynchronously in main.startup_event
 try:
-    qdrant = QdrantClient(
+    qdrant = AsyncQdrantClient(
         url=QDRANT_URL,
         api_key=QDRANT_API_KEY,
         prefer_grpc=False,
         timeout=60
     )
-    qdrant.get_collection(collection_name=COLLECTION_NAME)
 except Exception as e:
     qdrant = None
     logger.error(f"Qdrant init error: {e}")
@@ -53,29 +59,155 @@ MAX_SOLUTIONS_FOR_SYNTHESIS = 5
 MAX_SOLUTIONS_TO_DISPLAY = 3
 MIN_SOLUTION_TEXT_LENGTH = 20
 
-def count_tokens(text: str) -> int:
-    if TOKENIZER is None:
-        return len(text.split())
-    return len(TOKENIZER.encode(text))
+# dense: embeddings only; sparse: BM25 lexical vector only; hybrid: both, fused with RRF
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "dense").lower()
+RRF_K = int(os.getenv("RRF_K", "60"))
+# Minimum BM25 score for a lexical hit; about one distinctive term, so single stopword-like matches drop out
+LEXICAL_SCORE_THRESHOLD = float(os.getenv("LEXICAL_SCORE_THRESHOLD", "1.0"))
+
+# Must match the profile ingest_qdrant.py built the collection with
+SEARCH_PARAMS = search_params(get_profile())
+
+# exact: drop identical texts only; mmr: also collapse near-duplicates by vector and diversify (MMR)
+DEDUP_MODE = os.getenv("DEDUP_MODE", "mmr").lower()
+MMR_LAMBDA = float(os.getenv("MMR_LAMBDA", "0.7"))
+NEAR_DUPLICATE_THRESHOLD = float(os.getenv("NEAR_DUPLICATE_THRESHOLD", "0.95"))
+
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "true").lower() == "true"
+SEMANTIC_CACHE_MAX_DISTANCE = float(os.getenv("SEMANTIC_CACHE_MAX_DISTANCE", "0.05"))
+SEMANTIC_CACHE_TTL_SECONDS = float(os.getenv("SEMANTIC_CACHE_TTL_SECONDS", "3600"))
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "2000"))
+SEMANTIC_CACHE_MAX_MB = float(os.getenv("SEMANTIC_CACHE_MAX_MB", "64"))
+# How often to poll the collection's ingest_version metadata for re-ingests
+SEMANTIC_CACHE_GENERATION_CHECK_SECONDS = float(os.getenv("SEMANTIC_CACHE_GENERATION_CHECK_SECONDS", "60"))
+
+EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() == "true"
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "embedding_cache.db")
+EMBEDDING_CACHE_MEMORY_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MEMORY_ENTRIES", "10000"))
+
+try:
+    embedding_cache = EmbeddingCache(
+        db_path=EMBEDDING_CACHE_PATH,
+        model=AZURE_OPENAI_EMBEDDING_DEPLOYMENT,
+        max_memory_entries=EMBEDDING_CACHE_MEMORY_ENTRIES,
+    ) if EMBEDDING_CACHE_ENABLED else None
+except Exception as e:
+    embedding_cache = None
+    logger.error(f"Embedding cache init error: {e}")
 
-def embed_text(text: str):
+answer_cache = SemanticCache(
+    max_distance=SEMANTIC_CACHE_MAX_DISTANCE,
+    ttl_seconds=SEMANTIC_CACHE_TTL_SECONDS,
+    max_entries=SEMANTIC_CACHE_MAX_ENTRIES,
+    max_bytes=int(SEMANTIC_CACHE_MAX_MB * 1024 * 1024),
+) if SEMANTIC_CACHE_ENABLED else None
+_generation_checked_at = 0.0
+scope_index = ScopeIndex()
+
+def _record_usage(prefix: str, usage):
+    """Token counts from an OpenAI response as counters and span attributes."""
+    if usage is None:
+        return
+    for field in ("prompt_tokens", "completion_tokens"):
+        value = getattr(usage, field, None)
+        if value:
+            latency.increment(f"{prefix}_{field}", value)
+            latency.annotate(**{f"llm.{field}": value})
+
+async def embed_text(text: str):
     if not text or openai_client is None:
         return []
+    # The cache is SQLite-backed (reads, commits under a lock), so it runs off the event loop
+    if embedding_cache is not None:
+        cached = await asyncio.to_thread(embedding_cache.get, text)
+        if cached is not None:
+            latency.increment("embedding_cache_hits")
+            return cached
+        latency.increment("embedding_cache_misses")
     try:
-        response = openai_client.embeddings.create(
+        response = await openai_client.embeddings.create(
             model=AZURE_OPENAI_EMBEDDING_DEPLOYMENT,
             input=text
         )
-        return response.data[0].embedding
+        _record_usage("embedding", response.usage)
+        embedding = response.data[0].embedding
+        if embedding_cache is not None:
+            await asyncio.to_thread(embedding_cache.put, text, embedding)
+        return embedding
     except Exception as e:
         logger.error(f"Embedding error: {e}")
         return []
 
+async def embed_texts(texts):
+    """Embeddings for many texts: cache hits first, the rest in EMBED_BATCH_SIZE-input requests.
+
+    Returns one embedding per text, [] where embedding failed.
+    """
+    embeddings = [None] * len(texts)
+    missing = []
+    cached_embeddings = [None] * len(texts)
+    if embedding_cache is not None:
+        lookups = [i for i, text in enumerate(texts) if text]
+        found = await asyncio.to_thread(embedding_cache.get_many, [texts[i] for i in lookups])
+        for i, cached in zip(lookups, found):
+            cached_embeddings[i] = cached
+    for i, text in enumerate(texts):
+        cached = cached_embeddings[i]
+        if cached is not None:
+            latency.increment("embedding_cache_hits")
+            embeddings[i] = cached
+        elif text:
+            missing.append(i)
+    if embedding_cache is not None:
+        latency.increment("embedding_cache_misses", len(missing))
+
+    async def embed_chunk(indexes):
+        response = await openai_client.embeddings.create(
+            model=AZURE_OPENAI_EMBEDDING_DEPLOYMENT,
+            input=[texts[i] for i in indexes]
+        )
+        _record_usage("embedding", response.usage)
+        for item in response.data:
+            embeddings[indexes[item.index]] = item.embedding
+        if embedding_cache is not None:
+            await asyncio.to_thread(embedding_cache.put_many, [texts[indexes[item.index]] for item in response.data],
+                                    [item.embedding for item in response.data])
+
+    if missing and openai_client is not None:
+        chunks = [missing[start:start + EMBED_BATCH_SIZE] for start in range(0, len(missing), EMBED_BATCH_SIZE)]
+        outcomes = await asyncio.gather(*(embed_chunk(chunk) for chunk in chunks), return_exceptions=True)
+        for outcome in outcomes:
+            if isinstance(outcome, Exception):
+                logger.error(f"Batch embedding error: {outcome}")
+    return [embedding or [] for embedding in embeddings]
+
+async def refresh_cache_generation(force: bool = False):
+    """Invalidate the answer cache if ingest has stamped a new collection version."""
+    global _generation_checked_at
+    if answer_cache is None or qdrant is None:
+        return
+    now = time.monotonic()
+    if not force and now - _generation_checked_at < SEMANTIC_CACHE_GENERATION_CHECK_SECONDS:
+        return
+    _generation_checked_at = now
+    try:
+        info = await qdrant.get_collection(collection_name=COLLECTION_NAME)
+        metadata = info.config.metadata or {}
+        answer_cache.set_generation(metadata.get("ingest_version"))
+    except Exception as e:
+        logger.error(f"Cache generation check error: {e}")
+
+def _is_cacheable(conversation_history) -> bool:
+    # Answers only depend on the query for the first question of a conversation
+    if not conversation_history:
+        return True
+    return sum(1 for msg in conversation_history if msg.get("role") == "user") <= 1
+
 def get_unique_and_filtered_solutions(results, min_chars=MIN_SOLUTION_TEXT_LENGTH):
     unique_solutions_map = {}
+    vectors = {}
     for r in results:
-        text = r.payload.get("resolution_text") or r.payload.get("problem_text") or ""
-        text = html.unescape(text).strip()
+        text = solution_text(r.payload)
 
         if not text or len(text) < min_chars:
             continue
@@ -86,20 +218,205 @@ def get_unique_and_filtered_solutions(results, min_chars=MIN_SOLUTION_TEXT_LENGT
             unique_solutions_map[normalized_text] = {
                 "text": text,
                 "source_id": r.payload.get("ticket_id", "N/A"),
-                "score": r.score
+                "score": r.score,
+                # Ordering key: the RRF value in hybrid mode, where dense and BM25 scores don't compare
+                "fused_score": getattr(r, "fused_score", r.score),
+                "tokens": cached_token_count(r.payload),
             }
-    
-    return sorted(unique_solutions_map.values(), key=lambda x: x["score"], reverse=True)
+            vectors[normalized_text] = dense_vector(r.vector)
+
+    ranked = sorted(unique_solutions_map.items(), key=lambda item: item[1]["fused_score"], reverse=True)
+    if DEDUP_MODE != "mmr" or len(ranked) < 2:
+        return [solution for _, solution in ranked]
+
+    order = mmr_order(
+        [solution["fused_score"] for _, solution in ranked],
+        [vectors[key] for key, _ in ranked],
+        MMR_LAMBDA,
+        NEAR_DUPLICATE_THRESHOLD,
+    )
+    latency.increment("near_duplicates_collapsed", len(ranked) - len(order))
+    return [ranked[i][1] for i in order]
+
+async def _dense_search(query_vector, limit: int, query_filter=None):
+    with latency.time("vector_search"):
+        response = await qdrant.query_points(
+            collection_name=COLLECTION_NAME,
+            query=query_vector,
+            query_filter=query_filter,
+            limit=limit,
+            with_payload=True,
+            with_vectors=DEDUP_MODE == "mmr",
+            score_threshold=SIMILARITY_THRESHOLD,
+            search_params=SEARCH_PARAMS,
+        )
+    return response.points
 
-def rag_pipeline(query: str, conversation_history=None):
+async def _lexical_search(text: str, limit: int, query_filter=None):
+    indices, values = lexical_query_vector(text)
+    if not indices:
+        return []
+    try:
+        with latency.time("lexical_search"):
+            response = await qdrant.query_points(
+                collection_name=COLLECTION_NAME,
+                query=models.SparseVector(indices=indices, values=values),
+                using=LEXICAL_VECTOR_NAME,
+                query_filter=query_filter,
+                limit=limit,
+                with_payload=True,
+                with_vectors=[""] if DEDUP_MODE == "mmr" else False,
+                score_threshold=LEXICAL_SCORE_THRESHOLD or None,
+            )
+        return response.points
+    except Exception as e:
+        # Collections ingested before the lexical index existed: degrade to dense
+        logger.error(f"Lexical query error: {e}")
+        return []
+
+def reciprocal_rank_fusion(result_lists, k: int = RRF_K):
+    """Merge ranked point lists by sum of 1 / (k + rank).
+
+    Points keep the score of the first list they appear in (dense before
+    lexical); the fused value is added as `fused_score` and sets the order.
+    """
+    fused = {}
+    for points in result_lists:
+        for rank, point in enumerate(points):
+            entry = fused.setdefault(point.id, [point, 0.0])
+            entry[1] += 1.0 / (k + rank + 1)
+    ranked = sorted(fused.values(), key=lambda entry: entry[1], reverse=True)
+    return [point.model_copy(update={"fused_score": fused_score}) for point, fused_score in ranked]
+
+async def search_candidates(query_vector, search_text: str, mode: str = None, limit: int = None,
+                            query_filter=None):
+    """Candidate points for a query under the given retrieval mode (RETRIEVAL_MODE by default)."""
+    mode = mode or RETRIEVAL_MODE
+    limit = limit or MAX_SOLUTIONS_FOR_SYNTHESIS * 3
+    if mode == "sparse":
+        return await _lexical_search(search_text, limit, query_filter)
+    if mode != "hybrid":
+        return await _dense_search(query_vector, limit, query_filter)
+    dense, lexical = await asyncio.gather(
+        _dense_search(query_vector, limit, query_filter),
+        _lexical_search(search_text, limit, query_filter),
+    )
+    return reciprocal_rank_fusion([dense, lexical])[:limit]
+
+async def _dense_search_batch(query_vectors, limit: int, filters):
+    with latency.time("vector_search_batch", queries=len(query_vectors)):
+        responses = await qdrant.query_batch_points(
+            collection_name=COLLECTION_NAME,
+            requests=[
+                models.QueryRequest(
+                    query=vector,
+                    filter=query_filter,
+                    limit=limit,
+                    with_payload=True,
+                    with_vector=DEDUP_MODE == "mmr",
+                    score_threshold=SIMILARITY_THRESHOLD,
+                    params=SEARCH_PARAMS,
+                )
+                for vector, query_filter in zip(query_vectors, filters)
+            ],
+        )
+    return [response.points for response in responses]
+
+async def _lexical_search_batch(texts, limit: int, filters):
+    sparse = [lexical_query_vector(text) for text in texts]
+    searchable = [i for i, (indices, _) in enumerate(sparse) if indices]
+    results = [[] for _ in texts]
+    if not searchable:
+        return results
+    try:
+        with latency.time("lexical_search_batch", queries=len(searchable)):
+            responses = await qdrant.query_batch_points(
+                collection_name=COLLECTION_NAME,
+                requests=[
+                    models.QueryRequest(
+                        query=models.SparseVector(indices=sparse[i][0], values=sparse[i][1]),
+                        using=LEXICAL_VECTOR_NAME,
+                        filter=filters[i],
+                        limit=limit,
+                        with_payload=True,
+                        with_vector=[""] if DEDUP_MODE == "mmr" else False,
+                        score_threshold=LEXICAL_SCORE_THRESHOLD or None,
+                    )
+                    for i in searchable
+                ],
+            )
+    except Exception as e:
+        logger.error(f"Lexical batch query error: {e}")
+        return results
+    for i, response in zip(searchable, responses):
+        results[i] = response.points
+    return results
+
+async def search_candidates_batch(query_vectors, search_texts, mode: str = None, limit: int = None,
+                                  filters=None):
+    """search_candidates for many queries with one Qdrant batch request per index."""
+    mode = mode or RETRIEVAL_MODE
+    limit = limit or MAX_SOLUTIONS_FOR_SYNTHESIS * 3
+    filters = filters or [None] * len(query_vectors)
+    if mode == "sparse":
+        return await _lexical_search_batch(search_texts, limit, filters)
+    if mode != "hybrid":
+        return await _dense_search_batch(query_vectors, limit, filters)
+    dense, lexical = await asyncio.gather(
+        _dense_search_batch(query_vectors, limit, filters),
+        _lexical_search_batch(search_texts, limit, filters),
+    )
+    return [reciprocal_rank_fusion(pair)[:limit] for pair in zip(dense, lexical)]
+
+def _final(answer: str, sources=None) -> dict:
+    return {"answer": answer, "sources": sources or [], "messages": None, "query_vector": None, "use_cache": False,
+            "cache_scope": None}
+
+def _validate_query(query: str):
     if not query:
-        return "Please provide a query to search for solutions.", []
+        return _final("Please provide a query to search for solutions.")
 
     if openai_client is None or qdrant is None:
-        return "System not fully initialized. Please check environment variables.", []
+        return _final("System not fully initialized. Please check environment variables.")
 
     if len(query.split()) < MIN_QUERY_WORDS:
-        return "Your query is too short. Please provide more details for accurate suggestions.", []
+        return _final("Your query is too short. Please provide more details for accurate suggestions.")
+    return None
+
+async def resolve_scope(text: str, scope=None):
+    """(explicit, detected) category/language scopes for a query; scope holds the request's
+    "categories", "languages" and "auto" (see scope.ScopeIndex.resolve)."""
+    scope = scope or {}
+    if not (scope.get("categories") or scope.get("languages") or scope.get("auto") or
+            (SCOPE_AUTO_DETECT and scope.get("auto") is None)):
+        return {}, {}
+    await scope_index.refresh(qdrant, COLLECTION_NAME)
+    explicit, detected = scope_index.resolve(text, scope.get("categories"), scope.get("languages"), scope.get("auto"))
+    if explicit or detected:
+        latency.increment("scoped_searches")
+        latency.annotate(**{f"scope.{field}": ",".join(values) for field, values in {**explicit, **detected}.items()})
+    if detected:
+        latency.increment("scope_detected")
+    return explicit, detected
+
+async def search_scoped(query_vector, search_text: str, explicit, detected):
+    """search_candidates under the scope; an auto-detected scope that finds too little is dropped."""
+    results = await search_candidates(query_vector, search_text, query_filter=scope_filter({**explicit, **detected}))
+    if detected and len(results) < SCOPE_MIN_RESULTS:
+        latency.increment("scope_fallbacks")
+        results = await search_candidates(query_vector, search_text, query_filter=scope_filter(explicit))
+    return results
+
+async def retrieve_context(query: str, conversation_history=None, scope=None) -> dict:
+    """Everything up to the completion call: validation, retrieval and prompt building.
+
+    Returns a dict with either a final "answer" (validation errors, empty
+    retrieval, answer-cache hits) or the chat "messages" to send to the model.
+    scope optionally restricts retrieval by category/language (resolve_scope).
+    """
+    invalid = _validate_query(query)
+    if invalid:
+        return invalid
 
     search_query = query
     if conversation_history and len(conversation_history) > 0:
@@ -109,49 +426,52 @@ def rag_pipeline(query: str, conversation_history=None):
             if recent_context:
                 search_query = recent_context
     
-    query_vector = embed_text(search_query)
+    with latency.time("embed"):
+        query_vector = await embed_text(search_query)
     if not query_vector:
-        return "Could not generate embeddings for the query. Please try again.", []
+        return _final("Could not generate embeddings for the query. Please try again.")
+
+    explicit, detected = await resolve_scope(search_query, scope)
+    cache_scope = scope_key({**explicit, **detected})
+    use_cache = answer_cache is not None and _is_cacheable(conversation_history)
+    if use_cache:
+        await refresh_cache_generation()
+        cached = answer_cache.get(query_vector, cache_scope)
+        latency.increment("answer_cache_hits" if cached else "answer_cache_misses")
+        if cached:
+            return _final(cached[0], cached[1])
 
     try:
-        response = qdrant.query_points(
-            collection_name=COLLECTION_NAME,
-            query=query_vector,
-            limit=MAX_SOLUTIONS_FOR_SYNTHESIS * 3,
-            with_payload=True,
-            score_threshold=SIMILARITY_THRESHOLD,
-        )
-        results = response.points
+        results = await search_scoped(query_vector, search_query, explicit, detected)
     except Exception as e:
         logger.error(f"Qdrant query error: {e}")
-        return "An error occurred while searching for solutions. Please try again.", []
+        return _final("An error occurred while searching for solutions. Please try again.")
 
-    retrieved_solutions_data = get_unique_and_filtered_solutions(results)
+    return build_context(query, conversation_history, query_vector, results, use_cache, cache_scope)
 
-    if not retrieved_solutions_data:
-        return "I don't have any relevant solutions for this query. Please try a different query or raise a new ticket.", []
-
-    selected_solutions = retrieved_solutions_data[:MAX_SOLUTIONS_FOR_SYNTHESIS]
-
-    combined_context = ""
-    source_info_list = []
-    current_token_count = 0
+def build_context(query: str, conversation_history, query_vector, results, use_cache: bool,
+                  cache_scope=None) -> dict:
+    """Dedupe, pack and build the chat messages for retrieved candidate points."""
+    latency.increment("search_candidates", len(results))
+    with latency.time("dedupe", candidates=len(results)):
+        retrieved_solutions_data = get_unique_and_filtered_solutions(results)
+    latency.increment("search_solutions", len(retrieved_solutions_data))
 
-    for i, sol_data in enumerate(selected_solutions):
-        solution_text = sol_data["text"]
-        estimated_tokens = count_tokens(solution_text)
-
-        if current_token_count + estimated_tokens + count_tokens(query) + 500 > MAX_CONTEXT_TOKENS:
-            break
+    if not retrieved_solutions_data:
+        return _final("I don't have any relevant solutions for this query. Please try a different query or raise a new ticket.")
 
-        combined_context += f"<solution_{i+1}>\n{solution_text}\n</solution_{i+1}>\n\n"
-        source_info_list.append({"number": i+1, "ticket_id": sol_data["source_id"], "score": sol_data["score"]})
-        current_token_count += estimated_tokens
+    with latency.time("pack_context"):
+        budget = MAX_CONTEXT_TOKENS - count_tokens(query) - PROMPT_RESERVE_TOKENS
+        combined_context, source_info_list, current_token_count = pack_context(
+            retrieved_solutions_data, budget, MAX_SOLUTIONS_FOR_SYNTHESIS
+        )
+        latency.increment("context_tokens", current_token_count)
+        latency.annotate(context_tokens=current_token_count, solutions=len(source_info_list))
 
     final_sources = source_info_list[:MAX_SOLUTIONS_TO_DISPLAY]
 
     if not combined_context:
-        return "I found some potential matches, but they were not suitable. Please try a different query.", []
+        return _final("I found some potential matches, but they were not suitable. Please try a different query.")
 
     system_prompt = (
         "You are an expert support assistant. "
@@ -173,14 +493,159 @@ def rag_pipeline(query: str, conversation_history=None):
     user_prompt = f"User Query: {query}\n\nAvailable Solutions:\n{combined_context}\n\nPlease provide a helpful response."
     messages.append({"role": "user", "content": user_prompt})
 
+    return {
+        "answer": None,
+        "sources": final_sources,
+        "messages": messages,
+        "query_vector": query_vector,
+        "use_cache": use_cache,
+        "cache_scope": cache_scope,
+    }
+
+async def rag_pipeline(query: str, conversation_history=None, scope=None):
+    context = await retrieve_context(query, conversation_history, scope)
+    return await complete_context(context)
+
+async def complete_context(context: dict):
+    """Returns (answer, sources) for a retrieve_context/build_context result."""
+    if context["answer"] is not None:
+        return context["answer"], context["sources"]
+
+    try:
+        with latency.time("completion"):
+            completion = await openai_client.chat.completions.create(
+                model=AZURE_OPENAI_CHAT_DEPLOYMENT,
+                messages=context["messages"],
+                temperature=0.3,
+                max_tokens=800
+            )
+            _record_usage("llm", completion.usage)
+        answer = completion.choices[0].message.content.strip()
+        if context["use_cache"]:
+            answer_cache.put(context["query_vector"], answer, context["sources"], context["cache_scope"])
+        return answer, context["sources"]
+    except Exception as e:
+        logger.error(f"LLM completion error: {e}")
+        return "An error occurred while generating the answer. Please try again.", []
+
+async def rag_pipeline_stream(query: str, conversation_history=None, scope=None):
+    """Streaming variant of rag_pipeline.
+
+    Yields ("sources", list) as soon as retrieval finishes, then ("token", str)
+    for each completion delta, then ("done", answer). Errors after the sources
+    were sent are reported as ("error", message).
+    """
+    context = await retrieve_context(query, conversation_history, scope)
+    yield "sources", context["sources"]
+    if context["answer"] is not None:
+        yield "token", context["answer"]
+        yield "done", context["answer"]
+        return
+
+    parts = []
+    started = time.perf_counter()
     try:
-        completion = openai_client.chat.completions.create(
+        stream = await openai_client.chat.completions.create(
             model=AZURE_OPENAI_CHAT_DEPLOYMENT,
-            messages=messages,
+            messages=context["messages"],
             temperature=0.3,
-            max_tokens=800
+            max_tokens=800,
+            stream=True
         )
-        return completion.choices[0].message.content.strip(), final_sources
+        async for chunk in stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                if not parts:
+                    latency.observe("completion_first_token", time.perf_counter() - started)
+                parts.append(delta)
+                yield "token", delta
     except Exception as e:
-        logger.error(f"LLM completion error: {e}")
-        return "An error occurred while generating the answer. Please try again.", []
+        logger.error(f"LLM streaming error: {e}")
+        yield "error", "An error occurred while generating the answer. Please try again."
+        return
+
+    latency.observe("completion", time.perf_counter() - started)
+    answer = "".join(parts).strip()
+    if context["use_cache"] and answer:
+        answer_cache.put(context["query_vector"], answer, context["sources"], context["cache_scope"])
+    yield "done", answer
+
+async def rag_pipeline_batch(queries, concurrency: int = BATCH_COMPLETION_CONCURRENCY, scope=None):
+    """Answer many standalone queries, yielding (index, answer, sources) as each finishes.
+
+    All queries are embedded together and searched with one Qdrant batch
+    request; completions run with at most `concurrency` in flight.
+    scope applies to every query; auto-detection runs per query.
+    Callers should pass distinct queries.
+    """
+    contexts = {}
+    pending = []
+    for i, query in enumerate(queries):
+        invalid = _validate_query(query)
+        if invalid:
+            contexts[i] = invalid
+        else:
+            pending.append(i)
+
+    if pending:
+        with latency.time("embed_batch", queries=len(pending)):
+            vectors = await embed_texts([queries[i] for i in pending])
+        searchable = []
+        use_cache = answer_cache is not None
+        if use_cache:
+            await refresh_cache_generation()
+        for i, vector in zip(pending, vectors):
+            if not vector:
+                contexts[i] = _final("Could not generate embeddings for the query. Please try again.")
+                continue
+            explicit, detected = await resolve_scope(queries[i], scope)
+            cache_scope = scope_key({**explicit, **detected})
+            cached = answer_cache.get(vector, cache_scope) if use_cache else None
+            if use_cache:
+                latency.increment("answer_cache_hits" if cached else "answer_cache_misses")
+            if cached:
+                contexts[i] = _final(cached[0], cached[1])
+            else:
+                searchable.append((i, vector, explicit, detected, cache_scope))
+
+        if searchable:
+            try:
+                results = await search_candidates_batch(
+                    [vector for _, vector, *_ in searchable], [queries[i] for i, *_ in searchable],
+                    filters=[scope_filter({**explicit, **detected}) for _, _, explicit, detected, _ in searchable],
+                )
+                # Auto-detected scopes that found too little are searched again without them
+                retry = [n for n, (_, _, _, detected, _) in enumerate(searchable)
+                         if detected and len(results[n]) < SCOPE_MIN_RESULTS]
+                if retry:
+                    latency.increment("scope_fallbacks", len(retry))
+                    retried = await search_candidates_batch(
+                        [searchable[n][1] for n in retry], [queries[searchable[n][0]] for n in retry],
+                        filters=[scope_filter(searchable[n][2]) for n in retry],
+                    )
+                    for n, points in zip(retry, retried):
+                        results[n] = points
+            except Exception as e:
+                logger.error(f"Qdrant batch query error: {e}")
+                results = None
+            for n, (i, vector, _, _, cache_scope) in enumerate(searchable):
+                if results is None:
+                    contexts[i] = _final("An error occurred while searching for solutions. Please try again.")
+                else:
+                    contexts[i] = build_context(queries[i], None, vector, results[n], use_cache, cache_scope)
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def answer(i):
+        async with semaphore:
+            return (i, *await complete_context(contexts[i]))
+
+    tasks = [asyncio.ensure_future(answer(i)) for i in range(len(queries))]
+    try:
+        for finished in asyncio.as_completed(tasks):
+            yield await finished
+    finally:
+        for task in tasks:
+            task.cancel()
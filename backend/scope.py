@@ -0,0 +1,208 @@
+import os
+import re
+import math
+import time
+import logging
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from qdrant_client import models
+
+from lexical import tokenize
+
+logger = logging.getLogger(__name__)
+
+# Category/language scope for retrieval. Scopes become Qdrant payload filters
+# on the keyword-indexed "category" and "language" fields (see
+# collection_profiles.PAYLOAD_INDEXES), so the vector search only visits
+# matching points. Callers pass scopes explicitly; optionally the scope is
+# detected from the query text: language from function words, category with
+# a naive Bayes model fitted on a sample of the indexed tickets.
+SCOPE_FIELDS = ("category", "language")
+# Fields to detect when a request doesn't pass a scope: "", "language", "category" or "language,category"
+SCOPE_AUTO_DETECT = {f.strip() for f in os.getenv("SCOPE_AUTO_DETECT", "").lower().split(",") if f.strip()}
+SCOPE_CATEGORY_MIN_CONFIDENCE = float(os.getenv("SCOPE_CATEGORY_MIN_CONFIDENCE", "0.8"))
+# Tickets sampled to fit the category classifier; 0 disables category detection
+SCOPE_CLASSIFIER_SAMPLE = int(os.getenv("SCOPE_CLASSIFIER_SAMPLE", "5000"))
+# An auto-detected scope that yields fewer candidates than this is dropped and the search repeated
+SCOPE_MIN_RESULTS = int(os.getenv("SCOPE_MIN_RESULTS", "1"))
+SCOPE_REFRESH_SECONDS = float(os.getenv("SCOPE_REFRESH_SECONDS", "3600"))
+
+WORD_PATTERN = re.compile(r"[^\W\d_]+")
+# ISO code -> (names the corpus may use for it, common function words)
+LANGUAGES = {
+    "en": (("en", "eng", "english"), {
+        "the", "is", "are", "was", "not", "with", "my", "and", "to", "of", "cannot", "does", "doesn",
+        "when", "after", "how", "what", "it", "this", "for", "can", "working", "since",
+    }),
+    "de": (("de", "deu", "ger", "german", "deutsch"), {
+        "der", "die", "das", "und", "ist", "nicht", "mit", "ich", "mein", "meine", "kann", "keine", "kein",
+        "wenn", "nach", "wie", "auf", "ein", "eine", "bei", "funktioniert", "geht", "seit", "beim", "im",
+    }),
+    "fr": (("fr", "fra", "fre", "french", "français", "francais"), {
+        "le", "les", "et", "est", "pas", "avec", "je", "mon", "ma", "mes", "ne", "une", "sur", "pour",
+        "dans", "du", "des", "quand", "comment", "fonctionne", "plus", "depuis",
+    }),
+    "es": (("es", "spa", "spanish", "español", "espanol"), {
+        "el", "los", "las", "y", "es", "con", "mi", "mis", "una", "para", "por", "del", "cuando",
+        "como", "funciona", "puedo", "desde", "al", "se",
+    }),
+    "it": (("it", "ita", "italian", "italiano"), {
+        "il", "lo", "gli", "è", "non", "mio", "mia", "nel", "della", "quando", "come", "funziona",
+        "posso", "che", "dal", "più", "si",
+    }),
+    "nl": (("nl", "nld", "dut", "dutch", "nederlands"), {
+        "het", "een", "niet", "ik", "mijn", "geen", "wanneer", "hoe", "werkt", "bij", "van", "sinds",
+    }),
+    "pt": (("pt", "por", "portuguese", "português", "portugues"), {
+        "os", "não", "meu", "minha", "uma", "um", "no", "na", "do", "da", "quando", "funciona",
+        "desde", "ao", "com",
+    }),
+}
+
+
+def detect_language(text: str) -> Optional[str]:
+    """ISO code of the language whose function words occur most in text; None when unclear."""
+    words = WORD_PATTERN.findall((text or "").lower())
+    scores = sorted(((sum(word in vocabulary for word in words), code)
+                     for code, (_, vocabulary) in LANGUAGES.items()), reverse=True)
+    if not scores[0][0] or scores[0][0] == scores[1][0]:
+        return None
+    return scores[0][1]
+
+
+class CategoryClassifier:
+    """Multinomial naive Bayes over lexical.tokenize terms, fitted on (text, category) samples."""
+
+    def __init__(self):
+        self._log_prior: Dict[str, float] = {}
+        self._log_likelihood: Dict[str, Dict[str, float]] = {}
+        self._log_unseen: Dict[str, float] = {}
+        self._vocabulary = set()
+
+    def fit(self, samples: Iterable[Tuple[str, str]]):
+        term_counts = defaultdict(Counter)
+        documents = Counter()
+        for text, label in samples:
+            if label:
+                documents[label] += 1
+                term_counts[label].update(tokenize(text))
+        self._vocabulary = set().union(*term_counts.values()) if term_counts else set()
+        total = sum(documents.values())
+        for label, counts in term_counts.items():
+            denominator = math.log(sum(counts.values()) + len(self._vocabulary))
+            self._log_prior[label] = math.log(documents[label] / total)
+            self._log_likelihood[label] = {term: math.log(count + 1) - denominator for term, count in counts.items()}
+            self._log_unseen[label] = -denominator
+        return self
+
+    def predict(self, text: str) -> Tuple[Optional[str], float]:
+        """Most likely category and its posterior probability."""
+        terms = [term for term in tokenize(text) if term in self._vocabulary]
+        if not terms or len(self._log_prior) < 2:
+            return None, 0.0
+        scores = {
+            label: prior + sum(self._log_likelihood[label].get(term, self._log_unseen[label]) for term in terms)
+            for label, prior in self._log_prior.items()
+        }
+        best = max(scores, key=scores.get)
+        total = sum(math.exp(score - scores[best]) for score in scores.values())
+        return best, 1.0 / total
+
+
+class ScopeIndex:
+    """Payload values present in the collection plus the category classifier, refreshed periodically."""
+
+    def __init__(self):
+        self.values: Dict[str, List[str]] = {field: [] for field in SCOPE_FIELDS}
+        self.classifier: Optional[CategoryClassifier] = None
+        self.loaded_at = 0.0
+
+    async def refresh(self, qdrant, collection_name: str, force: bool = False):
+        if not force and self.loaded_at and time.monotonic() - self.loaded_at < SCOPE_REFRESH_SECONDS:
+            return
+        self.loaded_at = time.monotonic()
+        try:
+            for field in SCOPE_FIELDS:
+                response = await qdrant.facet(collection_name=collection_name, key=field, limit=1000)
+                self.values[field] = [str(hit.value) for hit in response.hits if hit.value]
+            if SCOPE_CLASSIFIER_SAMPLE > 0 and len(self.values["category"]) > 1:
+                self.classifier = CategoryClassifier().fit(await self._sample(qdrant, collection_name))
+        except Exception as e:
+            logger.error(f"Scope index refresh error: {e}")
+
+    @staticmethod
+    async def _sample(qdrant, collection_name: str):
+        samples, offset = [], None
+        while len(samples) < SCOPE_CLASSIFIER_SAMPLE:
+            points, offset = await qdrant.scroll(
+                collection_name=collection_name,
+                limit=min(1000, SCOPE_CLASSIFIER_SAMPLE - len(samples)),
+                offset=offset,
+                with_payload=["problem_text", "category"],
+                with_vectors=False,
+            )
+            samples.extend((p.payload.get("problem_text", ""), p.payload.get("category")) for p in points)
+            if offset is None:
+                break
+        return samples
+
+    def canonical(self, field: str, value: str) -> str:
+        """The indexed spelling of a requested value (keyword matches are case-sensitive)."""
+        wanted = value.strip().lower()
+        for known in self.values[field]:
+            if known.lower() == wanted:
+                return known
+        if field == "language":
+            for code, (names, _) in LANGUAGES.items():
+                if wanted in names:
+                    return self._indexed_language(code) or value.strip()
+        return value.strip()
+
+    def _indexed_language(self, code: str) -> Optional[str]:
+        names = LANGUAGES[code][0]
+        for known in self.values["language"]:
+            if known.lower() in names:
+                return known
+        return None
+
+    def resolve(self, text: str, categories=None, languages=None, auto=None):
+        """Returns (explicit, detected) scopes as {field: [values]}.
+
+        auto=None follows SCOPE_AUTO_DETECT, True detects both fields and
+        False none. Fields passed explicitly are never detected.
+        """
+        explicit = {}
+        for field, requested in (("category", categories), ("language", languages)):
+            values = [self.canonical(field, value) for value in requested or [] if value and value.strip()]
+            if values:
+                explicit[field] = values
+
+        detect = SCOPE_AUTO_DETECT if auto is None else set(SCOPE_FIELDS) if auto else set()
+        detected = {}
+        if "language" in detect and "language" not in explicit:
+            code = detect_language(text)
+            indexed = self._indexed_language(code) if code else None
+            if indexed:
+                detected["language"] = [indexed]
+        if "category" in detect and "category" not in explicit and self.classifier is not None:
+            category, confidence = self.classifier.predict(text)
+            if category and confidence >= SCOPE_CATEGORY_MIN_CONFIDENCE:
+                detected["category"] = [category]
+        return explicit, detected
+
+
+def scope_filter(scope: Dict[str, List[str]]) -> Optional[models.Filter]:
+    if not scope:
+        return None
+    return models.Filter(must=[
+        models.FieldCondition(key=field, match=models.MatchAny(any=values))
+        for field, values in sorted(scope.items())
+    ])
+
+
+def scope_key(scope: Dict[str, List[str]]):
+    """Hashable form of a scope for the answer cache; None when unscoped."""
+    if not scope:
+        return None
+    return tuple((field, tuple(sorted(values))) for field, values in sorted(scope.items()))
@@ -0,0 +1,151 @@
+import time
+import logging
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class SemanticCache:
+    """Answer cache keyed on query embeddings.
+
+    A lookup hits when a cached query vector lies within `max_distance`
+    cosine distance of the new one. Vectors live in a preallocated float32
+    matrix so a lookup is a single matrix-vector product; entries expire
+    after `ttl_seconds` and the least recently used ones are evicted when
+    `max_entries` or `max_bytes` is exceeded. Answers retrieved under a
+    category/language scope only hit lookups with the same `scope`: slots
+    of other scopes are masked out before the nearest entry is picked.
+    """
+
+    def __init__(self, max_distance: float = 0.05, ttl_seconds: float = 3600,
+                 max_entries: int = 2000, max_bytes: int = 64 * 1024 * 1024):
+        self.max_distance = max_distance
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+
+        self._matrix: Optional[np.ndarray] = None
+        self._valid = np.zeros(max_entries, dtype=bool)
+        # Small integer id per distinct scope, so the scope mask is one vector comparison
+        self._slot_scopes = np.zeros(max_entries, dtype=np.int32)
+        self._scope_ids: Dict = {}
+        self._free_slots = list(range(max_entries - 1, -1, -1))
+        self._entries: "OrderedDict[int, Dict]" = OrderedDict()
+        self._bytes = 0
+        self.generation = None
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, vector, scope=None) -> Optional[Tuple[str, List[Dict]]]:
+        slot = self._nearest(vector, scope)
+        if slot is None:
+            self.misses += 1
+            return None
+
+        entry = self._entries[slot]
+        if time.monotonic() - entry["created_at"] > self.ttl_seconds:
+            self._remove(slot)
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(slot)
+        self.hits += 1
+        return entry["answer"], entry["sources"]
+
+    def put(self, vector, answer: str, sources: List[Dict], scope=None):
+        query = self._normalize(vector)
+        if query is None:
+            return
+
+        if self._matrix is None or self._matrix.shape[1] != query.shape[0]:
+            self.clear()
+            self._matrix = np.zeros((self.max_entries, query.shape[0]), dtype=np.float32)
+
+        size = query.nbytes + len(answer.encode("utf-8")) + 64 * len(sources)
+        if size > self.max_bytes:
+            return
+
+        while self._entries and (not self._free_slots or self._bytes + size > self.max_bytes):
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+        slot = self._free_slots.pop()
+        self._matrix[slot] = query
+        self._valid[slot] = True
+        self._slot_scopes[slot] = self._scope_ids.setdefault(scope, len(self._scope_ids))
+        self._entries[slot] = {
+            "answer": answer,
+            "sources": sources,
+            "scope": scope,
+            "created_at": time.monotonic(),
+            "size": size,
+        }
+        self._bytes += size
+
+    def set_generation(self, generation):
+        """Drop every entry when the indexed collection has been re-ingested."""
+        if generation != self.generation:
+            if self.generation is not None:
+                logger.info(f"Collection generation changed ({self.generation} -> {generation}); clearing answer cache")
+                self.invalidate()
+            self.generation = generation
+
+    def invalidate(self):
+        self.clear()
+        self.invalidations += 1
+
+    def clear(self):
+        self._valid[:] = False
+        self._free_slots = list(range(self.max_entries - 1, -1, -1))
+        self._entries.clear()
+        self._scope_ids.clear()
+        self._bytes = 0
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "generation": self.generation,
+        }
+
+    def _nearest(self, vector, scope=None) -> Optional[int]:
+        scope_id = self._scope_ids.get(scope)
+        if not self._entries or self._matrix is None or scope_id is None:
+            return None
+        query = self._normalize(vector)
+        if query is None or query.shape[0] != self._matrix.shape[1]:
+            return None
+
+        similarities = self._matrix @ query
+        similarities[~self._valid | (self._slot_scopes != scope_id)] = -np.inf
+        slot = int(np.argmax(similarities))
+        if 1.0 - similarities[slot] > self.max_distance:
+            return None
+        return slot
+
+    def _remove(self, slot: int):
+        entry = self._entries.pop(slot)
+        self._bytes -= entry["size"]
+        self._valid[slot] = False
+        self._free_slots.append(slot)
+
+    @staticmethod
+    def _normalize(vector) -> Optional[np.ndarray]:
+        array = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(array)
+        if array.ndim != 1 or norm == 0:
+            return None
+        return array / norm
@@ -0,0 +1,46 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, Hashable
+
+from metrics import latency
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key into one execution.
+
+    The first caller starts `factory()` as a task; callers arriving while
+    it runs await the same task and get its result (or exception). The
+    task is shielded, so a caller that disconnects does not cancel the
+    work for the others. Executions and coalesced calls are counted as
+    `<name>_executed` / `<name>_coalesced` events. Keys only live while
+    the call is in flight: this is not a cache.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self.executed = 0
+        self.coalesced = 0
+
+    async def run(self, key: Hashable, factory: Callable[[], Awaitable]):
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(factory())
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._finished(key, done))
+            self.executed += 1
+            latency.increment(f"{self.name}_executed")
+        else:
+            self.coalesced += 1
+            latency.increment(f"{self.name}_coalesced")
+        return await asyncio.shield(task)
+
+    def _finished(self, key: Hashable, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Mark any exception retrieved: the waiters got it, or all of them left already
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> Dict:
+        return {"in_flight": len(self._inflight), "executed": self.executed, "coalesced": self.coalesced}
@@ -0,0 +1,138 @@
+import os
+import asyncio
+import functools
+import logging
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from database import DB_POOL_SIZE, TicketDatabase
+
+logger = logging.getLogger(__name__)
+
+DB_BACKEND = os.getenv("DB_BACKEND", "sqlite").lower()
+DB_PATH = os.getenv("DB_PATH", "tickets.db")
+DATABASE_URL = os.getenv("DATABASE_URL", "postgresql://localhost:5432/itrs")
+
+
+class TicketStore(ABC):
+    """
+    Async storage interface used by the API. Ids (ESC-/COMMENT-) are
+    allocated by the store without a global lock; every write keeps the
+    analytics rollups current in its own transaction.
+    """
+
+    @abstractmethod
+    async def init(self):
+        """Creates or migrates the schema. Safe to call on every startup."""
+
+    @abstractmethod
+    async def close(self):
+        ...
+
+    @abstractmethod
+    async def create_ticket(self, ticket_data) -> str:
+        ...
+
+    @abstractmethod
+    async def get_ticket(self, ticket_id: str) -> Optional[Dict]:
+        """Ticket with decoded conversation_history and comments oldest first, or None."""
+
+    @abstractmethod
+    async def get_tickets(self, status_filter: Optional[str] = None, include_comments: bool = True,
+                          include_history: bool = True) -> List[Dict]:
+        ...
+
+    @abstractmethod
+    async def list_tickets(self, limit: int = 50, cursor: Optional[str] = None, status: Optional[str] = None,
+                           submitted_from: Optional[str] = None, submitted_to: Optional[str] = None,
+                           author: Optional[str] = None,
+                           fields: Optional[List[str]] = None) -> Tuple[List[Dict], Optional[str]]:
+        """Keyset page on (submitted_at, id); raises ValueError for an invalid cursor, limit or field."""
+
+    @abstractmethod
+    async def update_ticket(self, ticket_id: str, updates: Dict) -> bool:
+        ...
+
+    @abstractmethod
+    async def create_comment(self, ticket_id: str, comment_data,
+                             ticket_updates: Optional[Dict] = None) -> Optional[str]:
+        """Returns the new comment id, or None if required fields are missing."""
+
+    @abstractmethod
+    async def get_analytics(self) -> Dict:
+        ...
+
+    @abstractmethod
+    async def rebuild_rollups(self):
+        ...
+
+    @abstractmethod
+    async def check_rollups(self) -> List[Dict]:
+        ...
+
+
+class SQLiteTicketStore(TicketStore):
+    """
+    TicketDatabase behind the async interface. Calls run on a dedicated
+    thread pool the size of the connection pool, so they never wait for
+    a connection while holding a thread.
+    """
+
+    def __init__(self, db_path: str = DB_PATH, pool_size: int = DB_POOL_SIZE):
+        self.db = TicketDatabase(db_path, pool_size=pool_size)
+        self._executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix="sqlite")
+
+    async def _run(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+
+    async def init(self):
+        await self._run(self.db.init_database)
+
+    async def close(self):
+        self._executor.shutdown(wait=True)
+        self.db.close()
+
+    async def create_ticket(self, ticket_data) -> str:
+        return await self._run(self.db.create_ticket, ticket_data)
+
+    async def get_ticket(self, ticket_id: str) -> Optional[Dict]:
+        return await self._run(self.db.get_ticket, ticket_id)
+
+    async def get_tickets(self, status_filter: Optional[str] = None, include_comments: bool = True,
+                          include_history: bool = True) -> List[Dict]:
+        return await self._run(self.db.get_tickets, status_filter, include_comments, include_history)
+
+    async def list_tickets(self, limit: int = 50, cursor: Optional[str] = None, status: Optional[str] = None,
+                           submitted_from: Optional[str] = None, submitted_to: Optional[str] = None,
+                           author: Optional[str] = None, fields: Optional[List[str]] = None):
+        return await self._run(self.db.list_tickets, limit=limit, cursor=cursor, status=status,
+                               submitted_from=submitted_from, submitted_to=submitted_to,
+                               author=author, fields=fields)
+
+    async def update_ticket(self, ticket_id: str, updates: Dict) -> bool:
+        return await self._run(self.db.update_ticket, ticket_id, updates)
+
+    async def create_comment(self, ticket_id: str, comment_data,
+                             ticket_updates: Optional[Dict] = None) -> Optional[str]:
+        return await self._run(self.db.create_comment, ticket_id, comment_data, ticket_updates=ticket_updates)
+
+    async def get_analytics(self) -> Dict:
+        return await self._run(self.db.get_analytics)
+
+    async def rebuild_rollups(self):
+        await self._run(self.db.rebuild_rollups)
+
+    async def check_rollups(self) -> List[Dict]:
+        return await self._run(self.db.check_rollups)
+
+
+def create_store(backend: str = DB_BACKEND, db_path: str = DB_PATH,
+                 database_url: str = DATABASE_URL) -> TicketStore:
+    if backend == "postgres":
+        from database_postgres import PostgresTicketStore
+        return PostgresTicketStore(database_url)
+    if backend != "sqlite":
+        logger.error(f"Unknown DB_BACKEND '{backend}', using SQLite")
+    return SQLiteTicketStore(db_path)
@@ -0,0 +1,29 @@
+"""pytest entry point for the TicketStore contract checks in benchmarks/store_contract.py.
+
+    python -m pytest tests                                   # SQLite only
+    TEST_DATABASE_URL=postgresql://postgres@localhost:5432/postgres python -m pytest tests
+
+PostgreSQL runs in a scratch database on TEST_DATABASE_URL (needs CREATEDB
+and asyncpg) and is skipped when the variable is not set.
+"""
+import asyncio
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+
+import store_contract  # noqa: E402
+
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+
+
+def test_sqlite_store_contract():
+    assert asyncio.run(store_contract.run_backend("sqlite", None)) == 0
+
+
+@pytest.mark.skipif(not TEST_DATABASE_URL, reason="TEST_DATABASE_URL is not set")
+def test_postgres_store_contract():
+    pytest.importorskip("asyncpg")
+    assert asyncio.run(store_contract.run_backend("postgres", TEST_DATABASE_URL)) == 0
@@ -1,6 +1,6 @@
 "use client";
 
-import React, { useState, useEffect } from "react";
+import React, { useState, useEffect, useRef } from "react";
 import {
   Card,
   CardContent,
@@ -15,6 +15,7 @@ import { useAuth } from "@/context/AuthContext";
 import { useRouter } from "next/navigation";
 
 import API_BASE_URL from "@/src/config/apiConfig";
+import { applyTicketEvent, subscribeTicketEvents } from "@/lib/ticketEvents";
 
 const removeStars = (text) => {
   if (!text) return "";
@@ -40,7 +41,7 @@ export default function Dashboard() {
   const [error, setError] = useState(null);
   const [selectedStatus, setSelectedStatus] = useState("all");
   const [lastRefresh, setLastRefresh] = useState(new Date());
-  const [autoRefresh, setAutoRefresh] = useState(false);
+  const [autoRefresh, setAutoRefresh] = useState(true);
   const [backendStatus, setBackendStatus] = useState("unknown");
   const [selectedTicket, setSelectedTicket] = useState(null);
 
@@ -205,15 +206,37 @@ export default function Dashboard() {
     }
   };
 
-  // Auto-refresh effect
+  const selectedStatusRef = useRef(selectedStatus);
+  selectedStatusRef.current = selectedStatus;
+
+  // Live updates: apply pushed ticket events instead of reloading everything
   useEffect(() => {
     if (!autoRefresh) return;
 
-    const interval = setInterval(() => {
-      refreshData();
-    }, 30000); // Refresh every 30 seconds
-
-    return () => clearInterval(interval);
+    return subscribeTicketEvents((event) => {
+      if (event.type === "resync") {
+        refreshData();
+        return;
+      }
+      if (event.stats) setAnalytics(event.stats);
+      setTickets((prev) => applyTicketEvent(prev, event));
+      setSelectedTicket(
+        (prev) =>
+          prev && applyTicketEvent([prev], event).find((t) => t.id === prev.id),
+      );
+      setFilteredTickets((prev) => {
+        const status = selectedStatusRef.current;
+        if (
+          event.type === "ticket_created" &&
+          status !== "all" &&
+          status !== event.ticket.status
+        ) {
+          return prev;
+        }
+        return applyTicketEvent(prev, event);
+      });
+      setLastRefresh(new Date());
+    });
   }, [autoRefresh]);
 
   useEffect(() => {
@@ -281,7 +304,7 @@ export default function Dashboard() {
                   Last updated: {lastRefresh.toLocaleTimeString()}{" "}
                   {autoRefresh && (
                     <span className="ml-2 inline-flex items-center px-2 py-0.5 rounded-full bg-white/15 text-white text-xs">
-                      Auto-refresh enabled
+                      Live updates enabled
                     </span>
                   )}
                 </p>
@@ -294,7 +317,7 @@ export default function Dashboard() {
                     autoRefresh ? "ring-1 ring-white/40" : ""
                   }`}
                 >
-                  {autoRefresh ? "Auto-refresh ON" : "Auto-refresh OFF"}
+                  {autoRefresh ? "Live updates ON" : "Live updates OFF"}
                 </Button>
                 <Button
                   variant="outline"
@@ -156,18 +156,34 @@ export default function ChatWidget() {
         content: msg.text,
       }));
 
-      const response = await chatApi.search(
+      // Stream the answer so tokens render as soon as retrieval is done
+      const botMessageId = `bot-${Date.now()}`;
+      const response = await chatApi.searchStream(
         inputValue,
         conversationHistory,
         currentConversationId,
+        (event, partial) => {
+          if (event.type !== "token") return;
+          setIsLoading(false);
+          setMessages([
+            ...updatedMessages,
+            {
+              id: botMessageId,
+              text: partial.answer,
+              isUser: false,
+              timestamp: new Date(),
+              messageId: botMessageId,
+            },
+          ]);
+        },
       );
 
       const botMessage = {
-        id: `bot-${Date.now()}`,
+        id: botMessageId,
         text: response.answer,
         isUser: false,
         timestamp: new Date(),
-        messageId: `bot-${Date.now()}`,
+        messageId: botMessageId,
       };
 
       const finalMessages = [...updatedMessages, botMessage];
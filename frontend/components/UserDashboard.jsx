@@ -20,6 +20,7 @@ import {
   AccordionTrigger,
 } from "@/components/ui/accordion";
 import { apiService } from "@/lib/api";
+import { applyTicketEvent, subscribeTicketEvents } from "@/lib/ticketEvents";
 
 import API_BASE_URL from "@/config/apiConfig";
 
@@ -48,9 +49,21 @@ export default function UserDashboard() {
   const [isCommenting, setIsCommenting] = useState(false);
   const [activeTab, setActiveTab] = useState("create"); // "create" or "manage"
 
-  // Load user tickets on component mount
+  // Load user tickets once, then keep them current from pushed ticket events
   useEffect(() => {
+    const unsubscribe = subscribeTicketEvents((event) => {
+      if (event.type === "resync") {
+        loadUserTickets();
+        return;
+      }
+      setUserTickets((prev) => applyTicketEvent(prev, event));
+      setSelectedTicket(
+        (prev) =>
+          prev && applyTicketEvent([prev], event).find((t) => t.id === prev.id),
+      );
+    });
     loadUserTickets();
+    return unsubscribe;
   }, []);
 
   const loadUserTickets = async () => {
@@ -144,9 +157,6 @@ export default function UserDashboard() {
       setShowEscalationDialog(false);
       setEscalationFeedback("");
 
-      // Refresh tickets list
-      await loadUserTickets();
-
       // Clear form
       setDescription("");
       setAiAnswer("");
@@ -177,30 +187,11 @@ export default function UserDashboard() {
         isResolution,
       );
 
-      await loadUserTickets();
-
+      // The ticket list and the open ticket update from the comment event
       setNewComment("");
 
       if (isResolution) {
         setSelectedTicket(null);
-      } else {
-        setTimeout(async () => {
-          try {
-            const response = await fetch(`${API_BASE_URL}/admin/tickets`);
-            if (response.ok) {
-              const updatedTickets = await response.json();
-              const updatedTicket = updatedTickets.find(
-                (t) => t.id === ticketId,
-              );
-              if (updatedTicket) {
-                setSelectedTicket(updatedTicket);
-                setUserTickets(updatedTickets);
-              }
-            }
-          } catch (err) {
-            console.error("Error refreshing ticket:", err);
-          }
-        }, 500);
       }
     } catch (err) {
       setError("Failed to add comment");
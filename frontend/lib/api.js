@@ -51,6 +51,28 @@ class ApiService {
     return response.json();
   }
 
+  // Keyset-paginated listing: pass the previous page's next_cursor as `cursor`
+  async getTicketsPage({
+    limit = 50,
+    cursor = null,
+    status = null,
+    submittedFrom = null,
+    submittedTo = null,
+    author = null,
+    fields = null,
+  } = {}) {
+    const params = new URLSearchParams({ limit: String(limit) });
+    if (cursor) params.set("cursor", cursor);
+    if (status) params.set("status", status);
+    if (submittedFrom) params.set("submitted_from", submittedFrom);
+    if (submittedTo) params.set("submitted_to", submittedTo);
+    if (author) params.set("author", author);
+    if (fields) params.set("fields", fields.join(","));
+    const response = await fetch(`${API_BASE_URL}/admin/tickets/page?${params}`);
+    if (!response.ok) throw new Error(`HTTP error: ${response.status}`);
+    return response.json();
+  }
+
   async resolveEscalatedTicket(ticketId, solution) {
     const response = await fetch(`${API_BASE_URL}/admin/resolve`, {
       method: "POST",
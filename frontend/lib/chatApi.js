@@ -24,6 +24,58 @@ export const chatApi = {
     return response.json();
   },
 
+  // Streams /search/stream (NDJSON). onEvent(event, partial) fires for every
+  // event; resolves with the same shape as search() once the answer is done.
+  searchStream: async (
+    query,
+    conversationHistory = [],
+    conversationId = null,
+    onEvent = () => {},
+  ) => {
+    const response = await fetch(`${API_BASE_URL}/search/stream`, {
+      method: "POST",
+      headers: { "Content-Type": "application/json" },
+      body: JSON.stringify({
+        query,
+        top_k: 5,
+        similarity_threshold: 0.7,
+        conversation_history: conversationHistory,
+        conversation_id: conversationId,
+      }),
+    });
+    if (!response.ok || !response.body)
+      throw new Error(`API error: ${response.statusText}`);
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = "";
+    let result = { answer: "", sources: [], total_sources: 0 };
+
+    while (true) {
+      const { value, done } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+      const lines = buffer.split("\n");
+      buffer = lines.pop();
+      for (const line of lines) {
+        if (!line.trim()) continue;
+        const event = JSON.parse(line);
+        if (event.type === "sources") {
+          const { type: _type, ...meta } = event;
+          result = { ...result, ...meta };
+        } else if (event.type === "token") {
+          result = { ...result, answer: result.answer + event.content };
+        } else if (event.type === "done") {
+          result = { ...result, answer: event.answer };
+        } else if (event.type === "error") {
+          throw new Error(event.message);
+        }
+        onEvent(event, result);
+      }
+    }
+    return result;
+  },
+
   escalateTicket: async (
     userQuery,
     aiAnswer,
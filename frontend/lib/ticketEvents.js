@@ -0,0 +1,53 @@
+import API_BASE_URL from "@/src/config/apiConfig";
+
+// Subscribe to the backend's server-sent ticket events. Returns an unsubscribe
+// function. Subscribe before loading tickets so no update is missed; events
+// are applied by id, so one that is already in the loaded list is harmless.
+export const subscribeTicketEvents = (onEvent) => {
+  const source = new EventSource(`${API_BASE_URL}/events`);
+  source.onmessage = (message) => {
+    try {
+      onEvent(JSON.parse(message.data));
+    } catch (err) {
+      console.error("Ticket event error:", err);
+    }
+  };
+  // EventSource reconnects by itself; reload on reconnect to cover the gap
+  source.onerror = () => {
+    if (source.readyState === EventSource.CONNECTING) {
+      onEvent({ type: "resync" });
+    }
+  };
+  return () => source.close();
+};
+
+const applyToTicket = (ticket, event) => {
+  const comments = ticket.comments || [];
+  if (comments.some((comment) => comment.id === event.comment.id)) {
+    return { ...ticket, ...event.updates };
+  }
+  return {
+    ...ticket,
+    ...event.updates,
+    comments: [...comments, event.comment],
+    comment_count: (ticket.comment_count ?? comments.length) + 1,
+  };
+};
+
+// Apply one event to a ticket list (newest first) and return the new list
+export const applyTicketEvent = (tickets, event) => {
+  switch (event.type) {
+    case "ticket_created":
+      if (tickets.some((ticket) => ticket.id === event.ticket.id)) {
+        return tickets;
+      }
+      return [event.ticket, ...tickets];
+    case "comment_added":
+    case "ticket_resolved":
+      return tickets.map((ticket) =>
+        ticket.id === event.ticket_id ? applyToTicket(ticket, event) : ticket,
+      );
+    default:
+      return tickets;
+  }
+};